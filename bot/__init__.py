@@ -24,8 +24,6 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 
 load_dotenv('config.env')
 
-Interval = []
-
 
 def getConfig(name: str):
     return os.environ[name]
@@ -211,6 +209,111 @@ try:
 except KeyError:
     USE_SERVICE_ACCOUNTS = False
 
+try:
+    DRIVE_CHUNK_MIN = int(getConfig('DRIVE_CHUNK_MIN_MB')) * 1024 * 1024
+except (KeyError, ValueError):
+    DRIVE_CHUNK_MIN = 8 * 1024 * 1024
+try:
+    DRIVE_CHUNK_MAX = int(getConfig('DRIVE_CHUNK_MAX_MB')) * 1024 * 1024
+except (KeyError, ValueError):
+    DRIVE_CHUNK_MAX = 128 * 1024 * 1024
+
+try:
+    SA_LEDGER_PATH = getConfig('SA_LEDGER_PATH')
+except KeyError:
+    SA_LEDGER_PATH = 'sa_ledger.db'
+try:
+    SA_DAILY_LIMIT = int(getConfig('SA_DAILY_LIMIT_GB')) * 1024 ** 3
+except (KeyError, ValueError):
+    SA_DAILY_LIMIT = 750 * 1024 ** 3
+
+try:
+    SHARE_TOP_LEVEL_ONLY = getConfig('SHARE_TOP_LEVEL_ONLY').lower() == 'true'
+except KeyError:
+    SHARE_TOP_LEVEL_ONLY = False
+
+try:
+    DRIVE_DEDUP = getConfig('DRIVE_DEDUP').lower() == 'true'
+except KeyError:
+    DRIVE_DEDUP = False
+
+try:
+    DRIVE_INDEX_PATH = getConfig('DRIVE_INDEX_PATH')
+    if len(DRIVE_INDEX_PATH) == 0:
+        raise KeyError
+except KeyError:
+    DRIVE_INDEX_PATH = 'drive_index.db'
+try:
+    DRIVE_INDEX_SYNC_INTERVAL = int(getConfig('DRIVE_INDEX_SYNC_INTERVAL'))
+except (KeyError, ValueError):
+    DRIVE_INDEX_SYNC_INTERVAL = 60
+
+try:
+    STATUS_MESSAGE_MAX_AGE = int(getConfig('STATUS_MESSAGE_MAX_AGE'))
+except (KeyError, ValueError):
+    STATUS_MESSAGE_MAX_AGE = 300
+try:
+    STATUS_MESSAGE_MAX_NEWER = int(getConfig('STATUS_MESSAGE_MAX_NEWER'))
+except (KeyError, ValueError):
+    STATUS_MESSAGE_MAX_NEWER = 5
+
+try:
+    STATUS_COMPACT = getConfig('STATUS_COMPACT')
+    STATUS_COMPACT = STATUS_COMPACT.lower() == 'true'
+except KeyError:
+    STATUS_COMPACT = False
+
+try:
+    DOWNLOAD_STAGE_LIMIT = int(getConfig('DOWNLOAD_STAGE_LIMIT'))
+except (KeyError, ValueError):
+    DOWNLOAD_STAGE_LIMIT = 3
+try:
+    PROCESS_STAGE_LIMIT = int(getConfig('PROCESS_STAGE_LIMIT'))
+except (KeyError, ValueError):
+    PROCESS_STAGE_LIMIT = 2
+try:
+    UPLOAD_STAGE_LIMIT = int(getConfig('UPLOAD_STAGE_LIMIT'))
+except (KeyError, ValueError):
+    UPLOAD_STAGE_LIMIT = 3
+try:
+    USER_DOWNLOAD_LIMIT = int(getConfig('USER_DOWNLOAD_LIMIT'))
+except (KeyError, ValueError):
+    USER_DOWNLOAD_LIMIT = 2
+try:
+    CHAT_DOWNLOAD_LIMIT = int(getConfig('CHAT_DOWNLOAD_LIMIT'))
+except (KeyError, ValueError):
+    CHAT_DOWNLOAD_LIMIT = 0
+try:
+    SMALL_JOB_SIZE = int(getConfig('SMALL_JOB_SIZE_MB')) * 1024 * 1024
+except (KeyError, ValueError):
+    SMALL_JOB_SIZE = 100 * 1024 * 1024
+try:
+    MIN_FREE_SPACE = int(getConfig('MIN_FREE_SPACE_MB')) * 1024 * 1024
+except (KeyError, ValueError):
+    MIN_FREE_SPACE = 1024 * 1024 * 1024
+try:
+    DRAIN_TIMEOUT = int(getConfig('DRAIN_TIMEOUT'))
+except (KeyError, ValueError):
+    DRAIN_TIMEOUT = 600
+
+try:
+    JOB_JOURNAL_PATH = getConfig('JOB_JOURNAL_PATH')
+    if len(JOB_JOURNAL_PATH) == 0:
+        raise KeyError
+except KeyError:
+    JOB_JOURNAL_PATH = 'jobs.db'
+try:
+    JOB_RESUME = getConfig('JOB_RESUME')
+    JOB_RESUME = JOB_RESUME.lower() == 'true'
+except KeyError:
+    JOB_RESUME = True
+
+try:
+    LOOP_DEBUG = getConfig('LOOP_DEBUG')
+    LOOP_DEBUG = LOOP_DEBUG.lower() == 'true'
+except KeyError:
+    LOOP_DEBUG = False
+
 # Build Application and bot
 application = Application.builder().token(BOT_TOKEN).build()
 bot = application.bot
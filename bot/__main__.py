@@ -1,3 +1,4 @@
+import asyncio
 import shutil, psutil
 import signal
 import pickle
@@ -7,30 +8,44 @@ from sys import executable
 import time
 
 from telegram.ext import CommandHandler, Application, filters
-from bot import application, botStartTime, LOGGER
+from bot import application, botStartTime, LOGGER, LOOP_DEBUG, DRAIN_TIMEOUT, USE_SERVICE_ACCOUNTS
 from bot.helper.ext_utils import fs_utils
 from bot.helper.telegram_helper.bot_commands import BotCommands
 from bot.helper.telegram_helper.message_utils import *
 from .helper.ext_utils.bot_utils import get_readable_file_size, get_readable_time
+from .helper.ext_utils.executors import get_executor, get_executor_stats, run_in_executor
+from .helper.ext_utils.disk_ledger import disk_ledger
+from .helper.ext_utils.job_journal import journal, recover_jobs, cancel_unfinished_jobs
+from .helper.mirror_utils.pipeline import start_drain, is_draining, drain_progress, start_disk_recheck
+from .helper.mirror_utils.upload_utils.drive_index import drive_index
 from .helper.telegram_helper.filters import CustomFilters
 from .modules import authorize, list, cancel_mirror, mirror_status, mirror, clone, watch
-from .modules import settings
+from .modules import settings, priority
 
 
 async def stats(update, context):
     currentTime = get_readable_time((time.time() - botStartTime))
-    total, used, free = shutil.disk_usage('.')
+    total, used, free = await run_in_executor('io', shutil.disk_usage, '.')
     total = get_readable_file_size(total)
     used = get_readable_file_size(used)
     free = get_readable_file_size(free)
-    cpuUsage = psutil.cpu_percent(interval=0.5)
+    cpuUsage = await run_in_executor('io', psutil.cpu_percent, interval=0.5)
     memory = psutil.virtual_memory().percent
+    disk_stats = await run_in_executor('io', disk_ledger.stats)
     stats = f'Bot Uptime: {currentTime}\n' \
             f'Total disk space: {total}\n' \
             f'Used: {used}\n' \
             f'Free: {free}\n' \
             f'CPU: {cpuUsage}%\n' \
-            f'RAM: {memory}%'
+            f'RAM: {memory}%\n' \
+            f'Download space: {disk_stats}\n' \
+            f'Reclaimed by cleanup: {get_readable_file_size(fs_utils.get_reclaimed_bytes())}'
+    if USE_SERVICE_ACCOUNTS:
+        from .helper.mirror_utils.upload_utils.sa_pool import sa_pool
+        stats += f'\nService accounts: {await run_in_executor("io", sa_pool.stats)}'
+    for name, executor in get_executor_stats().items():
+        stats += f"\n{name}: {executor['running']}/{executor['workers']} busy, " \
+                 f"{executor['queued']} queued (peak {executor['peak_queued']})"
     await sendMessage(stats, context, update)
 
 
@@ -42,15 +57,62 @@ Type /{BotCommands.HelpCommand} to get a list of available commands
     await sendMessage(start_string, context, update)
 
 
-async def restart(update, context):
-    restart_message = await sendMessage("Restarting, Please wait!", context, update)
-    # Save restart message object in order to reply to it after restarting
-    fs_utils.clean_all()
+def _restart_now(restart_message):
+    # Save the restart message in order to edit it after restarting
     with open('restart.pickle', 'wb') as status:
-        pickle.dump(restart_message, status)
+        pickle.dump((restart_message.chat.id, restart_message.message_id), status)
     execl(executable, executable, "-m", "bot")
 
 
+def _drain_text(remaining):
+    progress = drain_progress()
+    processing, _ = progress['process']
+    uploading, _ = progress['upload']
+    checkpointed = progress['download'][0] + sum(waiting for _, waiting in progress.values())
+    return f"Draining before restart, {get_readable_time(remaining)} left\n" \
+           f"Waiting for {processing} archive/extract and {uploading} upload jobs to finish\n" \
+           f"{checkpointed} downloading or queued jobs will resume after the restart"
+
+
+async def _drain_and_restart(restart_message, context):
+    deadline = time.time() + DRAIN_TIMEOUT
+    text = None
+    while time.time() < deadline:
+        progress = drain_progress()
+        if progress['process'][0] == 0 and progress['upload'][0] == 0:
+            break
+        new_text = _drain_text(deadline - time.time())
+        if new_text != text:
+            await editMessage(new_text, restart_message, context)
+            text = new_text
+        await asyncio.sleep(5)
+    else:
+        LOGGER.warning("Drain timed out, restarting with jobs still running")
+    await editMessage("Restarting, Please wait!", restart_message, context)
+    # Everything that did not finish is resumed from the journal
+    await run_in_executor('io', journal.flush)
+    _restart_now(restart_message)
+
+
+async def restart(update, context):
+    args = update.message.text.split(' ')
+    if len(args) > 1 and args[1] == 'now':
+        restart_message = await sendMessage("Restarting, Please wait!", context, update)
+        # The downloads are deleted, so the journal must not resume their jobs. If it cannot be updated they are
+        # kept and the recovery resumes them instead
+        if await run_in_executor('io', cancel_unfinished_jobs):
+            await run_in_executor('io', fs_utils.clean_all)
+        _restart_now(restart_message)
+        return
+    if is_draining():
+        await sendMessage("Already draining for a restart", context, update)
+        return
+    start_drain()
+    restart_message = await sendMessage(_drain_text(DRAIN_TIMEOUT), context, update)
+    # The drain runs as its own task, handlers for other updates keep running meanwhile
+    context.application.create_task(_drain_and_restart(restart_message, context))
+
+
 async def ping(update, context):
     start_time = int(round(time.time() * 1000))
     reply = await sendMessage("Starting Ping", context, update)
@@ -66,7 +128,7 @@ async def bot_help(update, context):
     help_string = f'''
 /{BotCommands.HelpCommand}: To get this message
 
-/{BotCommands.MirrorCommand} [download_url][magnet_link]: Start mirroring the link to google drive
+/{BotCommands.MirrorCommand} [download_url][magnet_link] [-p high|normal|low]: Start mirroring the link to google drive
 
 /{BotCommands.UnzipMirrorCommand} [download_url][magnet_link] : starts mirroring and if downloaded file is any archive , extracts it to google drive
 
@@ -80,7 +142,15 @@ async def bot_help(update, context):
 
 /{BotCommands.StatusCommand}: Shows a status of all the downloads
 
-/{BotCommands.ListCommand} [search term]: Searches the search term in the Google drive, if found replies with the link
+/{BotCommands.StatusCommand} [gid]: Shows every detail of a single download with a refresh button
+
+/{BotCommands.PauseAllCommand} [filters]: Pauses the aria2 downloads matching user:me|id|@name chat:here|id state:... engine:... (Can only be invoked by owner of the bot)
+
+/{BotCommands.ResumeAllCommand} [filters]: Resumes the paused downloads matching the filters (Can only be invoked by owner of the bot)
+
+/{BotCommands.PriorityCommand} [gid] high|normal|low: Moves a queued job ahead of or behind the others, reply to the mirror message instead of giving a gid
+
+/{BotCommands.ListCommand} [search term]: Searches the search term in the whole Google drive folder, if found replies with the links, page by page
 
 /{BotCommands.StatsCommand}: Show Stats of the machine the bot is hosted on
 
@@ -88,19 +158,38 @@ async def bot_help(update, context):
 
 /{BotCommands.LogCommand}: Get a log file of the bot. Handy for getting crash reports
 
+/{BotCommands.RestartCommand} [now]: Lets running uploads finish and restarts, queued jobs resume afterwards. "now" restarts right away (Can only be invoked by owner of the bot)
+
 /{BotCommands.TgUploadCommand} [download_url] (or reply to a file): Download and upload the file back to Telegram
 
 '''
     await sendMessage(help_string, context, update)
 
 
-def main():
+async def post_init(app):
     # Check if the bot is restarting
     if path.exists('restart.pickle'):
         with open('restart.pickle', 'rb') as status:
-            restart_message = pickle.load(status)
-        restart_message.edit_text("Restarted Successfully!")
+            chat_id, message_id = pickle.load(status)
         remove('restart.pickle')
+        try:
+            await app.bot.edit_message_text("Restarted Successfully!", chat_id=chat_id, message_id=message_id)
+        except Exception as e:
+            LOGGER.error(str(e))
+    if LOOP_DEBUG:
+        # asyncio then logs every callback or handler step which holds the event loop for longer than this
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = 0.05
+        LOGGER.info("Event loop debug mode enabled")
+    start_disk_recheck()
+    await recover_jobs(app)
+    # The first crawl of the Drive folder can take a while, /list asks Drive directly until it is done
+    get_executor('io').submit(drive_index.start)
+
+
+def main():
+    fs_utils.purge_trash()
 
     app = application
     app.add_handler(CommandHandler(BotCommands.StartCommand, start,
@@ -118,6 +207,8 @@ def main():
     from .modules.tg_upload import tg_upload_handler
     app.add_handler(tg_upload_handler)
 
+    # Runs once the bot is initialized, before polling starts
+    app.post_init = post_init
     app.run_polling()
     LOGGER.info("Bot Started!")
     signal.signal(signal.SIGINT, fs_utils.exit_clean_up)
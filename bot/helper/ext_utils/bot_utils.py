@@ -1,3 +1,5 @@
+import heapq
+import itertools
 import logging
 import re
 import threading
@@ -18,9 +20,12 @@ class MirrorStatus:
     STATUS_WAITING = "Queued"
     STATUS_FAILED = "Failed. Cleaning download"
     STATUS_CANCELLED = "Cancelled"
+    STATUS_PAUSED = "Paused"
     STATUS_ARCHIVING = "Archiving"
     STATUS_EXTRACTING = "Extracting"
     STATUS_SPLITTING = "Splitting"
+    STATUS_QUEUED_PROCESS = "Queued for processing"
+    STATUS_QUEUED_UPLOAD = "Queued for upload"
 
 
 PROGRESS_MAX_SIZE = 100 // 8
@@ -28,23 +33,85 @@ PROGRESS_INCOMPLETE = ['▏', '▎', '▍', '▌', '▋', '▊', '▉']
 
 SIZE_UNITS = ['B', 'KB', 'MB', 'GB', 'TB', 'PB']
 
+# Compact status lines round the progress down to steps of this many percent, so a broadcast whose jobs did not
+# move a whole step renders the same text and its edit is skipped
+COMPACT_PROGRESS_STEP = 10
+
+
+class _TimerWheel:
+    """A single scheduler thread shared by every periodic job.
+
+    Jobs are kept in a heap ordered by their next deadline, so the number of
+    threads and wakeups does not grow with the number of registered jobs.
+    """
+
+    def __init__(self):
+        self.__jobs = []
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+        self.__thread = None
+
+    def schedule(self, job, delay):
+        with self.__cond:
+            heapq.heappush(self.__jobs, (time.monotonic() + delay, next(self.__seq), job))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='timer-wheel', daemon=True)
+                self.__thread.start()
+            self.__cond.notify()
+
+    def __len__(self):
+        with self.__cond:
+            return len(self.__jobs)
+
+    def __run(self):
+        from bot.helper.ext_utils.executors import get_executor
+        while True:
+            with self.__cond:
+                while not self.__jobs:
+                    self.__cond.wait()
+                deadline, _, job = self.__jobs[0]
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self.__cond.wait(timeout)
+                    continue
+                heapq.heappop(self.__jobs)
+            if not job.cancelled:
+                # Actions may block, so they run on the timer executor to keep the other deadlines on time
+                get_executor('timer').submit(self.__fire, job)
+
+    def __fire(self, job):
+        try:
+            job.action()
+        except Exception as e:
+            LOGGER.error(f"Scheduled job {getattr(job.action, '__qualname__', job.action)} failed: {e}")
+        # Periodic jobs are rescheduled only once the action returns, so a slow action never overlaps itself
+        if job.interval is not None and not job.cancelled:
+            self.schedule(job, job.interval)
+
+
+timer_wheel = _TimerWheel()
+
 
 class setInterval:
     def __init__(self, interval, action):
         self.interval = interval
         self.action = action
-        self.stopEvent = threading.Event()
-        thread = threading.Thread(target=self.__setInterval)
-        thread.start()
+        self.cancelled = False
+        timer_wheel.schedule(self, interval)
+
+    def cancel(self):
+        self.cancelled = True
 
-    def __setInterval(self):
-        nextTime = time.time() + self.interval
-        while not self.stopEvent.wait(nextTime - time.time()):
-            nextTime += self.interval
-            self.action()
+
+class setTimeout:
+    def __init__(self, delay, action):
+        self.interval = None
+        self.action = action
+        self.cancelled = False
+        timer_wheel.schedule(self, delay)
 
     def cancel(self):
-        self.stopEvent.set()
+        self.cancelled = True
 
 
 _last_status_update_time = 0.0
@@ -101,13 +168,66 @@ def get_progress_bar_string(status):
     return p_str
 
 
-def get_readable_message():
+def get_compact_progress(status):
+    """:return The progress of status rounded down to COMPACT_PROGRESS_STEP percent"""
+    total = status.size_raw()
+    if not total:
+        return '0%'
+    p = min(max(int(status.processed_bytes() * 100 / total), 0), 100)
+    return f'{p - p % COMPACT_PROGRESS_STEP}%'
+
+
+def getStatusById(job_id):
+    """
+    Finds a job by its gid or by the id of the message which started it
+    :return: tuple of (uid, status object), (None, None) if there is no such job
+    """
+    from bot import download_dict, download_dict_lock
+    with download_dict_lock:
+        for uid, dl in download_dict.items():
+            if str(uid) == job_id or (hasattr(dl, 'gid') and dl.gid() == job_id):
+                return uid, dl
+    return None, None
+
+
+def get_job_id(uid, download):
+    if download.status() == MirrorStatus.STATUS_DOWNLOADING and hasattr(download, 'gid'):
+        return download.gid()
+    return uid
+
+
+def sample_speeds():
+    """Samples the progress of every running transfer, so speeds and ETAs do not depend on what is rendered"""
     from bot import download_dict, download_dict_lock
+    with download_dict_lock:
+        downloads = list(download_dict.values())
+    for download in downloads:
+        if hasattr(download, 'queue_position') or download.status() in (MirrorStatus.STATUS_ARCHIVING,
+                                                                          MirrorStatus.STATUS_EXTRACTING):
+            continue
+        try:
+            download.sample()
+        except Exception as e:
+            LOGGER.error(f"Could not sample the speed of {download.name()}: {e}")
+
+
+def get_readable_message():
+    from bot import download_dict, download_dict_lock, STATUS_COMPACT
     with download_dict_lock:
         msg = ""
-        for download in list(download_dict.values()):
+        for uid, download in list(download_dict.items()):
+            if STATUS_COMPACT:
+                msg += f"<i>{download.name()}</i> - {download.status()}"
+                if hasattr(download, 'queue_position'):
+                    msg += f" (#{download.queue_position()})"
+                elif download.status() != MirrorStatus.STATUS_ARCHIVING and download.status() != MirrorStatus.STATUS_EXTRACTING:
+                    msg += f" {get_compact_progress(download)}"
+                msg += f" | ID: <code>{get_job_id(uid, download)}</code>\n"
+                continue
             msg += f"<i>{download.name()}</i> - "
             msg += download.status()
+            if hasattr(download, 'queue_position'):
+                msg += f" (#{download.queue_position()})"
             if download.status() != MirrorStatus.STATUS_ARCHIVING and download.status() != MirrorStatus.STATUS_EXTRACTING:
                 msg += f"\n<code>{get_progress_bar_string(download)} {download.progress()}</code> of " \
                        f"{download.size()}" \
@@ -117,15 +237,40 @@ def get_readable_message():
                     msg += f"| P: {download.aria_download().connections} " \
                            f"| S: {download.aria_download().num_seeders}"
                 msg += f"\nGID: <code>{download.gid()}</code>"
+            else:
+                msg += f"\nID: <code>{uid}</code>"
             msg += "\n\n"
         
         # If no downloads, return a default message
         if not msg.strip():
             msg = "No active downloads"
-        
+        elif STATUS_COMPACT:
+            msg += "\nSend /status ID for details"
+
+        from bot.helper.mirror_utils.pipeline import is_draining
+        if is_draining():
+            msg = "<b>Draining for a restart, no new jobs are started</b>\n\n" + msg
         return msg
 
 
+def get_readable_detail(download):
+    """Renders every field of a single job, used by the on-demand detail view"""
+    msg = f"<b>{download.name()}</b>\n"
+    status = download.status()
+    msg += f"Status: {status}\n"
+    if status != MirrorStatus.STATUS_ARCHIVING and status != MirrorStatus.STATUS_EXTRACTING:
+        msg += f"<code>{get_progress_bar_string(download)} {download.progress()}</code>\n" \
+               f"Processed: {get_readable_file_size(download.processed_bytes())} of {download.size()}\n" \
+               f"Speed: {download.speed()}\n" \
+               f"ETA: {download.eta()}\n"
+    if hasattr(download, 'gid'):
+        msg += f"GID: <code>{download.gid()}</code>\n"
+    msg += f"Path: <code>{download.path()}</code>\n"
+    for label, value in download.details():
+        msg += f"{label}: {value}\n"
+    return msg
+
+
 def get_readable_time(seconds: int) -> str:
     result = ''
     (days, remainder) = divmod(seconds, 86400)
@@ -164,13 +309,11 @@ def is_magnet(url: str):
 
 
 def new_thread(fn):
-    """To use as decorator to make a function call threaded.
-    Needs import
-    from threading import Thread"""
+    """To use as decorator to run a function on the bounded event executor.
+    The wrapper returns the concurrent.futures.Future of the call"""
 
     def wrapper(*args, **kwargs):
-        thread = threading.Thread(target=fn, args=args, kwargs=kwargs)
-        thread.start()
-        return thread
+        from bot.helper.ext_utils.executors import get_executor
+        return get_executor('event').submit(fn, *args, **kwargs)
 
     return wrapper
@@ -0,0 +1,172 @@
+# Byte reservations against the free space of DOWNLOAD_DIR. A job reserves the space it is expected to need
+# before it is admitted to a stage, so jobs which do not fit wait instead of filling the disk for everyone.
+# Admission only reads the last measurement of the disk, walking the job directories is left to the io executor.
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from bot import LOGGER, DOWNLOAD_DIR, MIN_FREE_SPACE
+from bot.helper.ext_utils.bot_utils import get_readable_file_size
+from bot.helper.ext_utils.executors import get_executor
+from bot.helper.ext_utils.fs_utils import get_path_size
+
+
+class DiskLedger:
+    def __init__(self, path, min_free):
+        self.__path = path
+        self.__min_free = min_free
+        # uid: bytes the job is expected to occupy in total
+        self.__reserved = {}
+        self.__lock = threading.Lock()
+        usage = self.__disk_usage()
+        # total and free bytes of the disk and {uid: bytes already written} of the reserved jobs
+        self.__measurement = (usage.total, usage.free, {})
+        # uid: (bytes, resume) of started downloads which wait for space, in the order they started waiting
+        self.__held = OrderedDict()
+        self.__release_callbacks = []
+
+    def __disk_usage(self):
+        path = self.__path
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return shutil.disk_usage(path)
+
+    def refresh(self):
+        """Measures the disk and what the reserved jobs have written so far, without holding the lock"""
+        with self.__lock:
+            uids = list(self.__reserved)
+        usage = self.__disk_usage()
+        written = {}
+        for uid in uids:
+            try:
+                written[uid] = get_path_size(f'{self.__path}{uid}')
+            except OSError:
+                written[uid] = 0
+        with self.__lock:
+            self.__measurement = (usage.total, usage.free, written)
+
+    def __available(self):
+        _, free, written = self.__measurement
+        outstanding = sum(max(0, size - written.get(uid, 0)) for uid, size in self.__reserved.items())
+        return free - outstanding - self.__min_free
+
+    def available(self):
+        """
+        :return Bytes which can still be reserved, the free space minus what reserved jobs have yet to write.
+        A job reserved since the last measurement counts as having written nothing yet
+        """
+        with self.__lock:
+            return self.__available()
+
+    def reserved(self, uid):
+        with self.__lock:
+            return self.__reserved.get(uid, 0)
+
+    def fits(self, uid, size):
+        """:return True if the reservation of uid can grow to size bytes right now"""
+        return self.available() >= size - self.reserved(uid)
+
+    def too_large(self, size):
+        """:return True if size bytes would not fit even on an otherwise empty disk"""
+        with self.__lock:
+            total, _, _ = self.__measurement
+        return size > total - self.__min_free
+
+    def reserve(self, uid, size):
+        """Sets the reservation of uid to size bytes, a smaller size never shrinks an existing reservation"""
+        with self.__lock:
+            if size > self.__reserved.get(uid, 0):
+                self.__reserved[uid] = size
+
+    def try_reserve(self, uid, size):
+        """Reserves size bytes for uid if they fit right now. :return False if they do not"""
+        with self.__lock:
+            reserved = self.__reserved.get(uid, 0)
+            if self.__available() < size - reserved:
+                return False
+            self.__reserved[uid] = max(size, reserved)
+            return True
+
+    def hold(self, uid, size, resume):
+        """Keeps uid waiting until size bytes fit, then reserves them and calls resume()"""
+        with self.__lock:
+            self.__held[uid] = (size, resume)
+
+    def held(self, uid):
+        with self.__lock:
+            return uid in self.__held
+
+    def release(self, uid):
+        with self.__lock:
+            self.__held.pop(uid, None)
+            released = self.__reserved.pop(uid, None) is not None
+        if released:
+            self.space_freed()
+
+    def on_space_freed(self, callback):
+        self.__release_callbacks.append(callback)
+
+    def space_freed(self):
+        """Measures the disk again on the io executor, then lets everything waiting for space try again"""
+        return get_executor('io').submit(self.__recheck)
+
+    def __recheck(self):
+        self.refresh()
+        resumed = []
+        with self.__lock:
+            # A held download which fits goes on even if one held before it is still too large
+            for uid, (size, resume) in list(self.__held.items()):
+                reserved = self.__reserved.get(uid, 0)
+                if self.__available() >= size - reserved:
+                    self.__reserved[uid] = max(size, reserved)
+                    del self.__held[uid]
+                    resumed.append((uid, resume))
+        for uid, resume in resumed:
+            LOGGER.info(f"Resuming download {uid}, it fits on the disk now")
+            try:
+                resume()
+            except Exception as e:
+                LOGGER.error(f"Could not resume download {uid}: {e}")
+        for callback in self.__release_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                LOGGER.error(f"Disk space callback failed: {e}")
+
+    def stats(self):
+        with self.__lock:
+            reserved = sum(self.__reserved.values())
+        return f"{get_readable_file_size(reserved)} reserved, " \
+               f"{get_readable_file_size(max(0, self.available()))} available"
+
+
+disk_ledger = DiskLedger(DOWNLOAD_DIR, MIN_FREE_SPACE)
+
+
+def expected_footprint(listener, size):
+    """:return Bytes a job of size bytes occupies at most, archiving or extracting keeps a second copy"""
+    if getattr(listener, 'isTar', False) or getattr(listener, 'extract', False):
+        return size * 2
+    return size
+
+
+def expect_size(listener, size, pause, resume):
+    """
+    Called by the downloaders once the real size of a running download is known. A download which does not fit
+    right now is stopped with pause() and goes on with resume() once enough space is freed, instead of filling the disk
+    :return: False if the download can never fit on the disk and has to be stopped
+    """
+    footprint = expected_footprint(listener, size)
+    if disk_ledger.too_large(footprint):
+        return False
+    if disk_ledger.try_reserve(listener.uid, footprint):
+        return True
+    LOGGER.info(f"Holding download {listener.uid} until {get_readable_file_size(footprint)} are available")
+    pause()
+    disk_ledger.hold(listener.uid, footprint, resume)
+    return True
+
+
+def no_space_error(size):
+    return f"Not enough disk space: this job needs {get_readable_file_size(size)}"
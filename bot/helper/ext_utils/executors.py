@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger(__name__)
+
+# Name of the executor: (config variable with its size, default size)
+# event: aria2 notifications and other short callbacks
+# timer: actions of the timer wheel, kept apart so slow notification handlers never delay them
+# io: short blocking file system and network calls
+# cpu: archiving and extraction
+# transfer: long running downloads and uploads
+# drive: files of directory uploads to Google Drive, each worker with its own http transport
+# drive_list: folder listings of clones, kept apart so they never queue behind copies or uploads
+# drive_copy: file copies of clones, kept apart so a large clone never holds up the uploads on drive
+EXECUTOR_SIZES = {
+    'event': ('EVENT_WORKERS', 4),
+    'timer': ('TIMER_WORKERS', 4),
+    'io': ('IO_WORKERS', 8),
+    'cpu': ('CPU_WORKERS', os.cpu_count() or 1),
+    'transfer': ('TRANSFER_WORKERS', 32),
+    'drive': ('DRIVE_UPLOAD_WORKERS', 4),
+    'drive_list': ('DRIVE_LIST_WORKERS', 4),
+    'drive_copy': ('DRIVE_COPY_WORKERS', 4),
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class BoundedExecutor:
+    """A named thread pool with a fixed number of workers which counts its queued and running tasks"""
+
+    def __init__(self, name, max_workers, initializer=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name,
+                                         initializer=initializer)
+        self.__lock = threading.Lock()
+        self.__queued = 0
+        self.__running = 0
+        self.__completed = 0
+        self.__peak_queued = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.__lock:
+            self.__queued += 1
+            self.__peak_queued = max(self.__peak_queued, self.__queued)
+        return self.__pool.submit(self.__run, fn, args, kwargs)
+
+    def __run(self, fn, args, kwargs):
+        with self.__lock:
+            self.__queued -= 1
+            self.__running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            LOGGER.error(f"[{self.name}] {getattr(fn, '__qualname__', fn)} failed: {e}")
+            raise
+        finally:
+            with self.__lock:
+                self.__running -= 1
+                self.__completed += 1
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'workers': self.max_workers,
+                'running': self.__running,
+                'queued': self.__queued,
+                'peak_queued': self.__peak_queued,
+                'completed': self.__completed,
+            }
+
+
+def get_executor(name) -> BoundedExecutor:
+    """:return The executor registered under name, created with its configured size on first use"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            from bot import getConfig
+            config_name, size = EXECUTOR_SIZES[name]
+            try:
+                size = max(1, int(getConfig(config_name)))
+            except (KeyError, ValueError):
+                pass
+            executor = BoundedExecutor(name, size)
+            _executors[name] = executor
+        return executor
+
+
+def register_executor(name, max_workers, initializer=None) -> BoundedExecutor:
+    """Registers an executor which is not part of EXECUTOR_SIZES, e.g. a single low priority worker"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = BoundedExecutor(name, max_workers, initializer)
+            _executors[name] = executor
+        return executor
+
+
+async def run_in_executor(name, fn, *args, **kwargs):
+    """Awaits fn on the named executor, for blocking calls made from a handler running on the event loop"""
+    return await asyncio.wrap_future(get_executor(name).submit(fn, *args, **kwargs))
+
+
+def get_executor_stats():
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {executor.name: executor.stats() for executor in executors}
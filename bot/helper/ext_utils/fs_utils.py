@@ -1,3 +1,4 @@
+import hashlib
 import sys
 from bot import aria2, LOGGER, DOWNLOAD_DIR
 import shutil
@@ -5,20 +6,79 @@ import os
 import pathlib
 import magic
 import tarfile
+import threading
+import time
 from .exceptions import NotSupportedExtractionArchive
+from .executors import register_executor
+
+# Deleted downloads are renamed into this directory, next to DOWNLOAD_DIR so the rename never crosses filesystems,
+# and removed from it by a single low priority worker
+TRASH_DIR = os.path.join(os.path.dirname(os.path.abspath(DOWNLOAD_DIR.rstrip('/'))), '.mirror-trash')
+
+_reclaimed_bytes = 0
+_reclaimed_lock = threading.Lock()
+
+
+def _lower_priority():
+    try:
+        # On Linux the niceness of a thread can be set on its own thread id
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError) as e:
+        LOGGER.warning(f"Could not lower the priority of the deletion worker: {e}")
+
+
+def _trash_executor():
+    return register_executor('trash', 1, initializer=_lower_priority)
+
+
+def _purge(path):
+    global _reclaimed_bytes
+    try:
+        size = get_path_size(path)
+    except OSError:
+        size = 0
+    start = time.time()
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+    with _reclaimed_lock:
+        _reclaimed_bytes += size
+    LOGGER.info(f"Reclaimed {size} bytes from {path} in {time.time() - start:.1f}s")
+    from .disk_ledger import disk_ledger
+    disk_ledger.space_freed()
+
+
+def get_reclaimed_bytes():
+    with _reclaimed_lock:
+        return _reclaimed_bytes
 
 
 def clean_download(path: str):
-    if os.path.exists(path):
-        LOGGER.info(f"Cleaning download: {path}")
-        shutil.rmtree(path)
+    """Moves path into the trash and returns at once, the data is deleted in the background"""
+    if not os.path.exists(path):
+        return
+    LOGGER.info(f"Cleaning download: {path}")
+    target = path
+    try:
+        os.makedirs(TRASH_DIR, exist_ok=True)
+        target = os.path.join(TRASH_DIR, f"{time.time_ns()}-{os.path.basename(path.rstrip('/'))}")
+        os.rename(path, target)
+    except OSError as e:
+        LOGGER.warning(f"Could not move {path} to the trash, deleting it in place: {e}")
+        target = path
+    _trash_executor().submit(_purge, target)
+
+
+def purge_trash():
+    """Deletes whatever an earlier run left in the trash"""
+    if os.path.isdir(TRASH_DIR):
+        for name in os.listdir(TRASH_DIR):
+            _trash_executor().submit(_purge, os.path.join(TRASH_DIR, name))
 
 
 def start_cleanup():
-    try:
-        shutil.rmtree(DOWNLOAD_DIR)
-    except FileNotFoundError:
-        pass
+    clean_download(DOWNLOAD_DIR)
 
 
 def clean_all():
@@ -49,10 +109,8 @@ def clean_all():
     except Exception as e:
         LOGGER.warning(f"Error during aria2 cleanup: {e}")
     
-    try:
-        shutil.rmtree(DOWNLOAD_DIR)
-    except FileNotFoundError:
-        pass
+    # Whatever the worker has not deleted before the process exits is purged on the next start
+    clean_download(DOWNLOAD_DIR)
 
 
 def exit_clean_up(signal, frame):
@@ -113,6 +171,15 @@ def get_base_name(orig_path: str):
         raise NotSupportedExtractionArchive('File format not supported for extraction')
 
 
+def get_md5(file_path, block_size=1024 * 1024):
+    """:return The hex MD5 of the file, read in blocks so it is never held in memory"""
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
 def get_mime_type(file_path):
     mime = magic.Magic(mime=True)
     mime_type = mime.from_file(file_path)
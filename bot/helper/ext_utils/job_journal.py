@@ -0,0 +1,182 @@
+# Append-only journal of job events, so a crash or restart does not silently lose every running job.
+# Events are buffered in memory and written to a SQLite database in WAL mode in batches by the timer wheel,
+# recording never waits on the disk.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from telegram import Update
+
+from bot import LOGGER, DOWNLOAD_DIR, JOB_JOURNAL_PATH, JOB_RESUME
+from bot.helper.ext_utils.bot_utils import setInterval
+
+FLUSH_INTERVAL = 1
+
+
+class JobJournal:
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.__path = path
+        self.__flush_interval = flush_interval
+        self.__pending = []
+        self.__lock = threading.Lock()
+        self.__db_lock = threading.Lock()
+        self.__conn = None
+        self.__flusher = None
+
+    def __connect(self):
+        if self.__conn is None:
+            conn = sqlite3.connect(self.__path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL with synchronous=NORMAL only syncs at checkpoints, losing at most the last batches on power loss
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS job_events ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER NOT NULL, ts REAL NOT NULL, '
+                         'event TEXT NOT NULL, data TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS job_events_uid ON job_events (uid)')
+            self.__conn = conn
+        return self.__conn
+
+    def record(self, uid, event, **data):
+        with self.__lock:
+            self.__pending.append((uid, time.time(), event, json.dumps(data, default=str)))
+            if self.__flusher is None:
+                self.__flusher = setInterval(self.__flush_interval, self.flush)
+
+    def flush(self):
+        with self.__lock:
+            rows, self.__pending = self.__pending, []
+        if not rows:
+            return
+        with self.__db_lock:
+            try:
+                conn = self.__connect()
+                with conn:
+                    conn.executemany('INSERT INTO job_events (uid, ts, event, data) VALUES (?, ?, ?, ?)', rows)
+            except sqlite3.Error as e:
+                LOGGER.error(f"Could not write to the job journal: {e}")
+                with self.__lock:
+                    self.__pending[:0] = rows
+
+    def unfinished_jobs(self):
+        """:return {uid: state} of every job without a 'finished' event, state merges the data of all its events"""
+        self.flush()
+        with self.__db_lock:
+            rows = self.__connect().execute('SELECT uid, event, data FROM job_events ORDER BY id').fetchall()
+        jobs = {}
+        for uid, event, data in rows:
+            if event == 'finished':
+                jobs.pop(uid, None)
+                continue
+            state = jobs.setdefault(uid, {'uid': uid})
+            data = json.loads(data)
+            state.update(data)
+            state['last_event'] = event
+            if event == 'upload_uri':
+                # Every file of a directory upload has its own session
+                state.setdefault('upload_sessions', {})[data['file_path']] = {
+                    'upload_uri': data['upload_uri'], 'account': data.get('account')}
+        return jobs
+
+    def cancel_unfinished(self):
+        """
+        Marks every unfinished job as cancelled, written before returning since the caller is about to restart
+        :return: the uids of the cancelled jobs
+        """
+        uids = list(self.unfinished_jobs())
+        data = json.dumps({'result': 'cancelled'})
+        with self.__db_lock:
+            conn = self.__connect()
+            with conn:
+                conn.executemany('INSERT INTO job_events (uid, ts, event, data) VALUES (?, ?, ?, ?)',
+                                 [(uid, time.time(), 'finished', data) for uid in uids])
+        return uids
+
+    def compact(self):
+        """Drops the events of finished jobs"""
+        self.flush()
+        with self.__db_lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute("DELETE FROM job_events WHERE uid IN "
+                             "(SELECT uid FROM job_events WHERE event = 'finished')")
+
+
+journal = JobJournal(JOB_JOURNAL_PATH)
+
+# kind of a job: fn(update, state) which starts the job again
+_resumers = {}
+
+
+def register_resumer(kind, fn):
+    _resumers[kind] = fn
+
+
+def record_job(listener, kind, link, **extra):
+    """Records a new job with everything needed to start it again after a restart"""
+    journal.record(listener.uid, 'created', kind=kind, link=link,
+                   chat_id=listener.update.effective_chat.id, update=listener.update.to_dict(),
+                   isTar=getattr(listener, 'isTar', False), extract=getattr(listener, 'extract', False),
+                   tag=getattr(listener, 'tag', None), priority=getattr(listener, 'priority', None), **extra)
+
+
+def record_finished(uid, result):
+    journal.record(uid, 'finished', result=result)
+
+
+def cancel_unfinished_jobs():
+    """
+    Cancels every job in the journal before a restart which deletes the downloads, so they are not resumed
+    :return: False if the journal could not be written, the downloads have to be kept for the recovery then
+    """
+    try:
+        uids = journal.cancel_unfinished()
+    except sqlite3.Error as e:
+        LOGGER.error(f"Could not cancel the jobs in the job journal: {e}")
+        return False
+    LOGGER.info(f"Cancelled {len(uids)} jobs for a restart")
+    return True
+
+
+async def recover_jobs(application):
+    """Resumes or fails every job which was still running when the bot stopped. Runs once before polling starts"""
+    from bot.helper.ext_utils import fs_utils
+    try:
+        jobs = journal.unfinished_jobs()
+    except sqlite3.Error as e:
+        LOGGER.error(f"Could not read the job journal: {e}")
+        return
+    for uid, state in jobs.items():
+        resumer = _resumers.get(state.get('kind'))
+        chat_id = state.get('chat_id')
+        name = state.get('link') or 'your file'
+        resumed = False
+        if JOB_RESUME and resumer is not None and 'update' in state:
+            try:
+                update = Update.de_json(state['update'], application.bot)
+                # Files which were already being uploaded are kept, the upload is resumed instead
+                if state.get('gid') is None and not os.path.exists(state.get('upload_path') or ''):
+                    fs_utils.clean_download(f'{DOWNLOAD_DIR}{uid}')
+                resumer(update, state)
+                resumed = True
+                LOGGER.info(f"Resumed job {uid} ({state.get('last_event')})")
+            except Exception as e:
+                LOGGER.error(f"Could not resume job {uid}: {e}")
+        if not resumed:
+            record_finished(uid, 'failed')
+            fs_utils.clean_download(f'{DOWNLOAD_DIR}{uid}')
+        if chat_id is None:
+            continue
+        if resumed:
+            text = f"Resuming <code>{name}</code> after a restart"
+        else:
+            text = f"<code>{name}</code> was interrupted by a restart, please send it again"
+        try:
+            await application.bot.send_message(chat_id, text, reply_to_message_id=uid, parse_mode='HTML')
+        except Exception as e:
+            LOGGER.error(f"Could not notify chat {chat_id} about job {uid}: {e}")
+    try:
+        journal.compact()
+    except sqlite3.Error as e:
+        LOGGER.error(f"Could not compact the job journal: {e}")
@@ -0,0 +1,59 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class SpeedSampler:
+    """
+    Keeps a small ring buffer of (timestamp, bytes) samples for a single job and derives a smoothed
+    transfer speed from it. The rate over the buffered window is fed into an exponentially weighted
+    average whose weight depends on the elapsed time, so the result does not depend on how often the
+    status is rendered.
+    """
+
+    def __init__(self, window=10, time_constant=10.0, min_gap=0.5):
+        self.__samples = deque(maxlen=window)
+        self.__time_constant = time_constant
+        self.__min_gap = min_gap
+        self.__speed = 0.0
+        self.__lock = threading.Lock()
+
+    def add(self, processed_bytes):
+        """
+        Records the number of bytes processed so far
+        :return: smoothed speed in bytes/second
+        """
+        now = time.monotonic()
+        processed_bytes = processed_bytes or 0
+        with self.__lock:
+            if self.__samples:
+                last_time, last_bytes = self.__samples[-1]
+                if processed_bytes < last_bytes:
+                    # The job restarted (new gid, retried upload...), old samples are meaningless now
+                    self.__samples.clear()
+                    self.__speed = 0.0
+                elif now - last_time < self.__min_gap:
+                    return self.__speed
+            self.__samples.append((now, processed_bytes))
+            if len(self.__samples) >= 2:
+                first_time, first_bytes = self.__samples[0]
+                prev_time = self.__samples[-2][0]
+                window_speed = (processed_bytes - first_bytes) / (now - first_time)
+                weight = 1 - math.exp(-(now - prev_time) / self.__time_constant)
+                if len(self.__samples) == 2:
+                    self.__speed = window_speed
+                else:
+                    self.__speed += weight * (window_speed - self.__speed)
+            return self.__speed
+
+    def speed(self):
+        with self.__lock:
+            return self.__speed
+
+    def eta(self, remaining_bytes):
+        """:return: seconds left to transfer remaining_bytes, None if the speed is unknown"""
+        speed = self.speed()
+        if speed <= 0:
+            return None
+        return max(0, remaining_bytes) / speed
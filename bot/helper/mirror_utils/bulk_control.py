@@ -0,0 +1,159 @@
+# Pause, resume and cancel many jobs at once. Jobs are selected by user, chat, state and engine. All aria2 jobs
+# are handled by a single system.multicall request, the jobs of the other engines are cancelled concurrently.
+import asyncio
+
+from bot import aria2, download_dict, download_dict_lock, LOGGER
+from bot.helper.ext_utils.executors import run_in_executor
+from bot.helper.mirror_utils.status_utils.aria_download_status import AriaDownloadStatus
+from bot.helper.mirror_utils.status_utils.extract_status import ExtractStatus
+from bot.helper.mirror_utils.status_utils.mega_status import MegaDownloadStatus
+from bot.helper.mirror_utils.status_utils.queue_status import QueueStatus
+from bot.helper.mirror_utils.status_utils.tar_status import TarStatus
+from bot.helper.mirror_utils.status_utils.telegram_download_status import TelegramDownloadStatus
+from bot.helper.mirror_utils.status_utils.upload_status import UploadStatus
+from bot.helper.mirror_utils.status_utils.youtube_dl_download_status import YoutubeDLDownloadStatus
+
+ENGINES = {
+    AriaDownloadStatus: 'aria2',
+    MegaDownloadStatus: 'mega',
+    TelegramDownloadStatus: 'telegram',
+    YoutubeDLDownloadStatus: 'youtube-dl',
+}
+STATES = ('queued', 'downloading', 'paused', 'processing', 'uploading')
+CANCELLABLE_STATES = ('queued', 'downloading', 'paused')
+
+
+def job_engine(download):
+    """:return Name of the engine downloading the job, None if it has not started downloading"""
+    return ENGINES.get(type(download))
+
+
+def job_state(download):
+    """:return One of STATES, decided from the kind of status object so no RPC is needed"""
+    if isinstance(download, QueueStatus):
+        return 'queued'
+    if isinstance(download, UploadStatus):
+        return 'uploading'
+    if isinstance(download, (TarStatus, ExtractStatus)):
+        return 'processing'
+    if isinstance(download, AriaDownloadStatus) and getattr(download.getListener(), 'paused', False):
+        return 'paused'
+    return 'downloading'
+
+
+class JobFilter:
+    """Selects jobs by user:me|<id>|@name, chat:here|<id>, state:<state> and engine:<engine> arguments"""
+
+    USAGE = "Filters: user:me|id|@name chat:here|id state:" + '|'.join(STATES) + " engine:" + '|'.join(ENGINES.values())
+
+    def __init__(self, user=None, chat=None, state=None, engine=None):
+        self.user = user
+        self.chat = chat
+        self.state = state
+        self.engine = engine
+
+    @classmethod
+    def parse(cls, args, update):
+        """:raises ValueError: if an argument is not a known filter"""
+        job_filter = cls()
+        for arg in args:
+            key, _, value = arg.partition(':')
+            value = value.strip()
+            if key == 'user' and value:
+                if value == 'me':
+                    job_filter.user = update.message.from_user.id
+                elif value.startswith('@'):
+                    job_filter.user = value[1:].lower()
+                else:
+                    job_filter.user = int(value)
+            elif key == 'chat' and value:
+                job_filter.chat = update.effective_chat.id if value == 'here' else int(value)
+            elif key == 'state' and value in STATES:
+                job_filter.state = value
+            elif key == 'engine' and value in ENGINES.values():
+                job_filter.engine = value
+            else:
+                raise ValueError(f"Unknown filter {arg}")
+        return job_filter
+
+    def matches(self, download):
+        message = getattr(download, 'message', None)
+        if self.user is not None:
+            if message is None:
+                return False
+            user = message.from_user
+            if isinstance(self.user, int) and user.id != self.user:
+                return False
+            if isinstance(self.user, str) and (user.username or '').lower() != self.user:
+                return False
+        if self.chat is not None and (message is None or message.chat.id != self.chat):
+            return False
+        if self.state is not None and job_state(download) != self.state:
+            return False
+        if self.engine is not None and job_engine(download) != self.engine:
+            return False
+        return True
+
+
+def select_jobs(job_filter):
+    """:return [(uid, status)] of the jobs matching job_filter"""
+    with download_dict_lock:
+        return [(uid, dl) for uid, dl in download_dict.items() if job_filter.matches(dl)]
+
+
+def _aria2_batch(method, downloads):
+    """Calls method for every download in one round trip. :return the downloads aria2 accepted it for"""
+    if not downloads:
+        return []
+    try:
+        results = aria2.multicall([(method, dl.gid()) for dl in downloads])
+    except Exception as e:
+        LOGGER.error(f"aria2 {method} of {len(downloads)} downloads failed: {e}")
+        return []
+    done = []
+    for dl, result in zip(downloads, results):
+        if isinstance(result, dict) and 'code' in result:
+            LOGGER.info(f"aria2 {method} {dl.gid()}: {result.get('message')}")
+        else:
+            done.append(dl)
+    return done
+
+
+async def pause_jobs(jobs):
+    """Pauses the running aria2 downloads among jobs, they keep their download slot. :return (paused, skipped)"""
+    downloads = [dl for _, dl in jobs if isinstance(dl, AriaDownloadStatus) and job_state(dl) == 'downloading']
+    # Set before the request, the pause notification of aria2 must not be taken for an inactivity stop
+    for dl in downloads:
+        dl.getListener().paused = True
+    paused = await run_in_executor('io', _aria2_batch, 'forcePause', downloads)
+    for dl in set(downloads) - set(paused):
+        dl.getListener().paused = False
+    return len(paused), len(jobs) - len(paused)
+
+
+async def resume_jobs(jobs):
+    """:return (resumed, skipped)"""
+    downloads = [dl for _, dl in jobs if isinstance(dl, AriaDownloadStatus) and job_state(dl) == 'paused']
+    resumed = await run_in_executor('io', _aria2_batch, 'unpause', downloads)
+    for dl in resumed:
+        dl.getListener().paused = False
+    return len(resumed), len(jobs) - len(resumed)
+
+
+async def cancel_jobs(jobs):
+    """Cancels every queued, downloading or paused job among jobs. :return (cancelled, skipped)"""
+    targets = [dl for _, dl in jobs if job_state(dl) in CANCELLABLE_STATES]
+    downloads = [dl for dl in targets if isinstance(dl, AriaDownloadStatus)]
+    others = [dl for dl in targets if not isinstance(dl, AriaDownloadStatus)]
+    # aria2 reports the removal with a stop notification, which fails the job as stopped by the user
+    for dl in downloads:
+        dl.cancelled_by_user = True
+    results = await asyncio.gather(run_in_executor('io', _aria2_batch, 'forceRemove', downloads),
+                                   *(run_in_executor('io', dl.download().cancel_download) for dl in others),
+                                   return_exceptions=True)
+    removed = results[0] if isinstance(results[0], list) else []
+    # Downloads aria2 did not remove keep running, their stop must not be taken for a cancel later
+    for dl in set(downloads) - set(removed):
+        dl.cancelled_by_user = False
+    cancelled = len(removed) + sum(1 for result in results[1:] if not isinstance(result, Exception))
+    return cancelled, len(jobs) - cancelled
@@ -1,7 +1,7 @@
 import asyncio
 import threading
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import aioaria2
 
@@ -145,6 +145,21 @@ class _AioAria2Download:
 		self._update()
 		return int(self._last_status.get("numSeeders", 0))
 
+	@property
+	def files(self) -> List[Dict[str, Any]]:
+		"""Selected files of the download as dicts with path, length and completed_length"""
+		self._update()
+		files = []
+		for f in self._last_status.get("files") or []:
+			if f.get("selected", "true") != "true":
+				continue
+			files.append({
+				"path": f.get("path") or "",
+				"length": int(f.get("length", 0)),
+				"completed_length": int(f.get("completedLength", 0)),
+			})
+		return files
+
 
 class AioAria2API:
 	def __init__(self, rpc_url: str, token: Optional[str] = None):
@@ -255,4 +270,26 @@ class AioAria2API:
 			try:
 				self._run(self._http.remove(gid))
 			except Exception:
-				pass
\ No newline at end of file
+				pass
+
+	def change_position(self, gid: str, pos: int, how: str = "POS_SET") -> Optional[int]:
+		"""Moves a waiting download in aria2's queue. :return: its new position, None if it is not waiting"""
+		self._ensure_http()
+		try:
+			return self._run(self._http.changePosition(gid, pos, how))
+		except Exception:
+			return None
+
+	def multicall(self, calls: Iterable[Tuple[Any, ...]]) -> List[Any]:
+		"""
+		Runs several aria2 methods in a single system.multicall request
+		:param calls: tuples of (method without the aria2. prefix, *params)
+		:return: per call its result, or the fault dict aria2 returned for it
+		"""
+		# aioaria2 puts the secret into every call of the multicall, where aria2 expects it
+		methods = [{"methodName": f"aria2.{method}", "params": list(params)} for method, *params in calls]
+		if not methods:
+			return []
+		self._ensure_http()
+		results = self._run(self._http.multicall(methods))
+		return [r[0] if isinstance(r, list) and len(r) == 1 else r for r in results]
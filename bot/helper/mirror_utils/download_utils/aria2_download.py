@@ -1,9 +1,12 @@
 from bot import aria2, download_dict_lock, download_dict
 from bot.helper.ext_utils.bot_utils import *
+from bot.helper.ext_utils.executors import get_executor
+from bot.helper.ext_utils.disk_ledger import expect_size, no_space_error, expected_footprint
+from bot.helper.ext_utils.job_journal import journal
+from bot.helper.mirror_utils.pipeline import JobPriority
 from .download_helper import DownloadHelper
 from bot.helper.mirror_utils.status_utils.aria_download_status import AriaDownloadStatus
 from bot.helper.telegram_helper.message_utils import *
-import threading
 from time import sleep
 
 
@@ -21,8 +24,40 @@ class AriaDownloadHelper(DownloadHelper):
 			LOGGER.warning("Received download start with None gid, skipping")
 			return
 		
+		self.__check_space(gid)
 		update_all_messages()
 
+	def __check_space(self, gid, retries=3):
+		"""Reserves the space of a started download once aria2 knows its length, stops it if it can never fit"""
+		dl = getDownloadByGid(gid)
+		try:
+			size = aria2.get_download(gid).total_length
+		except Exception as e:
+			LOGGER.warning(f"Could not get the length of {gid}: {e}")
+			return
+		if dl is None or size == 0:
+			# The length of http downloads and of torrents following a magnet is known a little later
+			if retries > 0:
+				setTimeout(5, lambda: self.__check_space(gid, retries - 1))
+			return
+		listener = dl.getListener()
+		if not expect_size(listener, size, lambda: self.__hold(listener, gid), lambda: self.__unhold(listener, gid)):
+			LOGGER.info(f"Stopping {gid}, it does not fit on the disk")
+			# The job is gone before aria2 reports the removal, so the stop handler ignores it
+			listener.onDownloadError(no_space_error(expected_footprint(listener, size)))
+			aria2.remove([gid])
+
+	@staticmethod
+	def __hold(listener, gid):
+		# Set before the request, the pause notification of aria2 must not be taken for an inactivity stop
+		listener.paused = True
+		aria2.multicall([('forcePause', gid)])
+
+	@staticmethod
+	def __unhold(listener, gid):
+		aria2.multicall([('unpause', gid)])
+		listener.paused = False
+
 	def __onDownloadComplete(self, api, gid):
 		LOGGER.info(f"onDownloadComplete: {gid}")
 		
@@ -62,11 +97,11 @@ class AriaDownloadHelper(DownloadHelper):
 				update_all_messages()
 				LOGGER.info(f'Changed gid from {gid} to {new_gid}')
 			else:
-				if dl: threading.Thread(target=dl.getListener().onDownloadComplete).start()
+				if dl: get_executor('transfer').submit(dl.getListener().onDownloadComplete)
 		except Exception as e:
 			LOGGER.error(f"Error in __onDownloadComplete for gid {gid}: {e}")
 			# Still try to complete the download
-			if dl: threading.Thread(target=dl.getListener().onDownloadComplete).start()
+			if dl: get_executor('transfer').submit(dl.getListener().onDownloadComplete)
 
 	@new_thread
 	def __onDownloadPause(self, api, gid):
@@ -87,6 +122,10 @@ class AriaDownloadHelper(DownloadHelper):
 			if getattr(dl, 'cancelled_by_user', False):
 				dl.getListener().onDownloadError('Download stopped by user!')
 				return
+			# Paused by /pauseall, the job waits for /resumeall
+			if getattr(dl.getListener(), 'paused', False):
+				update_all_messages()
+				return
 			# Otherwise treat as auto-stop (stalled/dead)
 			try:
 				download = aria2.get_download(gid)
@@ -231,6 +270,42 @@ class AriaDownloadHelper(DownloadHelper):
 			with download_dict_lock:
 				download_dict[listener.uid] = AriaDownloadStatus(download.gid, listener)
 				LOGGER.info(f"Started: {download.gid} DIR:{download.dir} ")
+			journal.record(listener.uid, 'gid', gid=download.gid)
+			self.reposition(download.gid, getattr(listener, 'priority', None))
 		except Exception as e:
 			LOGGER.error(f"Error in add_download: {e}")
 			listener.onDownloadError(f'Failed to add download: {str(e)}')
+
+	def reposition(self, gid, priority):
+		"""Moves a download which waits in aria2's own queue to the front or the back according to priority"""
+		if priority == JobPriority.HIGH:
+			aria2.change_position(gid, 0, 'POS_SET')
+		elif priority == JobPriority.LOW:
+			aria2.change_position(gid, 0, 'POS_END')
+
+	def attach(self, gid, listener):
+		"""
+		Takes over a download which aria2 kept running while the bot was down
+		:return: True if aria2 still knows gid, False if the download has to be added again
+		"""
+		try:
+			download = aria2.get_download(gid)
+			status = download.status
+			if status == 'complete' and download.followed_by_ids:
+				gid = download.followed_by_ids[0]
+				download = aria2.get_download(gid)
+				status = download.status
+		except Exception as e:
+			LOGGER.info(f"Cannot attach to {gid}: {e}")
+			return False
+		if status not in ('active', 'waiting', 'paused', 'complete'):
+			return False
+		# A download paused before the restart stays paused until it is resumed
+		listener.paused = status == 'paused'
+		with download_dict_lock:
+			download_dict[listener.uid] = AriaDownloadStatus(gid, listener)
+		LOGGER.info(f"Attached to {gid} ({status})")
+		if status == 'complete':
+			# The completion notification was sent while nobody was listening
+			listener.onDownloadComplete()
+		return True
@@ -3,6 +3,8 @@ from bot import LOGGER, download_dict, download_dict_lock, MEGA_KEY
 from .download_helper import DownloadHelper
 from ..status_utils.mega_status import MegaDownloadStatus
 from bot.helper.ext_utils.bot_utils import setInterval
+from bot.helper.ext_utils.disk_ledger import expect_size, no_space_error, expected_footprint
+from bot.helper.ext_utils.executors import get_executor
 from pathlib import Path
 import subprocess, time
 
@@ -97,7 +99,7 @@ class MegaDownloader:
         self.__listener.onDownloadError(error)
 
     def __onDownloadComplete(self):
-        self.__listener.onDownloadComplete()
+        get_executor('transfer').submit(self.__listener.onDownloadComplete)
 
     def add_download(self, link, path):
         Path(path).mkdir(parents=True, exist_ok=True)
@@ -106,6 +108,20 @@ class MegaDownloader:
         info = self.__mega_client.getDownloadInfo(gid)
         file_name = info['name']
         file_size = info['total_length']
+        held = []
+
+        def hold():
+            # megasdkrest cannot pause, a download which has to wait for space is cancelled and added again
+            self.__mega_client.cancelDl(gid)
+            held.append(gid)
+
+        if not expect_size(self.__listener, file_size, hold,
+                           lambda: get_executor('transfer').submit(self.add_download, link, path)):
+            self.__mega_client.cancelDl(gid)
+            self.__onDownloadError(no_space_error(expected_footprint(self.__listener, file_size)))
+            return
+        if held:
+            return
         self.__onDownloadStart(file_name, file_size, gid)
         LOGGER.info(f'Started mega download with gid: {gid}')
 
@@ -5,6 +5,7 @@ import time
 from pyrogram import Client
 from bot import LOGGER, download_dict, download_dict_lock, TELEGRAM_API, \
     TELEGRAM_HASH, USER_SESSION_STRING
+from bot.helper.ext_utils.executors import get_executor
 from .download_helper import DownloadHelper
 from ..status_utils.telegram_download_status import TelegramDownloadStatus
 
@@ -103,7 +104,7 @@ class TelegramDownloadHelper(DownloadHelper):
             if download:
                 self.__onDownloadStart(media.file_name, media.file_size, media.file_id)
                 LOGGER.info(f'Downloading telegram file with id: {media.file_id}')
-                threading.Thread(target=self.__download, args=(_message, path)).start()
+                get_executor('transfer').submit(self.__download, _message, path)
             else:
                 self.__onDownloadError('File already being downloaded!')
         else:
@@ -3,6 +3,8 @@ import time
 from yt_dlp import YoutubeDL, DownloadError
 from bot import download_dict_lock, download_dict
 from ..status_utils.youtube_dl_download_status import YoutubeDLDownloadStatus
+from bot.helper.ext_utils.disk_ledger import expect_size, no_space_error, expected_footprint
+from bot.helper.ext_utils.executors import get_executor
 import logging
 import re
 import threading
@@ -151,6 +153,16 @@ class YoutubeDLHelper(DownloadHelper):
             self.opts['ignoreerrors'] = True
         self.__onDownloadStart()
         self.extractMetaData(link, qual)
+        held = []
+        # Nothing is downloaded yet, a video which has to wait for space starts once it fits
+        if self.size and not expect_size(self.__listener, int(self.size), lambda: held.append(True),
+                                         lambda: get_executor('transfer').submit(self.__start, link, path, qual)):
+            self.onDownloadError(no_space_error(expected_footprint(self.__listener, int(self.size))))
+            return
+        if not held:
+            self.__start(link, path, qual)
+
+    def __start(self, link, path, qual):
         LOGGER.info(f"Downloading with YT-DL: {link}")
         self.__gid = f"{self.vid_id}{self.__listener.uid}"
         if qual == "audio":
@@ -0,0 +1,357 @@
+# The mirror pipeline: every job passes through a download, an optional post-process (tar/extract) and an upload
+# stage. Each stage admits a limited number of jobs at a time and keeps the rest waiting in its own queue.
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from bot import LOGGER, DOWNLOAD_STAGE_LIMIT, PROCESS_STAGE_LIMIT, UPLOAD_STAGE_LIMIT, \
+    USER_DOWNLOAD_LIMIT, CHAT_DOWNLOAD_LIMIT, SMALL_JOB_SIZE, OWNER_ID, download_dict, download_dict_lock
+from bot.helper.ext_utils.bot_utils import MirrorStatus, setInterval
+from bot.helper.ext_utils.disk_ledger import disk_ledger, expected_footprint, no_space_error
+from bot.helper.ext_utils.executors import get_executor
+from bot.helper.ext_utils.job_journal import journal
+from bot.helper.mirror_utils.status_utils.queue_status import QueueStatus
+
+
+class JobPriority:
+    # Lower values are admitted first
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    NAMES = {'high': HIGH, 'normal': NORMAL, 'low': LOW}
+
+    @staticmethod
+    def name(priority):
+        return next(name for name, value in JobPriority.NAMES.items() if value == priority)
+
+
+def default_priority(listener, flag=None):
+    """:return The priority requested with -p, else high for the owner of the bot and normal for everyone else"""
+    if flag is not None:
+        return JobPriority.NAMES[flag]
+    if listener.message.from_user.id == OWNER_ID:
+        return JobPriority.HIGH
+    return JobPriority.NORMAL
+
+
+def pop_priority_flag(args):
+    """Removes '-p <priority>' from the command arguments. :return The remaining arguments and the priority name"""
+    for index, arg in enumerate(args[:-1]):
+        if arg == '-p' and args[index + 1].lower() in JobPriority.NAMES:
+            return args[:index] + args[index + 2:], args[index + 1].lower()
+    return args, None
+
+
+class StageJob:
+    def __init__(self, uid, fn, hold, listener=None, size=0):
+        self.uid = uid
+        self.fn = fn
+        # Held jobs keep their slot after fn returns, until release() is called
+        self.hold = hold
+        self.listener = listener
+        self.size = size
+        self.enqueued_at = time.time()
+        self.user_id = None
+        self.chat_id = None
+        self.priority = JobPriority.NORMAL
+        if listener is not None:
+            self.user_id = listener.message.from_user.id
+            self.chat_id = listener.update.effective_chat.id
+            self.priority = getattr(listener, 'priority', JobPriority.NORMAL)
+        if 0 < size <= SMALL_JOB_SIZE:
+            # Small jobs are done in seconds, they should not wait behind large ones
+            self.priority = JobPriority.HIGH
+
+
+# Seconds between admission retries of jobs which wait for disk space freed outside the bot
+DISK_RECHECK_INTERVAL = 10
+
+
+class PipelineStage:
+    def __init__(self, name, limit, executor_name, queued_status, footprint=None):
+        self.name = name
+        self.queued_status = queued_status
+        self.__limit = max(1, limit)
+        self.__executor_name = executor_name
+        # fn(job) returning the bytes the job needs on disk in this stage, None if the stage needs none
+        self.__footprint = footprint
+        self._queue = []
+        self._active = {}
+        self._lock = threading.RLock()
+        self._paused = False
+
+    @property
+    def limit(self):
+        return self.__limit
+
+    def set_limit(self, limit):
+        with self._lock:
+            self.__limit = max(1, limit)
+        self._dispatch()
+
+    def pause(self):
+        """Stops admitting jobs, the running ones are not affected"""
+        with self._lock:
+            self._paused = True
+
+    def submit(self, uid, fn, hold=False, listener=None, size=0):
+        job = StageJob(uid, fn, hold, listener, size)
+        with self._lock:
+            self._queue.append(job)
+        self._dispatch()
+        return job
+
+    def set_priority(self, uid, priority):
+        """Changes the priority of a waiting or running job. :return True if the stage knows the job"""
+        found = False
+        with self._lock:
+            for job in self._queue + list(self._active.values()):
+                if job.uid == uid:
+                    job.priority = priority
+                    found = True
+        if found:
+            self._dispatch()
+        return found
+
+    def position(self, uid):
+        """:return 1 based position of the job in the queue, 0 if it is not waiting"""
+        with self._lock:
+            for index, job in enumerate(self._ordered_queue()):
+                if job.uid == uid:
+                    return index + 1
+        return 0
+
+    def cancel(self, uid):
+        """Removes a waiting job. :return True if the job was still waiting"""
+        with self._lock:
+            for job in self._queue:
+                if job.uid == uid:
+                    self._queue.remove(job)
+                    return True
+        return False
+
+    def release(self, uid):
+        """Frees the slot held by uid. Calling it for a job which holds no slot is a no-op"""
+        with self._lock:
+            released = self._active.pop(uid, None) is not None
+        if released:
+            self._dispatch()
+
+    def counts(self):
+        with self._lock:
+            return len(self._active), len(self._queue)
+
+    def _ordered_queue(self):
+        """:return The waiting jobs in the order they will be admitted"""
+        return sorted(self._queue, key=lambda job: job.priority)
+
+    def _can_admit(self, job):
+        if len(self._active) >= self.__limit:
+            return False
+        return self.__footprint is None or disk_ledger.fits(job.uid, self.__footprint(job))
+
+    def _next_job(self):
+        for job in self._ordered_queue():
+            if self._can_admit(job):
+                return job
+        return None
+
+    def _dispatch(self):
+        admitted = []
+        with self._lock:
+            while self._queue and not self._paused:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._queue.remove(job)
+                self._active[job.uid] = job
+                if self.__footprint is not None:
+                    disk_ledger.reserve(job.uid, self.__footprint(job))
+                admitted.append(job)
+        for job in admitted:
+            LOGGER.info(f"[{self.name}] Admitted job {job.uid}")
+            get_executor(self.__executor_name).submit(self.__run, job)
+
+    def __run(self, job):
+        try:
+            job.fn()
+        except Exception as e:
+            LOGGER.error(f"[{self.name}] Job {job.uid} failed: {e}")
+            if job.listener is not None:
+                if self.name == 'download':
+                    job.listener.onDownloadError(str(e))
+                else:
+                    job.listener.onUploadError(str(e))
+        finally:
+            if not job.hold:
+                self.release(job.uid)
+
+
+class FairShareStage(PipelineStage):
+    """
+    Admits jobs by deficit round robin over the users who have jobs waiting, weighted by bytes,
+    so one user queueing many links cannot starve the others. Higher priorities are always served
+    first, the round robin applies within a priority. Each user and each chat may also be capped
+    to a number of concurrently running jobs (0 disables a cap).
+    """
+    # Bytes credited to every waiting user per round
+    QUANTUM = 1024 ** 3
+    # Charged for jobs whose size is not known before they start, e.g. most links and magnets
+    DEFAULT_COST = 1024 ** 3
+
+    def __init__(self, name, limit, executor_name, queued_status, user_limit=0, chat_limit=0, footprint=None):
+        super().__init__(name, limit, executor_name, queued_status, footprint)
+        self.user_limit = user_limit
+        self.chat_limit = chat_limit
+        # user_id -> bytes the user may still be admitted for, in round robin order
+        self._deficits = OrderedDict()
+        self._charged = {}
+
+    def _cost(self, job):
+        return job.size or self.DEFAULT_COST
+
+    def _user_queues(self, jobs):
+        queues = OrderedDict((user, []) for user in self._deficits)
+        for job in jobs:
+            queues.setdefault(job.user_id, []).append(job)
+        return queues
+
+    def _levels(self):
+        """:return The waiting jobs grouped by priority, highest first"""
+        levels = sorted({job.priority for job in self._queue})
+        return [[job for job in self._queue if job.priority == level] for level in levels]
+
+    def _running(self, attr, value):
+        return sum(1 for job in self._active.values() if getattr(job, attr) == value)
+
+    def _can_admit(self, job):
+        if not super()._can_admit(job):
+            return False
+        if self.user_limit and self._running('user_id', job.user_id) >= self.user_limit:
+            return False
+        if self.chat_limit and self._running('chat_id', job.chat_id) >= self.chat_limit:
+            return False
+        return True
+
+    def _ordered_queue(self):
+        # Interleaves the users' queues in round robin order. This is an estimate, since
+        # the actual order also depends on the sizes and on which caps are reached first
+        ordered = []
+        for level in self._levels():
+            queues = [jobs for jobs in self._user_queues(level).values() if jobs]
+            for index in range(max((len(jobs) for jobs in queues), default=0)):
+                ordered.extend(jobs[index] for jobs in queues if index < len(jobs))
+        return ordered
+
+    def _next_job(self):
+        for user, jobs in self._user_queues(self._queue).items():
+            if jobs:
+                self._deficits.setdefault(user, 0)
+            else:
+                # Users with nothing waiting do not save up credit for later
+                del self._deficits[user]
+        for level in self._levels():
+            job = self._next_fair_job(self._user_queues(level))
+            if job is not None:
+                return job
+        return None
+
+    def _next_fair_job(self, queues):
+        # Credit the fewest whole rounds after which some eligible user can afford its next job,
+        # the first such user in round robin order wins
+        best_user, best_rounds = None, None
+        for user, jobs in queues.items():
+            if not jobs or not self._can_admit(jobs[0]):
+                continue
+            rounds = max(0, math.ceil((self._cost(jobs[0]) - self._deficits[user]) / self.QUANTUM))
+            if best_rounds is None or rounds < best_rounds:
+                best_user, best_rounds = user, rounds
+        if best_user is None:
+            return None
+        for user, jobs in queues.items():
+            if jobs and self._can_admit(jobs[0]):
+                self._deficits[user] += best_rounds * self.QUANTUM
+        job = queues[best_user][0]
+        self._deficits[best_user] -= self._cost(job)
+        self._charged[job.uid] = (best_user, self._cost(job))
+        # The served user goes to the back of the round
+        self._deficits.move_to_end(best_user)
+        return job
+
+    def release(self, uid, size=0):
+        """Frees the slot of uid. size is the real size of the job once known, the user is charged the difference"""
+        with self._lock:
+            user, charged = self._charged.pop(uid, (None, 0))
+            if size and user in self._deficits:
+                self._deficits[user] -= size - charged
+        super().release(uid)
+
+
+download_stage = FairShareStage('download', DOWNLOAD_STAGE_LIMIT, 'transfer', MirrorStatus.STATUS_WAITING,
+                                USER_DOWNLOAD_LIMIT, CHAT_DOWNLOAD_LIMIT,
+                                footprint=lambda job: expected_footprint(job.listener, job.size))
+# Archiving or extracting writes a second copy next to the download
+process_stage = PipelineStage('process', PROCESS_STAGE_LIMIT, 'cpu', MirrorStatus.STATUS_QUEUED_PROCESS,
+                              footprint=lambda job: job.size * 2)
+upload_stage = PipelineStage('upload', UPLOAD_STAGE_LIMIT, 'transfer', MirrorStatus.STATUS_QUEUED_UPLOAD)
+
+for _stage in (download_stage, process_stage):
+    disk_ledger.on_space_freed(_stage._dispatch)
+
+_disk_recheck = None
+
+
+def start_disk_recheck():
+    """Retries the jobs waiting for disk space periodically, for space freed outside the bot. Called once at startup"""
+    global _disk_recheck
+    if _disk_recheck is None:
+        _disk_recheck = setInterval(DISK_RECHECK_INTERVAL, disk_ledger.space_freed)
+
+
+_draining = threading.Event()
+
+
+def start_drain():
+    """Stops admitting jobs to every stage and refuses new ones, so the running ones can finish before a restart"""
+    _draining.set()
+    for stage in (download_stage, process_stage, upload_stage):
+        stage.pause()
+
+
+def is_draining():
+    return _draining.is_set()
+
+
+def drain_progress():
+    """:return {stage name: (running, waiting)} of every stage"""
+    return {stage.name: stage.counts() for stage in (download_stage, process_stage, upload_stage)}
+
+
+def enqueue(stage, listener, name, size, fn, hold=False):
+    """Shows the job as queued for stage and hands fn to the stage"""
+    with download_dict_lock:
+        download_dict[listener.uid] = QueueStatus(name, size, listener, stage)
+    journal.record(listener.uid, 'stage', stage=stage.name)
+    stage.submit(listener.uid, fn, hold=hold, listener=listener, size=size)
+
+
+def queue_download(listener, name, start_fn, size=0):
+    """Queues start_fn in the download stage. The slot is held until the listener reports completion or an error"""
+    if _draining.is_set():
+        listener.onDownloadError('The bot is restarting, please send it again in a minute')
+        return
+    footprint = expected_footprint(listener, size)
+    if disk_ledger.too_large(footprint):
+        listener.onDownloadError(no_space_error(footprint))
+        return
+    enqueue(download_stage, listener, name, size, start_fn, hold=True)
+
+
+def set_job_priority(listener, priority):
+    """Changes the priority of a job in whichever stage it currently waits or runs"""
+    listener.priority = priority
+    journal.record(listener.uid, 'priority', priority=priority)
+    for stage in (download_stage, process_stage, upload_stage):
+        stage.set_priority(listener.uid, priority)
@@ -1,6 +1,9 @@
 from bot import aria2, DOWNLOAD_DIR, LOGGER
-from bot.helper.ext_utils.bot_utils import MirrorStatus
+from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_file_size
 from .status import Status
+import os
+
+MAX_DETAIL_FILES = 20
 
 
 def get_download(gid):
@@ -45,7 +48,7 @@ class AriaDownloadStatus(Status):
         return self.aria_download().completed_length
 
     def speed(self):
-        return self.aria_download().download_speed_string()
+        return self.readable_speed()
 
     def name(self):
         return self.aria_download().name
@@ -57,20 +60,38 @@ class AriaDownloadStatus(Status):
         return self.aria_download().total_length_string()
 
     def eta(self):
-        return self.aria_download().eta_string()
+        return self.readable_eta()
 
     def status(self):
         download = self.aria_download()
         if download.is_waiting:
             status = MirrorStatus.STATUS_WAITING
         elif download.is_paused:
-            status = MirrorStatus.STATUS_CANCELLED
+            status = MirrorStatus.STATUS_PAUSED if getattr(self.__listener, 'paused', False) \
+                else MirrorStatus.STATUS_CANCELLED
         elif download.has_failed:
             status = MirrorStatus.STATUS_FAILED
         else:
             status = MirrorStatus.STATUS_DOWNLOADING
         return status
 
+    def details(self):
+        download = self.aria_download()
+        fields = [('Peers', download.connections)]
+        if getattr(self, 'is_torrent', False):
+            fields.append(('Seeders', download.num_seeders))
+        files = download.files
+        if len(files) > 1:
+            for f in files[:MAX_DETAIL_FILES]:
+                try:
+                    percent = round(f['completed_length'] * 100 / f['length'], 2)
+                except ZeroDivisionError:
+                    percent = 0
+                fields.append((os.path.basename(f['path']), f"{percent}% of {get_readable_file_size(f['length'])}"))
+            if len(files) > MAX_DETAIL_FILES:
+                fields.append(('Files', f'{len(files) - MAX_DETAIL_FILES} more not shown'))
+        return fields
+
     def aria_download(self):
         self.__update()
         return self.__download
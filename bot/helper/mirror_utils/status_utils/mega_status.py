@@ -1,5 +1,5 @@
 from bot import DOWNLOAD_DIR
-from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_file_size, get_readable_time
+from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_file_size
 from .status import Status
 
 
@@ -36,21 +36,11 @@ class MegaDownloadStatus(Status):
     def progress(self):
         return f'{round(self.progress_raw(), 2)}%'
 
-    def speed_raw(self):
-        """
-        :return: Download speed in Bytes/Seconds
-        """
-        return self.obj.download_speed
-
     def speed(self):
-        return f'{get_readable_file_size(self.speed_raw())}/s'
+        return self.readable_speed()
 
     def eta(self):
-        try:
-            seconds = (self.size_raw() - self.processed_bytes()) / self.speed_raw()
-            return f'{get_readable_time(seconds)}'
-        except ZeroDivisionError:
-            return '-'
+        return self.readable_eta()
 
     def download(self):
         return self.obj
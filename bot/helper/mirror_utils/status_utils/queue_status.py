@@ -0,0 +1,71 @@
+from bot import DOWNLOAD_DIR, LOGGER
+from bot.helper.ext_utils.bot_utils import get_readable_file_size
+from .status import Status
+
+
+class QueueStatus(Status):
+    """Status of a job which waits for a free slot in a pipeline stage"""
+
+    def __init__(self, name, size, listener, stage):
+        self.__name = name
+        self.__size = size
+        self.__listener = listener
+        self.__stage = stage
+        self.uid = listener.uid
+        self.message = listener.message
+
+    def gid(self):
+        return str(self.uid)
+
+    def stage(self):
+        return self.__stage
+
+    def queue_position(self):
+        return self.__stage.position(self.uid)
+
+    def progress(self):
+        return '0%'
+
+    def speed(self):
+        return '-'
+
+    def name(self):
+        return self.__name
+
+    def path(self):
+        return f"{DOWNLOAD_DIR}{self.uid}"
+
+    def size_raw(self):
+        return self.__size or 0
+
+    def size(self):
+        return get_readable_file_size(self.size_raw())
+
+    def eta(self):
+        return '-'
+
+    def status(self):
+        return self.__stage.queued_status
+
+    def processed_bytes(self):
+        return 0
+
+    def download(self):
+        return self
+
+    def details(self):
+        from bot.helper.mirror_utils.pipeline import JobPriority
+        return [('Priority', JobPriority.name(getattr(self.__listener, 'priority', JobPriority.NORMAL)))]
+
+    def getListener(self):
+        return self.__listener
+
+    def cancel_download(self):
+        if not self.__stage.cancel(self.uid):
+            LOGGER.info(f"{self.__name} already left the {self.__stage.name} queue")
+            return
+        LOGGER.info(f"Removed from the {self.__stage.name} queue: {self.__name}")
+        if self.__stage.name == 'download':
+            self.__listener.onDownloadError('Cancelled by user')
+        else:
+            self.__listener.onUploadError('Cancelled by user')
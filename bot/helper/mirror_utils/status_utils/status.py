@@ -1,4 +1,6 @@
 # Generic status class. All other status classes must inherit this class
+from bot.helper.ext_utils.bot_utils import get_readable_file_size, get_readable_time
+from bot.helper.ext_utils.speed_sampler import SpeedSampler
 
 
 class Status:
@@ -38,3 +40,36 @@ class Status:
     def processed_bytes(self):
         """:return The size of file that has been processed (downloaded/uploaded/archived)"""
         raise NotImplementedError
+
+    def details(self):
+        """:return List of (label, value) pairs only shown in the per-job detail view"""
+        return []
+
+    def sampler(self) -> SpeedSampler:
+        """:return The speed sampler tracking this job, created on first use"""
+        try:
+            return self._sampler
+        except AttributeError:
+            self._sampler = SpeedSampler()
+            return self._sampler
+
+    def sample(self):
+        """Adds processed_bytes() to the speed sampler, called by the sampling job of the timer wheel"""
+        self.sampler().add(self.processed_bytes())
+
+    def speed_raw(self):
+        """:return Smoothed speed in bytes per second as of the last sample"""
+        return self.sampler().speed()
+
+    def eta_raw(self):
+        """:return Seconds left for the job to complete, None if the speed is not known yet"""
+        return self.sampler().eta(self.size_raw() - self.processed_bytes())
+
+    def readable_speed(self):
+        return f'{get_readable_file_size(self.speed_raw())}/s'
+
+    def readable_eta(self):
+        seconds = self.eta_raw()
+        if seconds is None:
+            return '-'
+        return get_readable_time(seconds)
@@ -1,5 +1,5 @@
 from .status import Status
-from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_file_size, get_readable_time
+from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_file_size
 from bot import DOWNLOAD_DIR
 
 
@@ -31,6 +31,12 @@ class UploadStatus(Status):
     def name(self):
         return self.obj.name
 
+    def details(self):
+        service_account = getattr(self.obj, 'service_account', None)
+        if service_account:
+            return [('Service account', service_account)]
+        return []
+
     def progress_raw(self):
         try:
             return self.obj.uploaded_bytes / self.__size * 100
@@ -40,18 +46,8 @@ class UploadStatus(Status):
     def progress(self):
         return f'{round(self.progress_raw(), 2)}%'
 
-    def speed_raw(self):
-        """
-        :return: Upload speed in Bytes/Seconds
-        """
-        return self.obj.speed()
-
     def speed(self):
-        return f'{get_readable_file_size(self.speed_raw())}/s'
+        return self.readable_speed()
 
     def eta(self):
-        try:
-            seconds = (self.__size - self.obj.uploaded_bytes) / self.speed_raw()
-            return f'{get_readable_time(seconds)}'
-        except ZeroDivisionError:
-            return '-'
+        return self.readable_eta()
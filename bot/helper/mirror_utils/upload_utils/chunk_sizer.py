@@ -0,0 +1,46 @@
+# Chunk size of a resumable Drive upload. Chunks are streamed from the file, so the size only bounds how much has to
+# be sent again after a failed chunk and how often a round trip interrupts the upload.
+import time
+
+from bot import DRIVE_CHUNK_MIN, DRIVE_CHUNK_MAX
+
+# Drive wants chunks in multiples of 256 KiB
+CHUNK_ALIGN = 256 * 1024
+# Chunks are sized to take about this long at the measured throughput, long enough to make the round trip
+# between chunks negligible, short enough that a failed chunk costs little to send again
+TARGET_CHUNK_SECONDS = 10
+
+
+class ChunkSizer:
+    """Starts at the smallest chunk size, doubles it at most per chunk while chunks finish quickly and halves it
+    after an error or a chunk which took much longer than the target"""
+
+    def __init__(self, minimum=DRIVE_CHUNK_MIN, maximum=DRIVE_CHUNK_MAX):
+        self.__min = self.__align(minimum)
+        self.__max = max(self.__align(maximum), self.__min)
+        self.size = self.__min
+        self.__started = None
+
+    @staticmethod
+    def __align(size):
+        return max(CHUNK_ALIGN, int(size) // CHUNK_ALIGN * CHUNK_ALIGN)
+
+    def __set(self, size):
+        self.size = min(self.__max, max(self.__min, self.__align(size)))
+
+    def start(self):
+        self.__started = time.monotonic()
+
+    def sent(self, size):
+        """Adapts the size to the throughput of the chunk of size bytes which was just sent"""
+        if self.__started is None or size <= 0:
+            return
+        elapsed = max(time.monotonic() - self.__started, 1e-3)
+        wanted = size / elapsed * TARGET_CHUNK_SECONDS
+        if wanted > self.size:
+            self.__set(min(wanted, self.size * 2))
+        elif wanted < self.size / 2:
+            self.__set(self.size / 2)
+
+    def failed(self):
+        self.__set(self.size / 2)
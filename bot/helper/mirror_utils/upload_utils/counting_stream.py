@@ -0,0 +1,51 @@
+# Media of a resumable Drive upload which counts the bytes the HTTP layer reads from it. googleapiclient hands a
+# slice of the stream to http.client, which reads and sends it in small blocks, so the read position follows the
+# bytes actually sent instead of jumping once per finished chunk.
+import os
+
+from googleapiclient.http import MediaIoBaseUpload
+
+
+class CountingFile:
+    """File opened for reading which remembers how far it has been read"""
+
+    def __init__(self, path):
+        self.__fd = open(path, 'rb')
+        # Offset of the last byte read, a retried chunk seeks back and is counted again as it is sent
+        self.position = 0
+
+    def read(self, size=-1):
+        data = self.__fd.read(size)
+        self.position = self.__fd.tell()
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Seeking to the end only measures the size of the file
+        position = self.__fd.seek(offset, whence)
+        if whence == os.SEEK_SET:
+            self.position = position
+        return position
+
+    def tell(self):
+        return self.__fd.tell()
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.__fd.close()
+
+
+class CountingFileUpload(MediaIoBaseUpload):
+    """Resumable upload of a local file, position is the number of bytes sent so far"""
+
+    def __init__(self, path, mimetype, chunksize):
+        self.__file = CountingFile(path)
+        super().__init__(self.__file, mimetype, chunksize=chunksize, resumable=True)
+
+    @property
+    def position(self):
+        return self.__file.position
+
+    def close(self):
+        self.__file.close()
@@ -0,0 +1,124 @@
+# Process wide cache of Drive credentials and services. Credentials are loaded once per account and refreshed
+# shortly before they expire, so no Drive call has to wait for a token refresh. The discovery document is fetched
+# once, and a service is built once per thread and account, as the http transport of a service is not thread safe.
+import datetime
+import logging
+import os
+import pickle
+import threading
+
+import requests
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build_from_document
+
+from bot.helper.ext_utils.bot_utils import setInterval
+
+LOGGER = logging.getLogger(__name__)
+
+TOKEN_FILE = 'token.pickle'
+# Check https://developers.google.com/drive/scopes for all available scopes
+OAUTH_SCOPE = ['https://www.googleapis.com/auth/drive']
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/drive/v3/rest'
+REFRESH_INTERVAL = 60
+# Tokens expiring within this margin are refreshed by the background refresh
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+
+class DriveAuth:
+    def __init__(self):
+        # account: credentials, account is the service account file name or None for token.pickle
+        self.__credentials = {}
+        self.__document = None
+        # Bumped when credentials are replaced, services built before are rebuilt on their next use
+        self.__generation = 0
+        self.__lock = threading.Lock()
+        self.__refresh_lock = threading.Lock()
+        self.__local = threading.local()
+        self.__refresher = None
+
+    @staticmethod
+    def __load(account):
+        if account is not None:
+            return service_account.Credentials.from_service_account_file(f'accounts/{account}', scopes=OAUTH_SCOPE)
+        credentials = None
+        if os.path.exists(TOKEN_FILE):
+            with open(TOKEN_FILE, 'rb') as f:
+                credentials = pickle.load(f)
+        if credentials is None or not credentials.valid:
+            if credentials and credentials.expired and credentials.refresh_token:
+                credentials.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', OAUTH_SCOPE)
+                LOGGER.info(flow)
+                credentials = flow.run_console(port=0)
+            DriveAuth.__save(credentials)
+        return credentials
+
+    @staticmethod
+    def __save(credentials):
+        # Save the credentials for the next run
+        with open(TOKEN_FILE, 'wb') as token:
+            pickle.dump(credentials, token)
+
+    def credentials(self, account=None):
+        with self.__lock:
+            credentials = self.__credentials.get(account)
+            if credentials is None:
+                credentials = self.__load(account)
+                self.__credentials[account] = credentials
+                if self.__refresher is None:
+                    self.__refresher = setInterval(REFRESH_INTERVAL, self.refresh_expiring)
+            return credentials
+
+    def __discovery_document(self):
+        with self.__lock:
+            if self.__document is None:
+                response = requests.get(DISCOVERY_URL, timeout=30)
+                response.raise_for_status()
+                self.__document = response.text
+            return self.__document
+
+    def service(self, account=None):
+        """:return The Drive service of the calling thread for account"""
+        services = getattr(self.__local, 'services', None)
+        if services is None or self.__local.generation != self.__generation:
+            services = self.__local.services = {}
+            self.__local.generation = self.__generation
+        service = services.get(account)
+        if service is None:
+            credentials = self.credentials(account)
+            if not credentials.valid:
+                self.__refresh(account, credentials)
+            service = build_from_document(self.__discovery_document(), credentials=credentials)
+            services[account] = service
+        return service
+
+    def invalidate(self, account=None):
+        """Drops the cached credentials of account, e.g. after a new token.pickle was uploaded"""
+        with self.__lock:
+            self.__credentials.pop(account, None)
+            self.__generation += 1
+
+    def __refresh(self, account, credentials):
+        with self.__refresh_lock:
+            credentials.refresh(Request())
+            if account is None:
+                self.__save(credentials)
+
+    def refresh_expiring(self):
+        """Refreshes every token which expires soon, runs on the timer wheel"""
+        with self.__lock:
+            cached = list(self.__credentials.items())
+        deadline = datetime.datetime.utcnow() + REFRESH_MARGIN
+        for account, credentials in cached:
+            if credentials.expiry is None or credentials.expiry > deadline:
+                continue
+            try:
+                self.__refresh(account, credentials)
+            except Exception as e:
+                LOGGER.error(f"Could not refresh the Drive token of {account or TOKEN_FILE}: {e}")
+
+
+drive_auth = DriveAuth()
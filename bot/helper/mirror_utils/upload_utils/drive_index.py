@@ -0,0 +1,255 @@
+# Local index of every file and folder below GDRIVE_FOLDER_ID, so /list searches the whole tree without a Drive
+# request. The tree is crawled once, then kept up to date by the uploads and clones of the bot and by polling the
+# changes feed of the drive. Names are searched with a SQLite FTS5 table.
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from bot import LOGGER, parent_id, USE_SERVICE_ACCOUNTS, DRIVE_INDEX_PATH, DRIVE_INDEX_SYNC_INTERVAL
+from bot.helper.ext_utils.bot_utils import setInterval
+from bot.helper.ext_utils.executors import get_executor
+from bot.helper.mirror_utils.upload_utils.drive_auth import drive_auth
+from bot.helper.mirror_utils.upload_utils.sa_pool import sa_pool
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_FIELDS = 'id, name, mimeType, size, parents, modifiedTime, trashed'
+PAGE_SIZE = 1000
+NUM_RETRIES = 5
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS files ('
+    'id TEXT PRIMARY KEY, name TEXT NOT NULL, parent TEXT, mime_type TEXT, size INTEGER, modified TEXT)',
+    'CREATE INDEX IF NOT EXISTS files_parent ON files (parent)',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5 (name, content='files', content_rowid='rowid')",
+    # Keep the external content FTS table in step with files
+    'CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN '
+    'INSERT INTO names (rowid, name) VALUES (new.rowid, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN '
+    "INSERT INTO names (names, rowid, name) VALUES ('delete', old.rowid, old.name); END",
+    'CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF name ON files BEGIN '
+    "INSERT INTO names (names, rowid, name) VALUES ('delete', old.rowid, old.name); "
+    'INSERT INTO names (rowid, name) VALUES (new.rowid, new.name); END',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+]
+UPSERT = ('INSERT INTO files (id, name, parent, mime_type, size, modified) VALUES (?, ?, ?, ?, ?, ?) '
+          'ON CONFLICT (id) DO UPDATE SET name = excluded.name, parent = excluded.parent, '
+          'mime_type = excluded.mime_type, size = excluded.size, modified = excluded.modified')
+DELETE_TREE = ('WITH RECURSIVE tree (id) AS '
+               '(SELECT ? UNION SELECT files.id FROM files JOIN tree ON files.parent = tree.id) '
+               'DELETE FROM files WHERE id IN tree')
+PATH = ('WITH RECURSIVE chain (id, name, parent, depth) AS (SELECT id, name, parent, 0 FROM files WHERE id = ? '
+        'UNION ALL SELECT files.id, files.name, files.parent, depth + 1 '
+        'FROM files JOIN chain ON files.id = chain.parent) '
+        'SELECT name FROM chain ORDER BY depth DESC')
+
+
+def _row(file, parent):
+    size = file.get('size')
+    return file['id'], file['name'], parent, file.get('mimeType'), int(size) if size is not None else None, \
+        file.get('modifiedTime')
+
+
+def _match_query(term):
+    """:return The FTS5 query matching names with a word starting with each word of term, None if it has none"""
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class DriveIndex:
+    def __init__(self, path, interval=DRIVE_INDEX_SYNC_INTERVAL):
+        self.__path = path
+        self.__interval = interval
+        self.__lock = threading.Lock()
+        self.__conn = None
+        self.__root = None
+        self.__team_drive = None
+        self.__ready = False
+        self.__syncer = None
+
+    def __connect(self):
+        if self.__conn is None:
+            conn = sqlite3.connect(self.__path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self.__conn = conn
+        return self.__conn
+
+    def __get_meta(self, key):
+        row = self.__connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def __set_meta(self, conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    @staticmethod
+    def __service():
+        return drive_auth.service(sa_pool.pick() if USE_SERVICE_ACCOUNTS else None)
+
+    def ready(self):
+        """:return True once the first crawl has finished, search results are complete from then on"""
+        return self.__ready
+
+    def start(self):
+        """Loads the index or crawls the folder when there is none yet, then polls the changes feed"""
+        if self.__interval <= 0:
+            return
+        try:
+            with self.__lock:
+                self.__connect()
+            service = self.__service()
+            root = service.files().get(fileId=parent_id, supportsTeamDrives=True,
+                                       fields='id, teamDriveId').execute(num_retries=NUM_RETRIES)
+            self.__root = root['id']
+            self.__team_drive = root.get('teamDriveId')
+            with self.__lock:
+                crawled = self.__get_meta('root') == self.__root and self.__get_meta('page_token') is not None
+            if not crawled:
+                self.__crawl(service)
+        except Exception as e:
+            LOGGER.error(f"Could not build the Drive index, /list asks Drive directly: {e}")
+            return
+        self.__ready = True
+        self.__syncer = setInterval(self.__interval, self.sync)
+
+    def __crawl(self, service):
+        LOGGER.info("Crawling the Drive folder for the index")
+        # The token is taken before the crawl, changes made while it runs are applied by the first sync
+        page_token = self.__changes_args(service.changes().getStartPageToken).execute(
+            num_retries=NUM_RETRIES)['startPageToken']
+        with self.__lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute('DELETE FROM files')
+                conn.execute('DELETE FROM meta')
+        count = self.__crawl_tree(service, self.__root)
+        with self.__lock:
+            conn = self.__connect()
+            with conn:
+                self.__set_meta(conn, 'root', self.__root)
+                self.__set_meta(conn, 'page_token', page_token)
+        LOGGER.info(f"Indexed {count} files and folders")
+
+    def __crawl_tree(self, service, folder_id):
+        """Adds everything below folder_id, one folder at a time. :return the number of entries added"""
+        count = 0
+        folders = [folder_id]
+        while folders:
+            folder = folders.pop()
+            page_token = None
+            while True:
+                response = service.files().list(supportsTeamDrives=True, includeTeamDriveItems=True,
+                                                q=f"'{folder}' in parents and trashed = false",
+                                                spaces='drive', pageSize=PAGE_SIZE, pageToken=page_token,
+                                                fields=f'nextPageToken, files({FILE_FIELDS})'
+                                                ).execute(num_retries=NUM_RETRIES)
+                files = response.get('files', [])
+                with self.__lock:
+                    conn = self.__connect()
+                    with conn:
+                        conn.executemany(UPSERT, [_row(file, folder) for file in files])
+                count += len(files)
+                folders.extend(file['id'] for file in files if file.get('mimeType') == FOLDER_MIME_TYPE)
+                page_token = response.get('nextPageToken')
+                if page_token is None:
+                    break
+        return count
+
+    def __crawl_new_folder(self, folder_id):
+        # The service of the syncing thread is not thread safe, the worker uses its own
+        count = self.__crawl_tree(self.__service(), folder_id)
+        LOGGER.info(f"Indexed {count} files and folders of a folder moved into the tree")
+
+    def __changes_args(self, method, **kwargs):
+        if self.__team_drive is not None:
+            kwargs['teamDriveId'] = self.__team_drive
+        return method(supportsTeamDrives=True, **kwargs)
+
+    def sync(self):
+        """Applies the changes feed since the last sync, runs on the timer wheel"""
+        with self.__lock:
+            page_token = self.__get_meta('page_token')
+        service = self.__service()
+        while page_token is not None:
+            response = self.__changes_args(service.changes().list, pageToken=page_token, pageSize=PAGE_SIZE,
+                                           includeTeamDriveItems=True, includeRemoved=True, spaces='drive',
+                                           fields=f'nextPageToken, newStartPageToken, '
+                                                  f'changes(fileId, removed, file({FILE_FIELDS}))'
+                                           ).execute(num_retries=NUM_RETRIES)
+            new_folders = self.__apply(response.get('changes', []))
+            # A folder moved into the tree brings its children, which the feed does not list. They are crawled on the
+            # drive_list executor, the timer wheel does not wait for a whole tree
+            for folder in new_folders:
+                get_executor('drive_list').submit(self.__crawl_new_folder, folder)
+            next_token = response.get('nextPageToken')
+            with self.__lock:
+                conn = self.__connect()
+                with conn:
+                    self.__set_meta(conn, 'page_token', next_token or response.get('newStartPageToken'))
+            page_token = next_token
+
+    def __known(self, conn, folder_id):
+        return folder_id == self.__root or \
+            conn.execute('SELECT 1 FROM files WHERE id = ?', (folder_id,)).fetchone() is not None
+
+    def __apply(self, changes):
+        """:return The folders which were not in the index before"""
+        new_folders = []
+        with self.__lock:
+            conn = self.__connect()
+            with conn:
+                for change in changes:
+                    file = change.get('file')
+                    if change.get('removed') or file is None or file.get('trashed'):
+                        conn.execute(DELETE_TREE, (change['fileId'],))
+                        continue
+                    parent = next((p for p in file.get('parents', []) if self.__known(conn, p)), None)
+                    if parent is None:
+                        # Outside of the tree, or moved out of it
+                        conn.execute(DELETE_TREE, (file['id'],))
+                        continue
+                    if file.get('mimeType') == FOLDER_MIME_TYPE and not self.__known(conn, file['id']):
+                        new_folders.append(file['id'])
+                    conn.execute(UPSERT, _row(file, parent))
+        return new_folders
+
+    def add(self, file_id, name, parent, mime_type, size=None):
+        """Indexes a file or folder the bot just created, if it is inside the tree"""
+        if not self.__ready:
+            return
+        try:
+            with self.__lock:
+                conn = self.__connect()
+                with conn:
+                    if self.__known(conn, parent):
+                        modified = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                        conn.execute(UPSERT, (file_id, name, parent, mime_type, size, modified))
+        except sqlite3.Error as e:
+            LOGGER.error(f"Could not add {name} to the Drive index: {e}")
+
+    def search(self, term, offset=0, limit=10):
+        """
+        Finds the entries whose name has a word starting with every word of term, newest first
+        :return: ([{'id', 'name', 'mimeType', 'size', 'path'}], total number of matches)
+        """
+        query = _match_query(term)
+        if query is None:
+            return [], 0
+        with self.__lock:
+            conn = self.__connect()
+            total = conn.execute('SELECT count(*) FROM names WHERE names MATCH ?', (query,)).fetchone()[0]
+            rows = conn.execute('SELECT files.id, files.name, files.mime_type, files.size FROM names '
+                                'JOIN files ON files.rowid = names.rowid WHERE names MATCH ? '
+                                'ORDER BY files.modified DESC LIMIT ? OFFSET ?', (query, limit, offset)).fetchall()
+            results = []
+            for file_id, name, mime_type, size in rows:
+                path = '/'.join(row[0] for row in conn.execute(PATH, (file_id,)))
+                results.append({'id': file_id, 'name': name, 'mimeType': mime_type, 'size': size, 'path': path})
+        return results, total
+
+
+drive_index = DriveIndex(DRIVE_INDEX_PATH)
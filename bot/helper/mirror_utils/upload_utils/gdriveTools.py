@@ -1,5 +1,8 @@
 import os
-import pickle
+import random
+import threading
+import concurrent.futures
+from concurrent.futures import wait, FIRST_EXCEPTION
 import urllib.parse as urlparse
 from urllib.parse import parse_qs
 
@@ -8,49 +11,197 @@ import json
 import requests
 import logging
 
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from tenacity import *
 
 from bot import parent_id, DOWNLOAD_DIR, IS_TEAM_DRIVE, INDEX_URL, \
-    USE_SERVICE_ACCOUNTS, download_dict
+    USE_SERVICE_ACCOUNTS, SHARE_TOP_LEVEL_ONLY, DRIVE_DEDUP, download_dict
 from bot.helper.ext_utils.bot_utils import *
-from bot.helper.ext_utils.fs_utils import get_mime_type
+from bot.helper.ext_utils.executors import get_executor
+from bot.helper.ext_utils.fs_utils import get_mime_type, get_md5
+from bot.helper.ext_utils.job_journal import journal
+from bot.helper.mirror_utils.upload_utils.chunk_sizer import ChunkSizer
+from bot.helper.mirror_utils.upload_utils.counting_stream import CountingFileUpload
+from bot.helper.mirror_utils.upload_utils.drive_auth import drive_auth
+from bot.helper.mirror_utils.upload_utils.drive_index import drive_index
+from bot.helper.mirror_utils.upload_utils.sa_pool import sa_pool
 
 LOGGER = logging.getLogger(__name__)
 logging.getLogger('googleapiclient.discovery').setLevel(logging.ERROR)
-SERVICE_ACCOUNT_INDEX = 0
+# Reasons of errors which mean too many requests were sent, as opposed to a quota which is used up
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+# Drive accepts at most 100 calls in one batch request
+BATCH_SIZE = 100
+BATCH_ATTEMPTS = 5
+
+
+def error_reason(err: HttpError):
+    """:return The reason of the first error in the json body of err, None if there is none"""
+    if not err.resp.get('content-type', '').startswith('application/json'):
+        return None
+    try:
+        return json.loads(err.content).get('error').get('errors')[0].get('reason')
+    except (ValueError, AttributeError, IndexError, TypeError):
+        return None
+
+
+def list_entry(file, path):
+    """:return The /list line of a Drive file or folder, path is its path below GDRIVE_FOLDER_ID for the index link"""
+    if file.get('mimeType') == "application/vnd.google-apps.folder":  # Detect Whether Current Entity is a Folder or File.
+        entry = f"⁍ <a href='https://drive.google.com/drive/folders/{file.get('id')}'>{file.get('name')}</a> (folder)"
+        if INDEX_URL is not None:
+            url = requests.utils.requote_uri(f'{INDEX_URL}/{path}/')
+            entry += f' | <a href="{url}"> Index URL</a>'
+    elif file.get('mimeType') == 'application/vnd.google-apps.shortcut':
+        # Excluded index link as indexes cant download or open these shortcuts
+        entry = f"⁍ <a href='https://drive.google.com/drive/folders/{file.get('id')}'>{file.get('name')}</a> (shortcut)"
+    else:
+        entry = f"⁍ <a href='https://drive.google.com/uc?id={file.get('id')}&export=download'>{file.get('name')}</a>" \
+                f" ({get_readable_file_size(int(file.get('size') or 0))})"
+        if INDEX_URL is not None:
+            url = requests.utils.requote_uri(f'{INDEX_URL}/{path}')
+            entry += f' | <a href="{url}"> Index URL</a>'
+    return entry
+
+
+class _SharedBackoff:
+    """Delay shared by every Drive worker, a rate limit hit by one worker slows all of them down"""
+
+    def __init__(self, base=1, maximum=64):
+        self.__base = base
+        self.__max = maximum
+        self.__delay = 0
+        self.__until = 0
+        self.__lock = threading.Lock()
+
+    def wait(self):
+        with self.__lock:
+            delay = self.__until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def hit(self):
+        with self.__lock:
+            self.__delay = min(max(self.__delay * 2, self.__base), self.__max)
+            # Jitter keeps the workers from sending their next requests all at once
+            self.__until = max(self.__until, time.monotonic() + self.__delay + random.uniform(0, self.__base))
+        LOGGER.info(f"Drive rate limit hit, backing off for {self.__delay}s")
+
+    def success(self):
+        with self.__lock:
+            self.__delay = self.__delay / 2 if self.__delay > self.__base else 0
+
+
+drive_backoff = _SharedBackoff()
 
 
 class GoogleDriveHelper:
-    def __init__(self, name=None, listener=None):
-        self.__G_DRIVE_TOKEN_FILE = "token.pickle"
-        # Check https://developers.google.com/drive/scopes for all available scopes
-        self.__OAUTH_SCOPE = ['https://www.googleapis.com/auth/drive']
+    def __init__(self, name=None, listener=None, sessions=None):
+        """:param sessions: {file path: {'upload_uri', 'account'}} of uploads interrupted by a restart"""
         # Redirect URI for installed apps, can be left as is
         self.__REDIRECT_URI = "urn:ietf:wg:oauth:2.0:oob"
         self.__G_DRIVE_DIR_MIME_TYPE = "application/vnd.google-apps.folder"
         self.__G_DRIVE_BASE_DOWNLOAD_URL = "https://drive.google.com/uc?id={}&export=download"
         self.__G_DRIVE_DIR_BASE_DOWNLOAD_URL = "https://drive.google.com/drive/folders/{}"
+        self.__PERMISSION = {
+            'role': 'reader',
+            'type': 'anyone',
+            'value': None,
+            'withLink': True
+        }
         self.__listener = listener
-        self.__service = self.authorize()
+        self.service_account = None
+        self.authorize()
         self.__listener = listener
-        self._file_uploaded_bytes = 0
-        self.uploaded_bytes = 0
-        self.UPDATE_INTERVAL = 5
+        self.__progress_lock = threading.Lock()
+        # file path: media of the files being uploaded right now, counting the bytes sent so far
+        self.__media = {}
+        self.__finished_bytes = 0
+        # file path: resumable session of its last attempt, a retry continues it from the committed offset
+        self.__sessions = dict(sessions or {})
+        # folder id: Future of {name: [children]}, each target folder is listed at most once for dedup
+        self.__listings = {}
+        self.__listing_lock = threading.Lock()
+        # Folders created by this helper, known to be empty without listing them
+        self.__created_folders = set()
         self.start_time = 0
-        self.total_time = 0
-        self._should_update = True
         self.is_uploading = True
         self.is_cancelled = False
         self.status = None
-        self.updater = None
         self.name = name
-        self.update_interval = 3
+
+    def __drive(self):
+        """:return The Drive service of the calling thread, workers of a directory upload never share one"""
+        return drive_auth.service(self.service_account)
+
+    def __execute(self, request):
+        """Executes request once the shared backoff allows it, a rate limit error makes every worker back off"""
+        drive_backoff.wait()
+        try:
+            response = request.execute()
+        except HttpError as err:
+            if error_reason(err) in RATE_LIMIT_REASONS:
+                drive_backoff.hit()
+            raise
+        drive_backoff.success()
+        return response
+
+    def __batch(self, requests):
+        """
+        Executes requests in Drive batch requests of up to BATCH_SIZE calls. Calls failing with a rate limit or
+        server error are sent again in the next batch, after the shared backoff
+        :return: the responses in the order of requests
+        """
+        responses = {}
+        pending = list(enumerate(requests))
+        errors = {}
+        for _ in range(BATCH_ATTEMPTS):
+            errors = {}
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    responses[int(request_id)] = response
+                else:
+                    errors[int(request_id)] = exception
+
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = self.__drive().new_batch_http_request(callback=callback)
+                for i, request in pending[start:start + BATCH_SIZE]:
+                    batch.add(request, request_id=str(i))
+                self.__execute(batch)
+            if not errors:
+                return [responses[i] for i in range(len(requests))]
+            for err in errors.values():
+                if not isinstance(err, HttpError) or (err.resp.status < 500 and
+                                                      error_reason(err) not in RATE_LIMIT_REASONS):
+                    raise err
+            drive_backoff.hit()
+            pending = [(i, request) for i, request in pending if i in errors]
+        raise next(iter(errors.values()))
+
+    def __set_permissions(self, file_ids):
+        if file_ids:
+            self.__batch([self.__drive().permissions().create(supportsTeamDrives=True, fileId=file_id, fields='id',
+                                                              body=self.__PERMISSION) for file_id in file_ids])
+
+    def __create_directories(self, folders):
+        """
+        Creates the (name, parent id) folders with batch requests, shared unless only the top level folder is
+        :return: the ids of the new folders in the order of folders
+        """
+        created = self.__batch([self.__drive().files().create(supportsTeamDrives=True, fields='id', body={
+            'name': name,
+            'mimeType': self.__G_DRIVE_DIR_MIME_TYPE,
+            'parents': [folder_parent_id],
+        }) for name, folder_parent_id in folders])
+        file_ids = [file['id'] for file in created]
+        self.__created_folders.update(file_ids)
+        for file_id, (name, folder_parent_id) in zip(file_ids, folders):
+            drive_index.add(file_id, name, folder_parent_id, self.__G_DRIVE_DIR_MIME_TYPE)
+        if not IS_TEAM_DRIVE and not SHARE_TOP_LEVEL_ONLY:
+            self.__set_permissions(file_ids)
+        return file_ids
 
     def cancel(self):
         self.is_cancelled = True
@@ -58,11 +209,11 @@ class GoogleDriveHelper:
 
     def speed(self):
         """
-        It calculates the average upload speed and returns it in bytes/seconds unit
+        It calculates the average upload speed over the measured upload time and returns it in bytes/seconds unit
         :return: Upload speed in bytes/second
         """
         try:
-            return self.uploaded_bytes / self.total_time
+            return self.uploaded_bytes / (time.time() - self.start_time)
         except ZeroDivisionError:
             return 0
 
@@ -77,15 +228,21 @@ class GoogleDriveHelper:
         parsed = urlparse.urlparse(link)
         return parse_qs(parsed.query)['id'][0]
 
-    @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
-           retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
-    def _on_upload_progress(self):
-        if self.status is not None:
-            chunk_size = self.status.total_size * self.status.progress() - self._file_uploaded_bytes
-            self._file_uploaded_bytes = self.status.total_size * self.status.progress()
-            LOGGER.debug(f'Uploading {self.name}, chunk size: {get_readable_file_size(chunk_size)}')
-            self.uploaded_bytes += chunk_size
-            self.total_time += self.update_interval
+    @property
+    def uploaded_bytes(self):
+        """:return Bytes of the finished files plus the bytes sent so far of the files being uploaded"""
+        with self.__progress_lock:
+            return self.__finished_bytes + sum(media.position for media in self.__media.values())
+
+    def __file_progress(self, file_path, media=None, finished_size=None):
+        """Tracks the media of file_path while it is sent, or counts its finished_size once it has been uploaded"""
+        with self.__progress_lock:
+            if media is not None:
+                self.__media[file_path] = media
+                return
+            self.__media.pop(file_path, None)
+            if finished_size is not None:
+                self.__finished_bytes += finished_size
 
     def __upload_empty_file(self, path, file_name, mime_type, parent_id=None):
         media_body = MediaFileUpload(path,
@@ -98,33 +255,113 @@ class GoogleDriveHelper:
         }
         if parent_id is not None:
             file_metadata['parents'] = [parent_id]
-        return self.__service.files().create(supportsTeamDrives=True,
+        return self.__drive().files().create(supportsTeamDrives=True,
                                              body=file_metadata, media_body=media_body).execute()
 
-    def switchServiceAccount(self):
-        global SERVICE_ACCOUNT_INDEX
-        service_account_count = len(os.listdir("accounts"))
-        if SERVICE_ACCOUNT_INDEX == service_account_count - 1:
-            SERVICE_ACCOUNT_INDEX = 0
-        SERVICE_ACCOUNT_INDEX += 1
-        LOGGER.info(f"Switching to {SERVICE_ACCOUNT_INDEX}.json service account")
-        self.__service = self.authorize()
+    def switchServiceAccount(self, reason=None):
+        sa_pool.penalize(self.service_account, reason)
+        self.authorize()
+        LOGGER.info(f"Switching to {self.service_account} service account")
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
     def __set_permission(self, drive_id):
-        permissions = {
-            'role': 'reader',
-            'type': 'anyone',
-            'value': None,
-            'withLink': True
-        }
-        return self.__service.permissions().create(supportsTeamDrives=True, fileId=drive_id,
-                                                   body=permissions).execute()
+        return self.__drive().permissions().create(supportsTeamDrives=True, fileId=drive_id, fields='id',
+                                                   body=self.__PERMISSION).execute()
+
+    def upload_file(self, file_path, file_name, mime_type, parent_id):
+        """Uploads a single file and shares it. :return its download url, None if the upload was cancelled"""
+        file_id = self.__upload_new(file_path, file_name, mime_type, parent_id)
+        if file_id is None:
+            return None
+        if not IS_TEAM_DRIVE:
+            self.__set_permission(file_id)
+        return self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file_id)
+
+    def __listing(self, folder_id):
+        """
+        :return {name: [child]} of folder_id, listed once. Workers asking for a folder which is being listed wait
+        for that listing, listings of different folders run in parallel
+        """
+        with self.__listing_lock:
+            future = self.__listings.get(folder_id)
+            owner = future is None
+            if owner:
+                # concurrent.futures.Future, tenacity exports a Future of its own
+                future = self.__listings[folder_id] = concurrent.futures.Future()
+        if not owner:
+            return future.result()
+        try:
+            listing = self.__list_folder(folder_id)
+        except Exception as e:
+            # The next worker asking for the folder lists it again
+            with self.__listing_lock:
+                del self.__listings[folder_id]
+            future.set_exception(e)
+            raise
+        future.set_result(listing)
+        return listing
+
+    def __list_folder(self, folder_id):
+        listing = {}
+        page_token = None
+        while folder_id not in self.__created_folders:
+            response = self.__execute(self.__drive().files().list(
+                supportsTeamDrives=True, includeTeamDriveItems=True,
+                q=f"'{folder_id}' in parents and trashed = false", spaces='drive', pageSize=1000,
+                pageToken=page_token, fields='nextPageToken, files(id, name, mimeType, size, md5Checksum)'))
+            for file in response.get('files', []):
+                listing.setdefault(file.get('name'), []).append(file)
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                break
+        return listing
+
+    def __existing_folder(self, name, parent_id):
+        """:return The id of a folder called name in parent_id, None if there is none"""
+        return next((file['id'] for file in self.__listing(parent_id).get(name, [])
+                     if file.get('mimeType') == self.__G_DRIVE_DIR_MIME_TYPE), None)
+
+    def __duplicate(self, file_path, file_name, parent_id):
+        """:return The id of a file in parent_id with the name, size and MD5 of file_path, None if there is none"""
+        size = os.path.getsize(file_path)
+        candidates = [file for file in self.__listing(parent_id).get(file_name, [])
+                      if file.get('md5Checksum') is not None and int(file.get('size', -1)) == size]
+        if not candidates:
+            return None
+        # Only hashed once a name and size match
+        md5 = get_md5(file_path)
+        return next((file['id'] for file in candidates if file['md5Checksum'] == md5), None)
+
+    def __upload_new(self, file_path, file_name, mime_type, parent_id):
+        """:return The id of the uploaded file, or in dedup mode of the same file already in parent_id"""
+        if DRIVE_DEDUP:
+            file_id = self.__duplicate(file_path, file_name, parent_id)
+            if file_id is not None:
+                LOGGER.info(f"Skipping {file_path}, it is already uploaded")
+                self.__file_progress(file_path, finished_size=os.path.getsize(file_path))
+                return file_id
+        file_id = self.__upload_media(file_path, file_name, mime_type, parent_id)
+        if file_id is not None:
+            drive_index.add(file_id, file_name, parent_id, mime_type, os.path.getsize(file_path))
+        return file_id
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
-    def upload_file(self, file_path, file_name, mime_type, parent_id):
+    def __upload_media(self, file_path, file_name, mime_type, parent_id):
+        """:return The id of the new file, None if the upload was cancelled"""
+        # Each file is sent by its own account, so the files of a directory upload spread over the pool.
+        # A session can only be continued by the account which started it
+        session = self.__sessions.get(file_path)
+        account = sa_pool.acquire(session.get('account') if session else None) if USE_SERVICE_ACCOUNTS else None
+        try:
+            return self.__send_media(account, file_path, file_name, mime_type, parent_id)
+        finally:
+            if account is not None:
+                sa_pool.release(account)
+
+    def __send_media(self, account, file_path, file_name, mime_type, parent_id):
+        service = drive_auth.service(account)
         # File body description
         file_metadata = {
             'name': file_name,
@@ -134,61 +371,107 @@ class GoogleDriveHelper:
         if parent_id is not None:
             file_metadata['parents'] = [parent_id]
 
-        if os.path.getsize(file_path) == 0:
+        size = os.path.getsize(file_path)
+        if size == 0:
             media_body = MediaFileUpload(file_path,
                                          mimetype=mime_type,
                                          resumable=False)
-            response = self.__service.files().create(supportsTeamDrives=True,
-                                                     body=file_metadata, media_body=media_body).execute()
-            if not IS_TEAM_DRIVE:
-                self.__set_permission(response['id'])
-
-            drive_file = self.__service.files().get(supportsTeamDrives=True,
-                                                    fileId=response['id']).execute()
-            download_url = self.__G_DRIVE_BASE_DOWNLOAD_URL.format(drive_file.get('id'))
-            return download_url
-        media_body = MediaFileUpload(file_path,
-                                     mimetype=mime_type,
-                                     resumable=True,
-                                     chunksize=50 * 1024 * 1024)
+            response = service.files().create(supportsTeamDrives=True, fields='id',
+                                              body=file_metadata, media_body=media_body).execute()
+            return response['id']
+        sizer = ChunkSizer()
+        media_body = CountingFileUpload(file_path, mime_type, sizer.size)
 
         # Insert a file
-        drive_file = self.__service.files().create(supportsTeamDrives=True,
-                                                   body=file_metadata, media_body=media_body)
+        drive_file = service.files().create(supportsTeamDrives=True, fields='id',
+                                            body=file_metadata, media_body=media_body)
         response = None
-        while response is None:
-            if self.is_cancelled:
-                return None
-            try:
-                self.status, response = drive_file.next_chunk()
-            except HttpError as err:
-                if err.resp.get('content-type', '').startswith('application/json'):
-                    reason = json.loads(err.content).get('error').get('errors')[0].get('reason')
+        resumable_uri = None
+        sent = 0
+        session = self.__sessions.get(file_path)
+        if session is not None and session.get('account') == account:
+            # Goes on from the offset Drive committed for the session, instead of starting a new one from byte 0
+            offset, response = self.__session_offset(drive_file.http, session['upload_uri'], size)
+            if offset is None:
+                LOGGER.info(f"The upload session of {file_path} expired, starting a new one")
+                self.__sessions.pop(file_path, None)
+            else:
+                drive_file.resumable_uri = resumable_uri = session['upload_uri']
+                drive_file.resumable_progress = sent = offset
+                media_body.stream().seek(offset)
+                LOGGER.info(f"Resuming the upload session of {file_path} at byte {offset}")
+        self.__file_progress(file_path, media=media_body)
+        try:
+            while response is None:
+                if self.is_cancelled:
+                    return None
+                try:
+                    sizer.start()
+                    status, response = drive_file.next_chunk()
+                    if status is not None:
+                        sizer.sent(status.resumable_progress - sent)
+                        sent = status.resumable_progress
+                    if drive_file.resumable_uri != resumable_uri:
+                        resumable_uri = drive_file.resumable_uri
+                        self.__sessions[file_path] = {'upload_uri': resumable_uri, 'account': account}
+                        journal.record(self.__listener.uid, 'upload_uri', upload_uri=resumable_uri,
+                                       file_path=file_path, account=account)
+                except HttpError as err:
+                    sizer.failed()
+                    if err.resp.status in (404, 410):
+                        # The session expired, the retry starts a new one
+                        self.__sessions.pop(file_path, None)
+                        raise err
+                    reason = error_reason(err)
                     if reason == 'userRateLimitExceeded' or reason == 'dailyLimitExceeded':
                         if USE_SERVICE_ACCOUNTS:
-                            self.switchServiceAccount()
+                            sa_pool.penalize(account, reason)
                             LOGGER.info(f"Got: {reason}, Trying Again.")
-                            return self.upload_file(file_path, file_name, mime_type, parent_id)
-                    else:
+                            return self.__upload_media(file_path, file_name, mime_type, parent_id)
+                    elif reason is not None:
                         raise err
-        self._file_uploaded_bytes = 0
-        # Insert new permissions
-        if not IS_TEAM_DRIVE:
-            self.__set_permission(response['id'])
-        # Define file instance and get url for download
-        drive_file = self.__service.files().get(supportsTeamDrives=True, fileId=response['id']).execute()
-        download_url = self.__G_DRIVE_BASE_DOWNLOAD_URL.format(drive_file.get('id'))
-        return download_url
+                finally:
+                    if response is None and sizer.size != media_body.chunksize():
+                        # The chunk size of a media is fixed, the next chunks are read from a new one
+                        media_body.close()
+                        media_body = CountingFileUpload(file_path, mime_type, sizer.size)
+                        media_body.stream().seek(drive_file.resumable_progress)
+                        drive_file.resumable = media_body
+                        self.__file_progress(file_path, media=media_body)
+        finally:
+            # Bytes sent by a failed attempt are no longer counted, a retry counts them again as it sends them
+            self.__file_progress(file_path, finished_size=size if response is not None else None)
+            media_body.close()
+        self.__sessions.pop(file_path, None)
+        sa_pool.record(account, size)
+        sa_pool.succeeded(account)
+        return response['id']
+
+    @staticmethod
+    def __session_offset(http, upload_uri, size):
+        """
+        Asks Drive how much of a resumable upload session it has committed
+        :return: (offset to go on from, None) while the upload is incomplete, (size, file) once it is complete and
+        (None, None) if the session expired
+        """
+        resp, content = http.request(upload_uri, 'PUT', headers={'Content-Range': f'bytes */{size}',
+                                                                 'Content-Length': '0'})
+        if resp.status in (200, 201):
+            return size, json.loads(content)
+        if resp.status == 308:
+            # No range means nothing was committed yet
+            committed = resp.get('range')
+            return (int(committed.split('-')[1]) + 1 if committed else 0), None
+        if resp.status in (404, 410):
+            return None, None
+        raise HttpError(resp, content, uri=upload_uri)
 
     def upload(self, file_name: str):
-        if USE_SERVICE_ACCOUNTS:
-            self.service_account_count = len(os.listdir("accounts"))
         self.__listener.onUploadStarted()
         file_dir = f"{DOWNLOAD_DIR}{self.__listener.message.message_id}"
         file_path = f"{file_dir}/{file_name}"
         LOGGER.info("Uploading File: " + file_path)
         self.start_time = time.time()
-        self.updater = setInterval(self.update_interval, self._on_upload_progress)
         if os.path.isfile(file_path):
             try:
                 mime_type = get_mime_type(file_path)
@@ -205,11 +488,13 @@ class GoogleDriveHelper:
                 LOGGER.error(err)
                 self.__listener.onUploadError(str(err))
                 return
-            finally:
-                self.updater.cancel()
         else:
             try:
-                dir_id = self.create_directory(os.path.basename(os.path.abspath(file_name)), parent_id)
+                dir_name = os.path.basename(os.path.abspath(file_name))
+                # In dedup mode a folder left by an earlier mirror of the same directory is filled up instead
+                dir_id = self.__existing_folder(dir_name, parent_id) if DRIVE_DEDUP else None
+                if dir_id is None:
+                    dir_id = self.create_directory(dir_name, parent_id)
                 result = self.upload_dir(file_path, dir_id)
                 if result is None:
                     raise Exception('Upload has been manually cancelled!')
@@ -224,8 +509,6 @@ class GoogleDriveHelper:
                 LOGGER.error(err)
                 self.__listener.onUploadError(str(err))
                 return
-            finally:
-                self.updater.cancel()
         LOGGER.info(download_dict)
         self.__listener.onUploadComplete(link)
         LOGGER.info("Deleting downloaded file/folder..")
@@ -233,45 +516,57 @@ class GoogleDriveHelper:
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
-    def copyFile(self, file_id, dest_id):
-        body = {
-            'parents': [dest_id]
-        }
+    def copyFile(self, file_id, dest_id, size=0):
+        """
+        Copies file_id into dest_id. Like uploads, each copy uses an account of its own, so the copies of a clone
+        spread over the pool and a rate limit never switches the account of another copy
+        :param size: bytes of the file, charged to the daily limit of the account
+        :return: the new file
+        """
+        account = sa_pool.acquire() if USE_SERVICE_ACCOUNTS else None
+        try:
+            return self.__copy_with(account, file_id, dest_id, size)
+        finally:
+            if account is not None:
+                sa_pool.release(account)
 
+    def __copy_with(self, account, file_id, dest_id, size):
+        service = drive_auth.service(account)
         try:
-            res = self.__service.files().copy(supportsAllDrives=True,fileId=file_id,body=body).execute()
-            return res
+            copy = self.__execute(service.files().copy(supportsAllDrives=True, fileId=file_id,
+                                                       body={'parents': [dest_id]}))
         except HttpError as err:
-            if err.resp.get('content-type', '').startswith('application/json'):
-                reason = json.loads(err.content).get('error').get('errors')[0].get('reason')
-                if reason == 'userRateLimitExceeded' or reason == 'dailyLimitExceeded':
-                    if USE_SERVICE_ACCOUNTS:
-                        self.switchServiceAccount()
-                        LOGGER.info(f"Got: {reason}, Trying Again.")
-                        return self.copyFile(file_id,dest_id)
-                else:
-                    raise err
+            reason = error_reason(err)
+            if (reason == 'userRateLimitExceeded' or reason == 'dailyLimitExceeded') and USE_SERVICE_ACCOUNTS:
+                sa_pool.penalize(account, reason)
+                LOGGER.info(f"Got: {reason}, Trying Again.")
+                return self.copyFile(file_id, dest_id, size)
+            raise err
+        # Copies count against the daily limit of the account like uploads
+        sa_pool.record(account, size)
+        sa_pool.succeeded(account)
+        return copy
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
     def getFileMetadata(self,file_id):
-        return self.__service.files().get(supportsAllDrives=True, fileId=file_id,
+        return self.__drive().files().get(supportsAllDrives=True, fileId=file_id,
                                               fields="name,id,mimeType,size").execute()
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
     def getFilesByFolderId(self,folder_id):
         page_token = None
-        q = f"'{folder_id}' in parents"
+        q = f"'{folder_id}' in parents and trashed = false"
         files = []
         while True:
-            response = self.__service.files().list(supportsTeamDrives=True,
-                                                   includeTeamDriveItems=True,
-                                                   q=q,
-                                                   spaces='drive',
-                                                   pageSize=200,
-                                                   fields='nextPageToken, files(id, name, mimeType,size)',
-                                                   pageToken=page_token).execute()
+            response = self.__execute(self.__drive().files().list(supportsTeamDrives=True,
+                                                                  includeTeamDriveItems=True,
+                                                                  q=q,
+                                                                  spaces='drive',
+                                                                  pageSize=200,
+                                                                  fields='nextPageToken, files(id, name, mimeType, size, md5Checksum)',
+                                                                  pageToken=page_token))
             for file in response.get('files', []):
                 files.append(file)
             page_token = response.get('nextPageToken', None)
@@ -279,10 +574,18 @@ class GoogleDriveHelper:
                 break
         return files
 
-    def clone(self, link):
+    def clone(self, link, dest_link=None):
+        """
+        Copies the file or folder of link into GDRIVE_FOLDER_ID
+        :param dest_link: folder which already holds an earlier clone of a folder link, only new and changed files
+        are copied into it
+        """
         self.transferred_size = 0
+        self.__skipped = 0
+        self.__failed = 0
         try:
             file_id = self.getIdFromUrl(link)
+            dest_id = self.getIdFromUrl(dest_link) if dest_link else None
         except (KeyError,IndexError):
             msg = "Google drive ID could not be found in the provided link"
             return msg
@@ -290,16 +593,24 @@ class GoogleDriveHelper:
         LOGGER.info(f"File ID: {file_id}")
         try:
             meta = self.getFileMetadata(file_id)
-            if meta.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
+            if dest_id is not None:
+                if meta.get("mimeType") != self.__G_DRIVE_DIR_MIME_TYPE or \
+                        self.getFileMetadata(dest_id).get("mimeType") != self.__G_DRIVE_DIR_MIME_TYPE:
+                    return "Only a folder can be synced into another folder"
+                self.cloneFolder(meta.get('name'), meta.get('name'), meta.get('id'), dest_id, sync=True)
+                msg += f'<a href="{self.__G_DRIVE_DIR_BASE_DOWNLOAD_URL.format(dest_id)}">{meta.get("name")}</a>' \
+                       f' ({get_readable_file_size(self.transferred_size)} copied, {self.__skipped} unchanged files' \
+                       f' skipped{self.__failures()})'
+            elif meta.get("mimeType") == self.__G_DRIVE_DIR_MIME_TYPE:
                 dir_id = self.create_directory(meta.get('name'), parent_id)
                 result = self.cloneFolder(meta.get('name'), meta.get('name'), meta.get('id'), dir_id)
                 msg += f'<a href="{self.__G_DRIVE_DIR_BASE_DOWNLOAD_URL.format(dir_id)}">{meta.get("name")}</a>' \
-                        f' ({get_readable_file_size(self.transferred_size)})'
+                        f' ({get_readable_file_size(self.transferred_size)}{self.__failures()})'
                 if INDEX_URL is not None:
                     url = requests.utils.requote_uri(f'{INDEX_URL}/{meta.get("name")}/')
                     msg += f' | <a href="{url}"> Index URL</a>'
             else:
-                file = self.copyFile(meta.get('id'), parent_id)
+                file = self.copyFile(meta.get('id'), parent_id, int(meta.get('size') or 0))
                 msg += f'<a href="{self.__G_DRIVE_BASE_DOWNLOAD_URL.format(file.get("id"))}">{file.get("name")}</a>'
                 try:
                     msg += f' ({get_readable_file_size(int(meta.get("size")))}) '
@@ -317,33 +628,91 @@ class GoogleDriveHelper:
             return err
         return msg
 
-    def cloneFolder(self, name, local_path, folder_id, parent_id):
-        LOGGER.info(f"Syncing: {local_path}")
-        files = self.getFilesByFolderId(folder_id)
-        new_id = None
-        if len(files) == 0:
-            return parent_id
-        for file in files:
-            if file.get('mimeType') == self.__G_DRIVE_DIR_MIME_TYPE:
-                file_path = os.path.join(local_path, file.get('name'))
-                current_dir_id = self.create_directory(file.get('name'), parent_id)
-                new_id = self.cloneFolder(file.get('name'), file_path, file.get('id'), current_dir_id)
-            else:
-                try:
-                    self.transferred_size += int(file.get('size'))
-                except TypeError:
-                    pass
-                try:
-                    self.copyFile(file.get('id'), parent_id)
-                    new_id = parent_id
-                except Exception as e:
-                    if isinstance(e, RetryError):
-                        LOGGER.info(f"Total Attempts: {e.last_attempt.attempt_number}")
-                        err = e.last_attempt.exception()
-                    else:
-                        err = e
-                    LOGGER.error(err)
-        return new_id
+    def cloneFolder(self, name, local_path, folder_id, parent_id, sync=False):
+        """
+        Clones the tree below folder_id into parent_id breadth first. The folders of a level are listed concurrently on
+        the drive_list executor and created in one batch. Files are copied on the drive_copy executor while the next
+        levels are listed, the uploads on the drive executor never wait behind them
+        :param sync: parent_id holds an earlier clone. Its folders are reused, files with the same path, size and MD5
+        are skipped and changed files are replaced. Files which are only in parent_id are kept
+        """
+        executor = get_executor('drive_copy')
+        lister = get_executor('drive_list')
+        # (path, source id, destination id, listing of the destination if it existed before)
+        targets = lister.submit(self.getFilesByFolderId, parent_id) if sync else None
+        level = [(local_path, folder_id, parent_id, targets)]
+        copies = []
+        try:
+            while level:
+                listings = [(path, dest_id, lister.submit(self.getFilesByFolderId, src_id), targets)
+                            for path, src_id, dest_id, targets in level]
+                folders = []
+                level = []
+                for path, dest_id, listing, targets in listings:
+                    LOGGER.info(f"Syncing: {path}")
+                    existing = {}
+                    for target in targets.result() if targets is not None else []:
+                        existing.setdefault(target.get('name'), []).append(target)
+                    for file in listing.result():
+                        same_name = existing.get(file.get('name'), [])
+                        if file.get('mimeType') == self.__G_DRIVE_DIR_MIME_TYPE:
+                            target = next((t for t in same_name if t.get('mimeType') == self.__G_DRIVE_DIR_MIME_TYPE),
+                                          None)
+                            if target is None:
+                                folders.append((os.path.join(path, file.get('name')), file, dest_id))
+                            else:
+                                level.append((os.path.join(path, file.get('name')), file.get('id'), target.get('id'),
+                                              lister.submit(self.getFilesByFolderId, target.get('id'))))
+                            continue
+                        outdated = [t for t in same_name if t.get('mimeType') != self.__G_DRIVE_DIR_MIME_TYPE]
+                        if any(self.__same_file(file, t) for t in outdated):
+                            self.__skipped += 1
+                            continue
+                        copies.append(executor.submit(self.__clone_file, file, dest_id,
+                                                      [t.get('id') for t in outdated]))
+                dest_ids = self.__create_directories([(file.get('name'), dest_id) for _, file, dest_id in folders])
+                level += [(path, file.get('id'), new_id, None) for (path, file, _), new_id in zip(folders, dest_ids)]
+        except Exception:
+            for future in copies:
+                future.cancel()
+            raise
+        wait(copies)
+        errors = [future.exception() for future in copies if future.exception() is not None]
+        for err in errors:
+            if isinstance(err, RetryError):
+                err = err.last_attempt.exception()
+            LOGGER.error(f"Could not copy a file of {name}: {err}")
+        self.__failed += len(errors)
+        if errors and len(errors) == len(copies):
+            raise Exception(f"None of the {len(copies)} files could be copied: {errors[0]}")
+        return parent_id
+
+    def __failures(self):
+        """:return The note on files which could not be copied for the clone message"""
+        return f', {self.__failed} files failed to copy' if self.__failed else ''
+
+    @staticmethod
+    def __same_file(source, target):
+        if source.get('md5Checksum') is None or target.get('md5Checksum') is None:
+            # Google Docs have no checksum, one of the same name and type is taken as unchanged
+            return source.get('mimeType') == target.get('mimeType')
+        return source.get('size') == target.get('size') and source.get('md5Checksum') == target.get('md5Checksum')
+
+    def __clone_file(self, file, dest_id, replaces=()):
+        """Copies file into dest_id, then moves the files it replaces to the trash. Raises if the copy failed"""
+        try:
+            size = int(file.get('size'))
+        except TypeError:
+            size = None
+        copy = self.copyFile(file.get('id'), dest_id, size or 0)
+        for old_id in replaces:
+            self.__execute(self.__drive().files().update(fileId=old_id, supportsTeamDrives=True,
+                                                         body={'trashed': True}))
+        drive_index.add(copy['id'], file.get('name'), dest_id, file.get('mimeType'), size)
+        if size is None:
+            return
+        with self.__progress_lock:
+            self.transferred_size += size
 
     @retry(wait=wait_exponential(multiplier=2, min=3, max=6), stop=stop_after_attempt(5),
            retry=retry_if_exception_type(HttpError), before=before_log(LOGGER, logging.DEBUG))
@@ -354,58 +723,74 @@ class GoogleDriveHelper:
         }
         if parent_id is not None:
             file_metadata["parents"] = [parent_id]
-        file = self.__service.files().create(supportsTeamDrives=True, body=file_metadata).execute()
+        file = self.__execute(self.__drive().files().create(supportsTeamDrives=True, fields='id', body=file_metadata))
         file_id = file.get("id")
+        self.__created_folders.add(file_id)
+        drive_index.add(file_id, directory_name, parent_id, self.__G_DRIVE_DIR_MIME_TYPE)
         if not IS_TEAM_DRIVE:
             self.__set_permission(file_id)
-        LOGGER.info("Created Google-Drive Folder:\nName: {}\nID: {} ".format(file.get("name"), file_id))
+        LOGGER.info("Created Google-Drive Folder:\nName: {}\nID: {} ".format(directory_name, file_id))
         return file_id
 
     def upload_dir(self, input_directory, parent_id):
-        list_dirs = os.listdir(input_directory)
-        if len(list_dirs) == 0:
-            return parent_id
-        new_id = None
-        for item in list_dirs:
-            current_file_name = os.path.join(input_directory, item)
+        """
+        Creates the folder tree first, one batch request per level, then uploads the files on the drive executor
+        :return: parent_id, None if the upload was cancelled
+        """
+        folder_ids = {input_directory: parent_id}
+        files = []
+        level = [input_directory]
+        while level:
             if self.is_cancelled:
                 return None
-            if os.path.isdir(current_file_name):
-                current_dir_id = self.create_directory(item, parent_id)
-                new_id = self.upload_dir(current_file_name, current_dir_id)
-            else:
-                mime_type = get_mime_type(current_file_name)
-                file_name = current_file_name.split("/")[-1]
-                # current_file_name will have the full path
-                self.upload_file(current_file_name, file_name, mime_type, parent_id)
-                new_id = parent_id
-        return new_id
+            folders = []
+            for dir_path in level:
+                for entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+                    if entry.is_dir():
+                        folders.append((dir_path, entry.path))
+                    else:
+                        files.append((entry.path, dir_path))
+            wanted = [(os.path.basename(path), folder_ids[dir_path]) for dir_path, path in folders]
+            ids = [self.__existing_folder(name, folder_parent_id) if DRIVE_DEDUP else None
+                   for name, folder_parent_id in wanted]
+            missing = [i for i, folder_id in enumerate(ids) if folder_id is None]
+            for i, folder_id in zip(missing, self.__create_directories([wanted[i] for i in missing])):
+                ids[i] = folder_id
+            folder_ids.update(zip((path for _, path in folders), ids))
+            level = [path for _, path in folders]
+        files = [(file_path, folder_ids[dir_path]) for file_path, dir_path in files]
+        self.__uploaded_ids = []
+        executor = get_executor('drive')
+        futures = [executor.submit(self.__upload_dir_file, file_path, folder_id) for file_path, folder_id in files]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            if future.exception() is not None:
+                # Workers which already started stop at their next chunk
+                self.is_cancelled = True
+                wait(not_done)
+                raise future.exception()
+        if self.is_cancelled:
+            return None
+        if not IS_TEAM_DRIVE and not SHARE_TOP_LEVEL_ONLY:
+            self.__set_permissions(self.__uploaded_ids)
+        return parent_id
+
+    def __upload_dir_file(self, file_path, parent_id):
+        if self.is_cancelled:
+            return
+        file_id = self.__upload_new(file_path, os.path.basename(file_path), get_mime_type(file_path), parent_id)
+        if file_id is not None:
+            self.__uploaded_ids.append(file_id)
 
     def authorize(self):
-        # Get credentials
-        credentials = None
-        if not USE_SERVICE_ACCOUNTS:
-            if os.path.exists(self.__G_DRIVE_TOKEN_FILE):
-                with open(self.__G_DRIVE_TOKEN_FILE, 'rb') as f:
-                    credentials = pickle.load(f)
-            if credentials is None or not credentials.valid:
-                if credentials and credentials.expired and credentials.refresh_token:
-                    credentials.refresh(Request())
-                else:
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        'credentials.json', self.__OAUTH_SCOPE)
-                    LOGGER.info(flow)
-                    credentials = flow.run_console(port=0)
-
-                # Save the credentials for the next run
-                with open(self.__G_DRIVE_TOKEN_FILE, 'wb') as token:
-                    pickle.dump(credentials, token)
+        """Selects the account of this helper, its credentials and services come from the process wide cache"""
+        if USE_SERVICE_ACCOUNTS:
+            self.service_account = sa_pool.pick()
+            LOGGER.info(f"Authorizing with {self.service_account} service account")
         else:
-            LOGGER.info(f"Authorizing with {SERVICE_ACCOUNT_INDEX}.json service account")
-            credentials = service_account.Credentials.from_service_account_file(
-                f'accounts/{SERVICE_ACCOUNT_INDEX}.json',
-                scopes=self.__OAUTH_SCOPE)
-        return build('drive', 'v3', credentials=credentials, cache_discovery=False)
+            self.service_account = None
 
     def escapes(self, str):
         chars = ['\\', "'", '"', r'\a', r'\b', r'\f', r'\n', r'\r', r'\t']
@@ -418,7 +803,7 @@ class GoogleDriveHelper:
         fileName = self.escapes(str(fileName))
         # Create Search Query for API request.
         query = f"'{parent_id}' in parents and (name contains '{fileName}')"
-        response = self.__service.files().list(supportsTeamDrives=True,
+        response = self.__drive().files().list(supportsTeamDrives=True,
                                                includeTeamDriveItems=True,
                                                q=query,
                                                spaces='drive',
@@ -426,23 +811,5 @@ class GoogleDriveHelper:
                                                fields='files(id, name, mimeType, size)',
                                                orderBy='modifiedTime desc').execute()
         for file in response.get('files', []):
-            if file.get(
-                    'mimeType') == "application/vnd.google-apps.folder":  # Detect Whether Current Entity is a Folder or File.
-                msg += f"⁍ <a href='https://drive.google.com/drive/folders/{file.get('id')}'>{file.get('name')}" \
-                       f"</a> (folder)"
-                if INDEX_URL is not None:
-                    url = requests.utils.requote_uri(f'{INDEX_URL}/{file.get("name")}/')
-                    msg += f' | <a href="{url}"> Index URL</a>'
-            
-            elif file.get('mimeType') == 'application/vnd.google-apps.shortcut':
-                    msg += f"⁍ <a href='https://drive.google.com/drive/folders/{file.get('id')}'>{file.get('name')}" \
-                        f"</a> (shortcut)"
-                    # Excluded index link as indexes cant download or open these shortcuts
-            else:
-                msg += f"⁍ <a href='https://drive.google.com/uc?id={file.get('id')}" \
-                       f"&export=download'>{file.get('name')}</a> ({get_readable_file_size(int(file.get('size')))})"
-                if INDEX_URL is not None:
-                    url = requests.utils.requote_uri(f'{INDEX_URL}/{file.get("name")}')
-                    msg += f' | <a href="{url}"> Index URL</a>'
-            msg += '\n'
+            msg += list_entry(file, file.get('name')) + '\n'
         return msg
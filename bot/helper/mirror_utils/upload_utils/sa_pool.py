@@ -0,0 +1,172 @@
+# Pool of the service accounts in accounts/. It keeps a ledger of the bytes each account uploaded or copied in the
+# last 24 hours, against the daily upload limit of Drive, and cools down accounts which hit a rate limit. Every new
+# upload goes to the least busy healthy account, so parallel uploads spread over the accounts. The ledger is kept in
+# a SQLite database, so a restart does not forget which accounts are used up.
+import os
+import sqlite3
+import threading
+import time
+
+from bot import LOGGER, SA_LEDGER_PATH, SA_DAILY_LIMIT
+from bot.helper.ext_utils.bot_utils import setInterval, get_readable_file_size, get_readable_time
+
+ACCOUNTS_DIR = 'accounts'
+FLUSH_INTERVAL = 5
+WINDOW = 24 * 3600
+BUCKET = 3600
+# Seconds an account rests after a rate limit error, doubled for every further error up to RATE_LIMIT_MAX_COOLDOWN
+RATE_LIMIT_COOLDOWN = 60
+RATE_LIMIT_MAX_COOLDOWN = 3600
+
+
+class ServiceAccountPool:
+    def __init__(self, path, directory=ACCOUNTS_DIR, daily_limit=SA_DAILY_LIMIT):
+        self.__path = path
+        self.__directory = directory
+        self.__daily_limit = daily_limit
+        self.__lock = threading.Lock()
+        self.__accounts = None
+        # account: {start of the hour: bytes}
+        self.__usage = {}
+        # (account, hour): bytes not written to the database yet
+        self.__pending = {}
+        # account: time until which it is not used
+        self.__cooldown = {}
+        self.__strikes = {}
+        # account: uploads running on it right now
+        self.__active = {}
+        self.__conn = None
+        self.__flusher = None
+
+    def __connect(self):
+        if self.__conn is None:
+            conn = sqlite3.connect(self.__path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sa_usage ('
+                         'account TEXT NOT NULL, hour INTEGER NOT NULL, bytes INTEGER NOT NULL, '
+                         'PRIMARY KEY (account, hour))')
+            conn.execute('CREATE TABLE IF NOT EXISTS sa_cooldown (account TEXT PRIMARY KEY, until REAL NOT NULL)')
+            self.__conn = conn
+        return self.__conn
+
+    def __load(self):
+        """Lists the accounts and loads the ledger of the last 24 hours, once. Called with the lock held"""
+        if self.__accounts is not None:
+            return
+        self.__accounts = sorted(name for name in os.listdir(self.__directory) if name.endswith('.json'))
+        now = time.time()
+        try:
+            conn = self.__connect()
+            with conn:
+                conn.execute('DELETE FROM sa_usage WHERE hour <= ?', (now - WINDOW - BUCKET,))
+                conn.execute('DELETE FROM sa_cooldown WHERE until <= ?', (now,))
+            for account, hour, size in conn.execute('SELECT account, hour, bytes FROM sa_usage'):
+                self.__usage.setdefault(account, {})[hour] = size
+            self.__cooldown.update(conn.execute('SELECT account, until FROM sa_cooldown').fetchall())
+        except sqlite3.Error as e:
+            LOGGER.error(f"Could not read the service account ledger: {e}")
+        self.__flusher = setInterval(FLUSH_INTERVAL, self.flush)
+        LOGGER.info(f"Loaded {len(self.__accounts)} service accounts")
+
+    def __used(self, account, now):
+        return sum(size for hour, size in self.__usage.get(account, {}).items() if hour > now - WINDOW)
+
+    def __healthy(self, account, now):
+        return self.__cooldown.get(account, 0) <= now and self.__used(account, now) < self.__daily_limit
+
+    def pick(self):
+        """:return The healthy account with the fewest running uploads and the least bytes used in the last 24h"""
+        with self.__lock:
+            self.__load()
+            if not self.__accounts:
+                raise FileNotFoundError(f"No service accounts in {self.__directory}/")
+            now = time.time()
+            healthy = [account for account in self.__accounts if self.__healthy(account, now)]
+            if not healthy:
+                # Every account is resting, use the one which is available again first
+                account = min(self.__accounts, key=lambda a: (self.__cooldown.get(a, 0), self.__used(a, now)))
+                LOGGER.warning(f"No healthy service account left, using {account}")
+                return account
+            return min(healthy, key=lambda a: (self.__active.get(a, 0), self.__used(a, now)))
+
+    def acquire(self, preferred=None):
+        """
+        Picks an account for an upload, which has to be given back with release
+        :param preferred: account to keep using if it is still healthy, e.g. the one which owns an upload session
+        """
+        with self.__lock:
+            self.__load()
+            usable = preferred in self.__accounts and self.__healthy(preferred, time.time())
+        account = preferred if usable else self.pick()
+        with self.__lock:
+            self.__active[account] = self.__active.get(account, 0) + 1
+        return account
+
+    def release(self, account):
+        with self.__lock:
+            if self.__active.get(account, 0) > 0:
+                self.__active[account] -= 1
+
+    def record(self, account, size):
+        """Adds size bytes uploaded or copied by account to the ledger"""
+        if account is None or size <= 0:
+            return
+        hour = int(time.time()) // BUCKET * BUCKET
+        with self.__lock:
+            bucket = self.__usage.setdefault(account, {})
+            bucket[hour] = bucket.get(hour, 0) + size
+            self.__pending[(account, hour)] = self.__pending.get((account, hour), 0) + size
+
+    def penalize(self, account, reason):
+        """Rests account after a rate limit error, until the 24h window moves on for a used up daily limit"""
+        if account is None:
+            return
+        with self.__lock:
+            if reason == 'dailyLimitExceeded':
+                cooldown = WINDOW
+            else:
+                strikes = self.__strikes.get(account, 0)
+                cooldown = min(RATE_LIMIT_COOLDOWN * 2 ** strikes, RATE_LIMIT_MAX_COOLDOWN)
+                self.__strikes[account] = strikes + 1
+            until = time.time() + cooldown
+            self.__cooldown[account] = until
+        LOGGER.info(f"Service account {account} got {reason}, resting for {get_readable_time(cooldown)}")
+        try:
+            with self.__lock:
+                conn = self.__connect()
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO sa_cooldown (account, until) VALUES (?, ?)', (account, until))
+        except sqlite3.Error as e:
+            LOGGER.error(f"Could not write to the service account ledger: {e}")
+
+    def succeeded(self, account):
+        """Forgets the rate limit errors of account once it works again"""
+        with self.__lock:
+            self.__strikes.pop(account, None)
+
+    def flush(self):
+        with self.__lock:
+            rows, self.__pending = self.__pending, {}
+            if not rows:
+                return
+            try:
+                conn = self.__connect()
+                with conn:
+                    conn.executemany('INSERT INTO sa_usage (account, hour, bytes) VALUES (?, ?, ?) '
+                                     'ON CONFLICT (account, hour) DO UPDATE SET bytes = bytes + excluded.bytes',
+                                     [(account, hour, size) for (account, hour), size in rows.items()])
+            except sqlite3.Error as e:
+                LOGGER.error(f"Could not write to the service account ledger: {e}")
+                for key, size in rows.items():
+                    self.__pending[key] = self.__pending.get(key, 0) + size
+
+    def stats(self):
+        with self.__lock:
+            self.__load()
+            now = time.time()
+            healthy = sum(1 for account in self.__accounts if self.__healthy(account, now))
+            used = sum(self.__used(account, now) for account in self.__accounts)
+            return f"{healthy}/{len(self.__accounts)} healthy, {get_readable_file_size(used)} used in 24h"
+
+
+sa_pool = ServiceAccountPool(SA_LEDGER_PATH)
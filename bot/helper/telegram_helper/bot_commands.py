@@ -6,6 +6,8 @@ class _BotCommands:
         self.TarMirrorCommand = 'tarmirror'
         self.CancelMirror = 'cancel'
         self.CancelAllCommand = 'cancelall'
+        self.PauseAllCommand = 'pauseall'
+        self.ResumeAllCommand = 'resumeall'
         self.ListCommand = 'list'
         self.StatusCommand = 'status'
         self.AuthorizeCommand = 'authorize'
@@ -18,6 +20,7 @@ class _BotCommands:
         self.CloneCommand = "clone"
         self.WatchCommand = 'watch'
         self.TarWatchCommand = 'tarwatch'
+        self.PriorityCommand = 'priority'
         # Added Telegram upload command
         self.TgUploadCommand = 'tgupload'
 
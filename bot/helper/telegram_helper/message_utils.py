@@ -1,14 +1,23 @@
 from telegram import Message
 from telegram import Update
+import threading
 import time
-from bot import AUTO_DELETE_MESSAGE_DURATION, LOGGER, bot, \
+from bot import LOGGER, bot, \
     status_reply_dict, status_reply_dict_lock, application
-from bot.helper.ext_utils.bot_utils import get_readable_message
+from bot.helper.ext_utils.bot_utils import get_readable_message, sample_speeds, setInterval, setTimeout
+from bot.helper.ext_utils.executors import run_in_executor
 from telegram.error import TimedOut, BadRequest
 import asyncio
 
+# Seconds between two samples of the progress of every running transfer
+SPEED_SAMPLE_INTERVAL = 1
 
-async def sendMessage(text: str, context, update: Update = None):
+_status_updater = None
+_speed_sampler = None
+_status_updater_lock = threading.Lock()
+
+
+async def sendMessage(text: str, context, update: Update = None, reply_markup=None):
     try:
         if not text or text.strip() == "":
             text = " "  # Ensure we always have at least a space
@@ -26,17 +35,17 @@ async def sendMessage(text: str, context, update: Update = None):
             
         return await context.bot.send_message(chat_id,
                             reply_to_message_id=message_id,
-                            text=text, parse_mode='HTMl')
+                            text=text, parse_mode='HTMl', reply_markup=reply_markup)
     except Exception as e:
         LOGGER.error(f"Error in sendMessage: {str(e)}")
         return None
 
 
-async def editMessage(text: str, message: Message, context):
+async def editMessage(text: str, message: Message, context, reply_markup=None):
     try:
         await context.bot.edit_message_text(text=text, message_id=message.message_id,
                               chat_id=message.chat.id,
-                              parse_mode='HTMl')
+                              parse_mode='HTMl', reply_markup=reply_markup)
     except Exception as e:
         LOGGER.error(str(e))
 
@@ -73,35 +82,40 @@ def send_message_async(chat_id, reply_to_message_id, text, parse_mode='HTMl'):
 
 
 def auto_delete_message(cmd_message: Message, bot_message: Message):
+    """Schedules both messages for deletion after AUTO_DELETE_MESSAGE_DURATION without holding a thread"""
+    from bot import AUTO_DELETE_MESSAGE_DURATION
     if AUTO_DELETE_MESSAGE_DURATION != -1:
-        time.sleep(AUTO_DELETE_MESSAGE_DURATION)
-        try:
-            # Create coroutines for deleting messages
-            async def delete_cmd_message():
-                try:
-                    if cmd_message and hasattr(cmd_message, 'chat') and hasattr(cmd_message, 'message_id'):
-                        await application.bot.delete_message(chat_id=cmd_message.chat.id, message_id=cmd_message.message_id)
-                    else:
-                        LOGGER.warning("Invalid cmd_message object in auto_delete_message")
-                except Exception as e:
-                    LOGGER.error(f"Error deleting cmd message: {e}")
-            
-            async def delete_bot_message():
-                try:
-                    if bot_message and hasattr(bot_message, 'chat') and hasattr(bot_message, 'message_id'):
-                        await application.bot.delete_message(chat_id=bot_message.chat.id, message_id=bot_message.message_id)
-                    else:
-                        LOGGER.warning("Invalid bot_message object in auto_delete_message")
-                except Exception as e:
-                    LOGGER.error(f"Error deleting bot message: {e}")
-            
-            # Schedule the coroutines
-            if cmd_message:
-                _schedule_coroutine(delete_cmd_message())
-            if bot_message:
-                _schedule_coroutine(delete_bot_message())
-        except Exception as e:
-            LOGGER.error(str(e))
+        setTimeout(AUTO_DELETE_MESSAGE_DURATION, lambda: _delete_messages(cmd_message, bot_message))
+
+
+def _delete_messages(cmd_message: Message, bot_message: Message):
+    try:
+        # Create coroutines for deleting messages
+        async def delete_cmd_message():
+            try:
+                if cmd_message and hasattr(cmd_message, 'chat') and hasattr(cmd_message, 'message_id'):
+                    await application.bot.delete_message(chat_id=cmd_message.chat.id, message_id=cmd_message.message_id)
+                else:
+                    LOGGER.warning("Invalid cmd_message object in auto_delete_message")
+            except Exception as e:
+                LOGGER.error(f"Error deleting cmd message: {e}")
+
+        async def delete_bot_message():
+            try:
+                if bot_message and hasattr(bot_message, 'chat') and hasattr(bot_message, 'message_id'):
+                    await application.bot.delete_message(chat_id=bot_message.chat.id, message_id=bot_message.message_id)
+                else:
+                    LOGGER.warning("Invalid bot_message object in auto_delete_message")
+            except Exception as e:
+                LOGGER.error(f"Error deleting bot message: {e}")
+
+        # Schedule the coroutines
+        if cmd_message:
+            _schedule_coroutine(delete_cmd_message())
+        if bot_message:
+            _schedule_coroutine(delete_bot_message())
+    except Exception as e:
+        LOGGER.error(str(e))
 
 
 def delete_all_messages():
@@ -165,6 +179,30 @@ def _schedule_coroutine(coro):
         except Exception as e:
             LOGGER.error(f"Could not access application loop: {e}")
 
+def start_status_updater():
+    """Registers the periodic status message refresh and speed sampling unless they are already running"""
+    global _status_updater, _speed_sampler
+    from bot import DOWNLOAD_STATUS_UPDATE_INTERVAL
+    with _status_updater_lock:
+        if _status_updater is None:
+            _status_updater = setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages)
+            _speed_sampler = setInterval(SPEED_SAMPLE_INTERVAL, sample_speeds)
+
+
+def stop_status_updater() -> bool:
+    """Cancels the periodic status message refresh and speed sampling.
+    :return: True if an updater was running"""
+    global _status_updater, _speed_sampler
+    with _status_updater_lock:
+        if _status_updater is None:
+            return False
+        _status_updater.cancel()
+        _speed_sampler.cancel()
+        _status_updater = None
+        _speed_sampler = None
+        return True
+
+
 def update_all_messages():
     msg = get_readable_message()
     with status_reply_dict_lock:
@@ -205,22 +243,39 @@ def update_all_messages():
                     del status_reply_dict[chat_id]
 
 
+def _can_reuse_status_message(message_obj: Message, incoming: Message) -> bool:
+    """A status message is reused while it is recent and not buried under too many newer messages"""
+    from bot import STATUS_MESSAGE_MAX_AGE, STATUS_MESSAGE_MAX_NEWER
+    if not message_obj or not getattr(message_obj, 'date', None):
+        return False
+    age = time.time() - message_obj.date.timestamp()
+    newer = incoming.message_id - message_obj.message_id
+    return age <= STATUS_MESSAGE_MAX_AGE and newer <= STATUS_MESSAGE_MAX_NEWER
+
+
 async def sendStatusMessage(msg, context):
-    progress = get_readable_message()
+    # Rendering queries aria2 for every job, which must not run on the event loop
+    progress = await run_in_executor('io', get_readable_message)
+    chat_id = msg.message.chat.id
     with status_reply_dict_lock:
-        if msg.message.chat.id in list(status_reply_dict.keys()):
+        if chat_id in list(status_reply_dict.keys()):
             try:
-                message_obj, _ = status_reply_dict[msg.message.chat.id]
+                message_obj, stored_text = status_reply_dict[chat_id]
+                if _can_reuse_status_message(message_obj, msg.message):
+                    if progress != stored_text:
+                        await editMessage(progress, message_obj, context)
+                        status_reply_dict[chat_id] = (message_obj, progress)
+                    return
                 if message_obj:  # Only delete if message_obj is not None
                     await deleteMessage(context, message_obj)
-                del status_reply_dict[msg.message.chat.id]
+                del status_reply_dict[chat_id]
             except Exception as e:
                 LOGGER.error(str(e))
-                del status_reply_dict[msg.message.chat.id]
-        
+                del status_reply_dict[chat_id]
+
         message = await sendMessage(progress, context, update=msg)
         # Only store in status_reply_dict if message was sent successfully
         if message is not None:
-            status_reply_dict[msg.message.chat.id] = (message, progress)
+            status_reply_dict[chat_id] = (message, progress)
         else:
-            LOGGER.error(f"Failed to send status message to chat {msg.message.chat.id}")
+            LOGGER.error(f"Failed to send status message to chat {chat_id}")
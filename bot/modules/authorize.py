@@ -5,6 +5,7 @@ from bot.helper.telegram_helper.filters import CustomFilters
 from telegram import Update
 from bot.helper.telegram_helper.bot_commands import BotCommands
 from bot import redis_client, redis_authorised_chats_key
+from bot.helper.ext_utils.executors import run_in_executor
 
 async def authorize(update,context):
     reply_message = update.message.reply_to_message
@@ -14,7 +15,7 @@ async def authorize(update,context):
         chat_id = update.effective_chat.id
         if chat_id not in AUTHORIZED_CHATS:
             if redis_client:
-                redis_client.sadd(redis_authorised_chats_key, chat_id)
+                await run_in_executor('io', redis_client.sadd, redis_authorised_chats_key, chat_id)
             AUTHORIZED_CHATS.add(chat_id)
             msg = 'Chat authorized'
         else:
@@ -24,12 +25,12 @@ async def authorize(update,context):
         user_id = reply_message.from_user.id
         if user_id not in AUTHORIZED_CHATS:
             if redis_client:
-                redis_client.sadd(redis_authorised_chats_key, user_id)
+                await run_in_executor('io', redis_client.sadd, redis_authorised_chats_key, user_id)
             AUTHORIZED_CHATS.add(user_id)
             msg = 'Person Authorized to use the bot!'
         else:
             msg = 'Person already authorized'
-    await sendMessage(msg, context)
+    await sendMessage(msg, context, update)
 
 
 async def unauthorize(update,context):
@@ -40,7 +41,7 @@ async def unauthorize(update,context):
         if chat_id in AUTHORIZED_CHATS:
             AUTHORIZED_CHATS.remove(chat_id)
             if redis_client:
-                redis_client.srem(redis_authorised_chats_key, chat_id)
+                await run_in_executor('io', redis_client.srem, redis_authorised_chats_key, chat_id)
             msg = 'Chat unauthorized'
         else:
             msg = 'Already unauthorized chat'
@@ -50,12 +51,12 @@ async def unauthorize(update,context):
         if user_id in AUTHORIZED_CHATS:
             AUTHORIZED_CHATS.remove(user_id)
             if redis_client:
-                redis_client.srem(redis_authorised_chats_key, user_id)
+                await run_in_executor('io', redis_client.srem, redis_authorised_chats_key, user_id)
             msg = 'Person unauthorized to use the bot!'
         else:
             msg = 'Person already unauthorized!'
         
-    await sendMessage(msg, context)
+    await sendMessage(msg, context, update)
 
 
 authorize_handler = CommandHandler(command=BotCommands.AuthorizeCommand, callback=authorize,
@@ -6,8 +6,10 @@ from bot.helper.telegram_helper.bot_commands import BotCommands
 from bot.helper.telegram_helper.filters import CustomFilters
 from bot.helper.telegram_helper.message_utils import *
 
-from time import sleep
-from bot.helper.ext_utils.bot_utils import getDownloadByGid, MirrorStatus
+import asyncio
+from bot.helper.ext_utils.bot_utils import getDownloadByGid
+from bot.helper.ext_utils.executors import run_in_executor
+from bot.helper.mirror_utils.bulk_control import JobFilter, select_jobs, pause_jobs, resume_jobs, cancel_jobs
 
 
 async def cancel_mirror(update, context):
@@ -15,7 +17,7 @@ async def cancel_mirror(update, context):
     mirror_message = None
     if len(args) > 1:
         gid = args[1]
-        dl = getDownloadByGid(gid)
+        dl = await run_in_executor('io', getDownloadByGid, gid)
         if not dl:
             await sendMessage(f"GID: <code>{gid}</code> not found.", context, update)
             return
@@ -36,33 +38,57 @@ async def cancel_mirror(update, context):
                 msg = "Please reply to the /mirror message which was used to start the download or /cancel gid to cancel it!"
             await sendMessage(msg, context, update)
             return
-    if dl.status() == "Uploading":
+    status = await run_in_executor('io', dl.status)
+    if status == "Uploading":
         await sendMessage("Upload in Progress, Don't Cancel it.", context, update)
         return
-    elif dl.status() == "Archiving":
+    elif status == "Archiving":
         await sendMessage("Archival in Progress, Don't Cancel it.", context, update)
         return
     else:
-        dl.download().cancel_download()
-    sleep(1)  # Wait a Second For Aria2 To free Resources.
+        await run_in_executor('io', dl.download().cancel_download)
+    await asyncio.sleep(1)  # Wait a Second For Aria2 To free Resources.
     clean_download(f'{DOWNLOAD_DIR}{mirror_message.message_id}/')
 
 
+async def _bulk(update, context, action, done):
+    try:
+        job_filter = JobFilter.parse(context.args, update)
+    except ValueError as e:
+        await sendMessage(f"{e}\n{JobFilter.USAGE}", context, update)
+        return None
+    count, skipped = await action(select_jobs(job_filter))
+    msg = f"{done} {count} downloads!"
+    if skipped:
+        msg += f" {skipped} matching jobs were skipped"
+    await sendMessage(msg, context, update)
+    return count
+
+
 async def cancel_all(update, context):
-    with download_dict_lock:
-        count = 0
-        for dlDetails in list(download_dict.values()):
-            if dlDetails.status() == MirrorStatus.STATUS_DOWNLOADING \
-                    or dlDetails.status() == MirrorStatus.STATUS_WAITING:
-                dlDetails.download().cancel_download()
-                count += 1
-    delete_all_messages()
-    await sendMessage(f'Cancelled {count} downloads!', context, update)
+    if await _bulk(update, context, cancel_jobs, 'Cancelled'):
+        delete_all_messages()
+
+
+async def pause_all(update, context):
+    await _bulk(update, context, pause_jobs, 'Paused')
+    await run_in_executor('io', update_all_messages)
+
+
+async def resume_all(update, context):
+    await _bulk(update, context, resume_jobs, 'Resumed')
+    await run_in_executor('io', update_all_messages)
 
 
 cancel_mirror_handler = CommandHandler(BotCommands.CancelMirror, cancel_mirror,
                                        filters=(CustomFilters.authorized_chat | CustomFilters.authorized_user) & CustomFilters.mirror_owner_filter)
 cancel_all_handler = CommandHandler(BotCommands.CancelAllCommand, cancel_all,
                                     filters=CustomFilters.owner_filter)
+pause_all_handler = CommandHandler(BotCommands.PauseAllCommand, pause_all,
+                                   filters=CustomFilters.owner_filter)
+resume_all_handler = CommandHandler(BotCommands.ResumeAllCommand, resume_all,
+                                    filters=CustomFilters.owner_filter)
 application.add_handler(cancel_all_handler)
+application.add_handler(pause_all_handler)
+application.add_handler(resume_all_handler)
 application.add_handler(cancel_mirror_handler)
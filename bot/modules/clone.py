@@ -3,22 +3,31 @@ from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper
 from bot.helper.telegram_helper.message_utils import sendMessage
 from bot.helper.telegram_helper.filters import CustomFilters
 from bot.helper.telegram_helper.bot_commands import BotCommands
-from bot.helper.ext_utils.bot_utils import new_thread
+from bot.helper.ext_utils.executors import run_in_executor
 from bot import application
 
 
-@new_thread
+async def _clone(gdrive, link, dest_link, update, context):
+    result = await run_in_executor('transfer', gdrive.clone, link, dest_link)
+    await sendMessage(result, context, update)
+
+
 async def clone_drive(update, context):
     args = update.message.text.split(' ')
     try:
         link = args[1]
     except IndexError:
         link = ''
+    # A second link is an earlier clone of the folder, which only gets the new and changed files
+    dest_link = args[2] if len(args) > 2 else None
     if link:
-        gdrive = GoogleDriveHelper()
-        msg = await sendMessage(f"Cloning: <code>{link}</code>", context, update)
-        result = gdrive.clone(link)
-        await sendMessage(result,context, update)
+        gdrive = await run_in_executor('io', GoogleDriveHelper)
+        if dest_link:
+            msg = await sendMessage(f"Syncing: <code>{link}</code> into <code>{dest_link}</code>", context, update)
+        else:
+            msg = await sendMessage(f"Cloning: <code>{link}</code>", context, update)
+        # The clone runs as its own task, handlers for other updates keep running meanwhile
+        context.application.create_task(_clone(gdrive, link, dest_link, update, context), update=update)
     else:
         await sendMessage("Provide G-Drive Shareable Link to Clone.",context, update)
 
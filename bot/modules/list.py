@@ -1,30 +1,63 @@
-from bot import LOGGER, application
+from bot import LOGGER, application, AUTHORIZED_CHATS, OWNER_ID
 from bot.helper.telegram_helper.message_utils import auto_delete_message, sendMessage
 from bot.helper.telegram_helper.filters import CustomFilters
-import threading
 from bot.helper.telegram_helper.bot_commands import BotCommands
-from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper
-from telegram.ext import CommandHandler
+from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper, list_entry
+from bot.helper.mirror_utils.upload_utils.drive_index import drive_index
+from bot.helper.ext_utils.executors import run_in_executor
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import CommandHandler, CallbackQueryHandler
 from telegraph import Telegraph
 from datetime import datetime
 
 telegraph = Telegraph()
 telegraph.create_account(short_name="mirrorbot")
 
+PAGE_SIZE = 10
+
+
+def _render_page(search, offset):
+    """:return The text and buttons of one page of index results, None if nothing matches"""
+    results, total = drive_index.search(search, offset, PAGE_SIZE)
+    if not results:
+        return None, None
+    text = '\n'.join(list_entry(file, file['path']) for file in results)
+    text += f"\n\n<b>{offset + 1}-{offset + len(results)} of {total}</b>"
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("Previous", callback_data=f"list:{max(0, offset - PAGE_SIZE)}"))
+    if offset + PAGE_SIZE < total:
+        buttons.append(InlineKeyboardButton("Next", callback_data=f"list:{offset + PAGE_SIZE}"))
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
 
 async def list_drive(update, context):
     args = update.message.text.split(' ')
     search = ' '.join(args[1:]).strip()
     if not search:
         reply_message = await sendMessage('No search term provided', context, update)
-        threading.Thread(target=auto_delete_message, args=(context.bot, update.message, reply_message)).start()
+        auto_delete_message(update.message, reply_message)
         return
     LOGGER.info(f"Searching: {search}")
-    gdrive = GoogleDriveHelper()
-    msg = gdrive.drive_list(search)
+    if drive_index.ready():
+        text, markup = await run_in_executor('io', _render_page, search, 0)
+        if text is None:
+            reply_message = await sendMessage('No result found', context, update)
+            auto_delete_message(update.message, reply_message)
+            return
+        reply_message = await sendMessage(text, context, update, reply_markup=markup)
+        if markup is None:
+            auto_delete_message(update.message, reply_message)
+        elif reply_message is not None:
+            # Kept for paging. The buttons only carry the offset, the search term is looked up by their message
+            context.chat_data.setdefault('list_searches', {})[reply_message.message_id] = search
+        return
+    # The index is not built yet, ask Drive for the direct children of the folder
+    msg = await run_in_executor('io', lambda: GoogleDriveHelper().drive_list(search))
     if not msg:
         reply_message = await sendMessage('No result found', context, update)
-        threading.Thread(target=auto_delete_message, args=(context.bot, update.message, reply_message)).start()
+        auto_delete_message(update.message, reply_message)
         return
     lines = [ln.strip() for ln in msg.strip().split('\n') if ln.strip()]
     if len(lines) > 10 or len(msg) > 3500:
@@ -40,7 +73,8 @@ async def list_drive(update, context):
             html_content += f"<li>{line}</li>"
         html_content += "</ul>"
         try:
-            page = telegraph.create_page(title=f"Results: {search}", html_content=html_content)
+            page = await run_in_executor('io', telegraph.create_page, title=f"Results: {search}",
+                                         html_content=html_content)
             url = "https://telegra.ph/" + page["path"]
             reply_message = await sendMessage(f'<a href="{url}">Telegraph page</a>', context, update)
         except Exception as e:
@@ -48,8 +82,32 @@ async def list_drive(update, context):
             reply_message = await sendMessage(msg, context, update)
     else:
         reply_message = await sendMessage(msg, context, update)
-    threading.Thread(target=auto_delete_message, args=(context.bot, update.message, reply_message)).start()
+    auto_delete_message(update.message, reply_message)
+
+
+async def list_page(update, context):
+    query = update.callback_query
+    user_id = update.effective_user.id if update.effective_user else None
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    if user_id != OWNER_ID and user_id not in AUTHORIZED_CHATS and chat_id not in AUTHORIZED_CHATS:
+        await query.answer("Not authorized", show_alert=True)
+        return
+    search = context.chat_data.get('list_searches', {}).get(query.message.message_id)
+    if search is None:
+        await query.answer("This search has expired, send it again")
+        return
+    offset = int(query.data.split(':', maxsplit=1)[1])
+    text, markup = await run_in_executor('io', _render_page, search, offset)
+    await query.answer()
+    if text is None:
+        return
+    try:
+        await query.edit_message_text(text=text, parse_mode='HTML', reply_markup=markup)
+    except BadRequest as e:
+        LOGGER.error(str(e))
 
 
 list_handler = CommandHandler(BotCommands.ListCommand, list_drive,filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
+list_page_handler = CallbackQueryHandler(list_page, pattern=r"^list:")
 application.add_handler(list_handler)
+application.add_handler(list_page_handler)
@@ -1,14 +1,18 @@
 import requests
 from telegram.ext import CommandHandler
 
-from bot import Interval, INDEX_URL, LOGGER, MEGA_KEY
-from bot import application, DOWNLOAD_DIR, DOWNLOAD_STATUS_UPDATE_INTERVAL, download_dict, download_dict_lock
+from bot import INDEX_URL, LOGGER, MEGA_KEY
+from bot import application, DOWNLOAD_DIR, download_dict, download_dict_lock
 from bot.helper.ext_utils import fs_utils, bot_utils
-from bot.helper.ext_utils.bot_utils import setInterval
+from bot.helper.ext_utils.executors import get_executor, run_in_executor
 from bot.helper.ext_utils.exceptions import DirectDownloadLinkException, NotSupportedExtractionArchive
+from bot.helper.ext_utils.disk_ledger import disk_ledger
+from bot.helper.ext_utils.job_journal import journal, record_job, record_finished, register_resumer
 from bot.helper.mirror_utils.download_utils.aria2_download import AriaDownloadHelper
 from bot.helper.mirror_utils.download_utils.direct_link_generator import direct_link_generator
 from bot.helper.mirror_utils.download_utils.telegram_downloader import TelegramDownloadHelper
+from bot.helper.mirror_utils.pipeline import download_stage, process_stage, upload_stage, enqueue, queue_download, \
+    JobPriority, default_priority, pop_priority_flag
 from bot.helper.mirror_utils.status_utils import listeners
 from bot.helper.mirror_utils.status_utils.extract_status import ExtractStatus
 from bot.helper.mirror_utils.status_utils.tar_status import TarStatus
@@ -21,7 +25,6 @@ from bot.helper.telegram_helper.message_utils import *
 import pathlib
 import os
 import subprocess
-import threading
 
 ariaDlManager = AriaDownloadHelper()
 ariaDlManager.start_listener()
@@ -42,12 +45,8 @@ class MirrorListener(listeners.MirrorListeners):
         pass
 
     def clean(self):
-        try:
-            Interval[0].cancel()
-            del Interval[0]
+        if stop_status_updater():
             delete_all_messages()
-        except IndexError:
-            pass
 
     def onDownloadComplete(self):
         with download_dict_lock:
@@ -58,17 +57,29 @@ class MirrorListener(listeners.MirrorListeners):
             if name is None: # when pyrogram's media.file_name is of NoneType
                 name = os.listdir(f'{DOWNLOAD_DIR}{self.uid}')[0]
             m_path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+        download_stage.release(self.uid, size)
+        journal.record(self.uid, 'path', path=m_path)
+        if size == 0:
+            size = fs_utils.get_path_size(m_path)
+        if self.isTar or self.extract:
+            enqueue(process_stage, self, name, size, lambda: self.__process(download, name, m_path, size))
+        else:
+            self.__queue_upload(name, m_path, size)
+        update_all_messages()
+
+    def __process(self, download, name, m_path, size):
         if self.isTar:
             download.is_archiving = True
             try:
                 with download_dict_lock:
                     download_dict[self.uid] = TarStatus(name, m_path, size)
+                update_all_messages()
                 path = fs_utils.tar(m_path)
             except FileNotFoundError:
                 LOGGER.info('File to archive not found!')
                 self.onUploadError('Internal error occurred!!')
                 return
-        elif self.extract:
+        else:
             download.is_extracting = True
             try:
                 path = fs_utils.get_base_name(m_path)
@@ -77,27 +88,47 @@ class MirrorListener(listeners.MirrorListeners):
                 )
                 with download_dict_lock:
                     download_dict[self.uid] = ExtractStatus(name, m_path, size)
+                update_all_messages()
                 archive_result = subprocess.run(["extract", m_path])
                 if archive_result.returncode == 0:
-                    threading.Thread(target=os.remove, args=(m_path,)).start()
+                    get_executor('io').submit(os.remove, m_path)
                     LOGGER.info(f"Deleting archive : {m_path}")
                 else:
                     LOGGER.warning('Unable to extract archive! Uploading anyway')
-                    path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+                    path = m_path
                 LOGGER.info(
                     f'got path : {path}'
                 )
 
             except NotSupportedExtractionArchive:
                 LOGGER.info("Not any valid archive, uploading file as it is.")
-                path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
-        else:
-            path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+                path = m_path
+        self.__queue_upload(name, path, size)
+        update_all_messages()
+
+    def __queue_upload(self, name, path, size, sessions=None):
+        enqueue(upload_stage, self, name, size, lambda: self.__upload(path, size, sessions))
+
+    def resume_upload(self, job):
+        """
+        Queues the upload of a job whose files survived a restart, continuing the Drive sessions it had
+        :return: False if the job has to start over from the download
+        """
+        path = job.get('upload_path')
+        if path is None or not os.path.exists(path):
+            return False
+        size = fs_utils.get_path_size(path)
+        disk_ledger.reserve(self.uid, size)
+        # The sessions of a directory upload point into the folder of the old attempt, it starts over in a new one
+        sessions = job.get('upload_sessions') if os.path.isfile(path) else None
+        self.__queue_upload(pathlib.PurePath(path).name, path, size, sessions)
+        return True
+
+    def __upload(self, path, size, sessions=None):
         up_name = pathlib.PurePath(path).name
         LOGGER.info(f"Upload Name : {up_name}")
-        drive = gdriveTools.GoogleDriveHelper(up_name, self)
-        if size == 0:
-            size = fs_utils.get_path_size(m_path)
+        journal.record(self.uid, 'upload', upload_path=path)
+        drive = gdriveTools.GoogleDriveHelper(up_name, self, sessions)
         upload_status = UploadStatus(drive, size, self)
         with download_dict_lock:
             download_dict[self.uid] = upload_status
@@ -105,20 +136,22 @@ class MirrorListener(listeners.MirrorListeners):
         drive.upload(up_name)
 
     def onDownloadError(self, error):
+        download_stage.release(self.uid)
+        record_finished(self.uid, 'failed')
         error = error.replace('<', ' ')
         error = error.replace('>', ' ')
         LOGGER.info(self.update.effective_chat.id)
         with download_dict_lock:
             try:
-                download = download_dict[self.uid]
                 del download_dict[self.uid]
-                LOGGER.info(f"Deleting folder: {download.path()}")
-                fs_utils.clean_download(download.path())
                 LOGGER.info(str(download_dict))
             except Exception as e:
                 LOGGER.error(str(e))
                 pass
             count = len(download_dict)
+        # Cleaning up never happens under download_dict_lock
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         if self.message.from_user.username:
             uname = f"@{self.message.from_user.username}"
         else:
@@ -138,6 +171,7 @@ class MirrorListener(listeners.MirrorListeners):
         pass
 
     def onUploadComplete(self, link: str):
+        record_finished(self.uid, 'done')
         with download_dict_lock:
             msg = f'<a href="{link}">{download_dict[self.uid].name()}</a> ({download_dict[self.uid].size()})'
             LOGGER.info(f'Done Uploading {download_dict[self.uid].name()}')
@@ -148,12 +182,10 @@ class MirrorListener(listeners.MirrorListeners):
                 msg += f'\n\n Shareable link: <a href="{share_url}">here</a>'
             if self.tag is not None:
                 msg += f'\ncc: @{self.tag}'
-            try:
-                fs_utils.clean_download(download_dict[self.uid].path())
-            except FileNotFoundError:
-                pass
             del download_dict[self.uid]
             count = len(download_dict)
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         from bot.helper.telegram_helper.message_utils import send_message_async
         send_message_async(self.update.effective_chat.id, self.update.message.message_id, msg, parse_mode='HTML')
         if count == 0:
@@ -162,14 +194,13 @@ class MirrorListener(listeners.MirrorListeners):
             update_all_messages()
 
     def onUploadError(self, error):
+        record_finished(self.uid, 'failed')
         e_str = error.replace('<', '').replace('>', '')
         with download_dict_lock:
-            try:
-                fs_utils.clean_download(download_dict[self.uid].path())
-            except FileNotFoundError:
-                pass
             del download_dict[self.message.message_id]
             count = len(download_dict)
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         from bot.helper.telegram_helper.message_utils import send_message_async
         send_message_async(self.update.effective_chat.id, self.update.message.message_id, e_str, parse_mode='HTML')
         if count == 0:
@@ -178,8 +209,38 @@ class MirrorListener(listeners.MirrorListeners):
             update_all_messages()
 
 
+def start_mirror(listener, link, priority, gid=None):
+    """
+    Queues the download of link, or of the file in the replied message when link is empty
+    :param gid: aria2 gid of a download started before a restart, it is taken over if aria2 still has it
+    """
+    listener.priority = priority
+    record_job(listener, 'mirror', link)
+    path = f'{DOWNLOAD_DIR}{listener.uid}/'
+    if len(link) == 0:
+        reply_to = listener.message.reply_to_message
+        file = next(i for i in [reply_to.document, reply_to.video, reply_to.audio] if i is not None)
+        queue_download(listener, file.file_name,
+                       lambda: TelegramDownloadHelper(listener).add_download(reply_to, path), file.file_size)
+    elif bot_utils.is_mega_link(link) and MEGA_KEY is not None:
+        from bot.helper.mirror_utils.download_utils.mega_download import MegaDownloader
+        queue_download(listener, link, lambda: MegaDownloader(listener).add_download(link, path))
+    elif gid is not None:
+        queue_download(listener, link, lambda: ariaDlManager.attach(gid, listener)
+                       or ariaDlManager.add_download(link, path, listener))
+    else:
+        queue_download(listener, link, lambda: ariaDlManager.add_download(link, path, listener))
+
+
+def _resume_mirror(update, job):
+    listener = MirrorListener(application.bot, update, job['isTar'], job['tag'], job['extract'])
+    listener.priority = job.get('priority', JobPriority.NORMAL)
+    if not listener.resume_upload(job):
+        start_mirror(listener, job['link'], listener.priority, job.get('gid'))
+
+
 async def mirror(update, context):
-    message_args = update.message.text.split(' ')
+    message_args, priority = pop_priority_flag(update.message.text.split(' '))
     try:
         link = message_args[1]
     except IndexError:
@@ -200,14 +261,12 @@ async def mirror(update, context):
             if file is not None:
                 if file.mime_type != "application/x-bittorrent":
                     listener = MirrorListener(context.bot, update, False, tag, False)
-                    tg_downloader = TelegramDownloadHelper(listener)
-                    tg_downloader.add_download(reply_to, f'{DOWNLOAD_DIR}{listener.uid}/')
+                    start_mirror(listener, '', default_priority(listener, priority))
                     await sendStatusMessage(update, context)
-                    if len(Interval) == 0:
-                        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+                    start_status_updater()
                     return
                 else:
-                    link = file.get_file().file_path
+                    link = (await file.get_file()).file_path
     else:
         tag = None
     if not bot_utils.is_url(link) and not bot_utils.is_magnet(link):
@@ -215,19 +274,13 @@ async def mirror(update, context):
         return
 
     try:
-        link = direct_link_generator(link)
+        link = await run_in_executor('io', direct_link_generator, link)
     except DirectDownloadLinkException as e:
         LOGGER.info(f'{link}: {e}')
     listener = MirrorListener(context.bot, update, False, tag, False)
-    if bot_utils.is_mega_link(link) and MEGA_KEY is not None:
-        from bot.helper.mirror_utils.download_utils.mega_download import MegaDownloader
-        mega_dl = MegaDownloader(listener)
-        mega_dl.add_download(link, f'{DOWNLOAD_DIR}{listener.uid}/')
-    else:
-        ariaDlManager.add_download(link, f'{DOWNLOAD_DIR}{listener.uid}/', listener)
+    start_mirror(listener, link, default_priority(listener, priority))
     await sendStatusMessage(update, context)
-    if len(Interval) == 0:
-        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+    start_status_updater()
 
 
 async def tar_mirror(update, context):
@@ -235,7 +288,7 @@ async def tar_mirror(update, context):
 
 
 async def unzip_mirror(update, context):
-    message_args = update.message.text.split(' ')
+    message_args, priority = pop_priority_flag(update.message.text.split(' '))
     try:
         link = message_args[1]
     except IndexError:
@@ -246,12 +299,12 @@ async def unzip_mirror(update, context):
     if not bot_utils.is_url(link) and not bot_utils.is_magnet(link):
         await sendMessage('No download source provided', context, update)
         return
-    ariaDlManager.add_download(link, f'{DOWNLOAD_DIR}{listener.uid}/', listener)
+    start_mirror(listener, link, default_priority(listener, priority))
     await sendStatusMessage(update, context)
-    if len(Interval) == 0:
-        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+    start_status_updater()
 
 
+register_resumer('mirror', _resume_mirror)
 mirror_handler = CommandHandler(BotCommands.MirrorCommand, mirror,
                                 filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
 tar_mirror_handler = CommandHandler(BotCommands.TarMirrorCommand, tar_mirror,
@@ -1,34 +1,65 @@
-from telegram.ext import CommandHandler
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, CallbackQueryHandler
+from telegram.error import BadRequest
 from bot.helper.telegram_helper.message_utils import sendMessage
 from bot.helper.telegram_helper.filters import CustomFilters
 from bot.helper.telegram_helper.bot_commands import BotCommands
 from bot.helper.telegram_helper.message_utils import *
-from bot import application, status_reply_dict, DOWNLOAD_STATUS_UPDATE_INTERVAL, status_reply_dict_lock, bot
-from time import sleep
-from bot.helper.ext_utils.bot_utils import get_readable_message
-from telegram.error import BadRequest
-import threading
+from bot.helper.ext_utils.bot_utils import getStatusById, get_readable_detail
+from bot.helper.ext_utils.executors import run_in_executor
+from bot import application, AUTHORIZED_CHATS, OWNER_ID
+
+
+def _detail_keyboard(job_id) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("Refresh", callback_data=f"status:{job_id}")]])
+
+
+def _render_detail(job_id):
+    _, download = getStatusById(job_id)
+    if download is None:
+        return None
+    return get_readable_detail(download)
+
 
 async def mirror_status(update, context):
-    with status_reply_dict_lock:
-        if update.message.chat.id in list(status_reply_dict.keys()):
-            try:
-                message_obj, _ = status_reply_dict[update.message.chat.id]
-                if message_obj:  # Only delete if message_obj is not None
-                    await deleteMessage(context, message_obj)
-                del status_reply_dict[update.message.chat.id]
-            except Exception as e:
-                LOGGER.error(str(e))
-                del status_reply_dict[update.message.chat.id]
-        
-        message = await sendMessage(get_readable_message(), context, update)
-        # Only store in status_reply_dict if message was sent successfully
-        if message is not None:
-            status_reply_dict[update.message.chat.id] = (message, get_readable_message())
-        else:
-            LOGGER.error(f"Failed to send status message to chat {update.message.chat.id}")
+    args = update.message.text.split(' ', maxsplit=1)
+    if len(args) == 1:
+        await sendStatusMessage(update, context)
+        return
+    job_id = args[1].strip()
+    text = await run_in_executor('io', _render_detail, job_id)
+    if text is None:
+        await sendMessage(f"GID: <code>{job_id}</code> not found.", context, update)
+        return
+    await sendMessage(text, context, update, reply_markup=_detail_keyboard(job_id))
+
+
+async def status_refresh(update, context):
+    query = update.callback_query
+    user_id = update.effective_user.id if update.effective_user else None
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    if user_id != OWNER_ID and user_id not in AUTHORIZED_CHATS and chat_id not in AUTHORIZED_CHATS:
+        await query.answer("Not authorized", show_alert=True)
+        return
+    job_id = query.data.split(':', maxsplit=1)[1]
+    text = await run_in_executor('io', _render_detail, job_id)
+    if text is None:
+        await query.answer("This job has finished or was cancelled")
+        try:
+            await query.edit_message_reply_markup(reply_markup=None)
+        except BadRequest as e:
+            LOGGER.error(str(e))
+        return
+    await query.answer()
+    if text != (query.message.text_html if query.message else None):
+        try:
+            await query.edit_message_text(text=text, parse_mode='HTML', reply_markup=_detail_keyboard(job_id))
+        except BadRequest as e:
+            LOGGER.error(str(e))
 
 
 stats_handler = CommandHandler(BotCommands.StatusCommand, mirror_status,
                                filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
+status_refresh_handler = CallbackQueryHandler(status_refresh, pattern=r"^status:")
 application.add_handler(stats_handler)
+application.add_handler(status_refresh_handler)
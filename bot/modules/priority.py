@@ -0,0 +1,50 @@
+from telegram.ext import CommandHandler
+
+from bot import application, download_dict, download_dict_lock, OWNER_ID
+from bot.helper.ext_utils.bot_utils import getStatusById
+from bot.helper.ext_utils.executors import run_in_executor
+from bot.helper.mirror_utils.pipeline import JobPriority, set_job_priority
+from bot.helper.telegram_helper.bot_commands import BotCommands
+from bot.helper.telegram_helper.filters import CustomFilters
+from bot.helper.telegram_helper.message_utils import *
+
+
+def _apply_priority(download, priority):
+    listener = download.getListener()
+    set_job_priority(listener, priority)
+    if hasattr(download, 'aria_download'):
+        from bot.modules.mirror import ariaDlManager
+        ariaDlManager.reposition(download.gid(), priority)
+
+
+async def priority(update, context):
+    args = update.message.text.split(' ')
+    usage = f"/{BotCommands.PriorityCommand} [gid] high|normal|low, or reply to the mirror message"
+    if len(args) == 3:
+        job_id, level = args[1], args[2].lower()
+        _, download = await run_in_executor('io', getStatusById, job_id)
+    elif len(args) == 2 and update.message.reply_to_message:
+        level = args[1].lower()
+        with download_dict_lock:
+            download = download_dict.get(update.message.reply_to_message.message_id)
+    else:
+        await sendMessage(usage, context, update)
+        return
+    if level not in JobPriority.NAMES:
+        await sendMessage(usage, context, update)
+        return
+    if download is None or not hasattr(download, 'getListener'):
+        await sendMessage("Only queued or downloading jobs can be reprioritized", context, update)
+        return
+    user_id = update.message.from_user.id
+    if user_id != OWNER_ID and download.message.from_user.id != user_id:
+        await sendMessage("You can only change the priority of your own jobs", context, update)
+        return
+    await run_in_executor('io', _apply_priority, download, JobPriority.NAMES[level])
+    await sendMessage(f"Priority of <i>{download.name()}</i> set to {level}", context, update)
+    await run_in_executor('io', update_all_messages)
+
+
+priority_handler = CommandHandler(BotCommands.PriorityCommand, priority,
+                                  filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
+application.add_handler(priority_handler)
@@ -3,9 +3,12 @@ from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, f
 import bot
 from bot import application, LOGGER
 from bot.helper.telegram_helper.filters import CustomFilters
+from bot.helper.mirror_utils.pipeline import download_stage, process_stage, upload_stage
 import os
 from telegram.error import BadRequest
 
+_STAGES = {stage.name: stage for stage in (download_stage, process_stage, upload_stage)}
+
 
 def _settings_text() -> str:
 	index_url = bot.INDEX_URL if bot.INDEX_URL else 'None'
@@ -16,6 +19,9 @@ def _settings_text() -> str:
 		f"Team Drive: <code>{bot.IS_TEAM_DRIVE}</code>\n"
 		f"Use Service Accounts: <code>{bot.USE_SERVICE_ACCOUNTS}</code>\n"
 		f"Status Update Interval: <code>{bot.DOWNLOAD_STATUS_UPDATE_INTERVAL}s</code>\n"
+		f"Compact Status: <code>{bot.STATUS_COMPACT}</code>\n"
+		f"Stage Limits (download/process/upload): "
+		f"<code>{download_stage.limit}/{process_stage.limit}/{upload_stage.limit}</code>\n"
 		f"Auto Delete Duration: <code>{bot.AUTO_DELETE_MESSAGE_DURATION}</code> (−1 disables)\n"
 		f"Index URL: <code>{index_url}</code>\n"
 		f"Upload as Video: <code>{bot.UPLOAD_AS_VIDEO}</code>\n"
@@ -41,6 +47,24 @@ def _settings_keyboard() -> InlineKeyboardMarkup:
 			InlineKeyboardButton("DS Update −", callback_data="settings:dsui_dec"),
 			InlineKeyboardButton("DS Update +", callback_data="settings:dsui_inc"),
 		],
+		[
+			InlineKeyboardButton(
+				f"Compact Status: {'ON' if bot.STATUS_COMPACT else 'OFF'}",
+				callback_data="settings:toggle_compact",
+			),
+		],
+		[
+			InlineKeyboardButton("DL Slots −", callback_data="settings:stage_dec:download"),
+			InlineKeyboardButton("DL Slots +", callback_data="settings:stage_inc:download"),
+		],
+		[
+			InlineKeyboardButton("Process Slots −", callback_data="settings:stage_dec:process"),
+			InlineKeyboardButton("Process Slots +", callback_data="settings:stage_inc:process"),
+		],
+		[
+			InlineKeyboardButton("UL Slots −", callback_data="settings:stage_dec:upload"),
+			InlineKeyboardButton("UL Slots +", callback_data="settings:stage_inc:upload"),
+		],
 		[
 			InlineKeyboardButton("AutoDelete −", callback_data="settings:ad_dec"),
 			InlineKeyboardButton("AutoDelete +", callback_data="settings:ad_inc"),
@@ -105,6 +129,14 @@ async def settings_callback(update, context):
 		elif data == "settings:dsui_dec":
 			bot.DOWNLOAD_STATUS_UPDATE_INTERVAL = max(1, bot.DOWNLOAD_STATUS_UPDATE_INTERVAL - 1)
 			changed = True
+		elif data == "settings:toggle_compact":
+			bot.STATUS_COMPACT = not bot.STATUS_COMPACT
+			changed = True
+		elif data.startswith("settings:stage_inc:") or data.startswith("settings:stage_dec:"):
+			stage = _STAGES[data.rsplit(':', 1)[1]]
+			step = 1 if data.startswith("settings:stage_inc:") else -1
+			stage.set_limit(min(20, stage.limit + step))
+			changed = True
 		elif data == "settings:ad_inc":
 			if bot.AUTO_DELETE_MESSAGE_DURATION == -1:
 				bot.AUTO_DELETE_MESSAGE_DURATION = 20
@@ -170,6 +202,8 @@ async def _handle_token_upload(update, context):
 	# download file
 	file = await context.bot.get_file(doc.file_id)
 	await file.download_to_drive(custom_path='token.pickle')
+	from bot.helper.mirror_utils.upload_utils.drive_auth import drive_auth
+	drive_auth.invalidate()
 	bot.WAITING_FOR_TOKEN_PICKLE = False
 	await context.bot.send_message(chat_id=update.effective_chat.id,
 								  reply_to_message_id=update.effective_message.message_id,
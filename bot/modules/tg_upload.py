@@ -1,17 +1,20 @@
 import os
 import pathlib
 import subprocess
-import threading
 
 from telegram.ext import CommandHandler
 
-from bot import Interval, LOGGER
-from bot import application, DOWNLOAD_DIR, DOWNLOAD_STATUS_UPDATE_INTERVAL, download_dict, download_dict_lock
+from bot import LOGGER
+from bot import application, DOWNLOAD_DIR, download_dict, download_dict_lock
 from bot.helper.ext_utils import fs_utils, bot_utils
-from bot.helper.ext_utils.bot_utils import setInterval
+from bot.helper.ext_utils.executors import get_executor
 from bot.helper.ext_utils.exceptions import NotSupportedExtractionArchive
+from bot.helper.ext_utils.disk_ledger import disk_ledger
+from bot.helper.ext_utils.job_journal import journal, record_job, record_finished, register_resumer
 from bot.helper.mirror_utils.download_utils.aria2_download import AriaDownloadHelper
 from bot.helper.mirror_utils.download_utils.telegram_downloader import TelegramDownloadHelper
+from bot.helper.mirror_utils.pipeline import download_stage, process_stage, upload_stage, enqueue, queue_download, \
+    JobPriority, default_priority, pop_priority_flag
 from bot.helper.mirror_utils.status_utils import listeners
 from bot.helper.mirror_utils.status_utils.extract_status import ExtractStatus
 from bot.helper.mirror_utils.status_utils.tar_status import TarStatus
@@ -39,12 +42,8 @@ class TgUploadListener(listeners.MirrorListeners):
         pass
 
     def clean(self):
-        try:
-            Interval[0].cancel()
-            del Interval[0]
+        if stop_status_updater():
             delete_all_messages()
-        except IndexError:
-            pass
 
     def onDownloadComplete(self):
         with download_dict_lock:
@@ -55,11 +54,22 @@ class TgUploadListener(listeners.MirrorListeners):
             if name is None:
                 name = os.listdir(f'{DOWNLOAD_DIR}{self.uid}')[0]
             m_path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+        download_stage.release(self.uid, size)
+        journal.record(self.uid, 'path', path=m_path)
+        # Directories are always archived before they can be sent to Telegram
+        if self.isTar or self.extract or os.path.isdir(m_path):
+            enqueue(process_stage, self, name, size, lambda: self.__process(download, name, m_path, size))
+        else:
+            self.__queue_upload(name, m_path, size)
+        update_all_messages()
+
+    def __process(self, download, name, m_path, size):
         if self.isTar:
             download.is_archiving = True
             try:
                 with download_dict_lock:
                     download_dict[self.uid] = TarStatus(name, m_path, size)
+                update_all_messages()
                 path = fs_utils.tar(m_path)
             except FileNotFoundError:
                 LOGGER.info('File to archive not found!')
@@ -74,34 +84,42 @@ class TgUploadListener(listeners.MirrorListeners):
                 )
                 with download_dict_lock:
                     download_dict[self.uid] = ExtractStatus(name, m_path, size)
+                update_all_messages()
                 archive_result = subprocess.run(["extract", m_path])
                 if archive_result.returncode == 0:
-                    threading.Thread(target=os.remove, args=(m_path,)).start()
+                    get_executor('io').submit(os.remove, m_path)
                     LOGGER.info(f"Deleting archive : {m_path}")
                 else:
                     LOGGER.warning('Unable to extract archive! Uploading anyway')
-                    path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+                    path = m_path
                 LOGGER.info(
                     f'got path : {path}'
                 )
 
             except NotSupportedExtractionArchive:
                 LOGGER.info("Not any valid archive, uploading file as it is.")
-                path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+                path = m_path
         else:
-            path = f'{DOWNLOAD_DIR}{self.uid}/{name}'
+            path = m_path
 
         # If it is a directory, try tarring before upload
         if os.path.isdir(path):
             try:
+                with download_dict_lock:
+                    download_dict[self.uid] = TarStatus(name, path, size)
+                update_all_messages()
                 path = fs_utils.tar(path)
-                name = pathlib.PurePath(path).name
             except Exception:
                 self.onUploadError('Cannot upload directories to Telegram')
                 return
-        else:
-            name = pathlib.PurePath(path).name
+        self.__queue_upload(name, path, size)
+        update_all_messages()
+
+    def __queue_upload(self, name, path, size):
+        enqueue(upload_stage, self, name, size, lambda: self.__upload(path, size))
 
+    def __upload(self, path, size):
+        name = pathlib.PurePath(path).name
         # Prepare Telegram uploader and status
         if size == 0:
             size = fs_utils.get_path_size(path)
@@ -115,19 +133,21 @@ class TgUploadListener(listeners.MirrorListeners):
         uploader.upload(path)
 
     def onDownloadError(self, error):
+        download_stage.release(self.uid)
+        record_finished(self.uid, 'failed')
         error = error.replace('<', ' ').replace('>', ' ')
         LOGGER.info(self.update.effective_chat.id)
         with download_dict_lock:
             try:
-                download = download_dict[self.uid]
                 del download_dict[self.uid]
-                LOGGER.info(f"Deleting folder: {download.path()}")
-                fs_utils.clean_download(download.path())
                 LOGGER.info(str(download_dict))
             except Exception as e:
                 LOGGER.error(str(e))
                 pass
             count = len(download_dict)
+        # Cleaning up never happens under download_dict_lock
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         if self.message.from_user.username:
             uname = f"@{self.message.from_user.username}"
         else:
@@ -147,16 +167,17 @@ class TgUploadListener(listeners.MirrorListeners):
         pass
 
     def onUploadComplete(self, _link: str):
+        record_finished(self.uid, 'done')
+        name = None
         with download_dict_lock:
             try:
-                fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
-            except FileNotFoundError:
-                pass
-            try:
+                name = download_dict[self.uid].name()
                 del download_dict[self.uid]
             except KeyError:
                 pass
             count = len(download_dict)
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         msg = f"Uploaded to Telegram: {name}"
         if self.tag is not None:
             msg += f'\ncc: @{self.tag}'
@@ -168,17 +189,16 @@ class TgUploadListener(listeners.MirrorListeners):
             update_all_messages()
 
     def onUploadError(self, error):
+        record_finished(self.uid, 'failed')
         e_str = error.replace('<', '').replace('>', '')
         with download_dict_lock:
-            try:
-                fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
-            except FileNotFoundError:
-                pass
             try:
                 del download_dict[self.uid]
             except KeyError:
                 pass
             count = len(download_dict)
+        fs_utils.clean_download(f'{DOWNLOAD_DIR}{self.uid}')
+        disk_ledger.release(self.uid)
         from bot.helper.telegram_helper.message_utils import send_message_async
         send_message_async(self.update.effective_chat.id, self.update.message.message_id, e_str, parse_mode='HTML')
         if count == 0:
@@ -187,8 +207,30 @@ class TgUploadListener(listeners.MirrorListeners):
             update_all_messages()
 
 
+def start_tgupload(listener, link, priority, gid=None):
+    """Queues the download of link, or of the file in the replied message when link is empty"""
+    listener.priority = priority
+    record_job(listener, 'tgupload', link)
+    path = f'{DOWNLOAD_DIR}{listener.uid}/'
+    if len(link) == 0:
+        reply_to = listener.message.reply_to_message
+        file = next(i for i in [reply_to.document, reply_to.video, reply_to.audio] if i is not None)
+        queue_download(listener, file.file_name,
+                       lambda: TelegramDownloadHelper(listener).add_download(reply_to, path), file.file_size)
+    elif gid is not None:
+        queue_download(listener, link, lambda: ariaDlManager.attach(gid, listener)
+                       or ariaDlManager.add_download(link, path, listener))
+    else:
+        queue_download(listener, link, lambda: ariaDlManager.add_download(link, path, listener))
+
+
+def _resume_tgupload(update, job):
+    listener = TgUploadListener(application.bot, update, job['isTar'], job['tag'], job['extract'])
+    start_tgupload(listener, job['link'], job.get('priority', JobPriority.NORMAL), job.get('gid'))
+
+
 async def tgupload(update, context):
-    message_args = update.message.text.split(' ')
+    message_args, priority = pop_priority_flag(update.message.text.split(' '))
     try:
         link = message_args[1]
     except IndexError:
@@ -208,14 +250,12 @@ async def tgupload(update, context):
             if file is not None:
                 if file.mime_type != "application/x-bittorrent":
                     listener = TgUploadListener(context.bot, update, False, tag, False)
-                    tg_downloader = TelegramDownloadHelper(listener)
-                    tg_downloader.add_download(reply_to, f'{DOWNLOAD_DIR}{listener.uid}/')
+                    start_tgupload(listener, '', default_priority(listener, priority))
                     await sendStatusMessage(update, context)
-                    if len(Interval) == 0:
-                        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+                    start_status_updater()
                     return
                 else:
-                    link = file.get_file().file_path
+                    link = (await file.get_file()).file_path
     else:
         tag = None
     if not bot_utils.is_url(link) and not bot_utils.is_magnet(link):
@@ -223,12 +263,12 @@ async def tgupload(update, context):
         return
 
     listener = TgUploadListener(context.bot, update, False, tag, False)
-    ariaDlManager.add_download(link, f'{DOWNLOAD_DIR}{listener.uid}/', listener)
+    start_tgupload(listener, link, default_priority(listener, priority))
     await sendStatusMessage(update, context)
-    if len(Interval) == 0:
-        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+    start_status_updater()
 
 
+register_resumer('tgupload', _resume_tgupload)
 tg_upload_handler = CommandHandler(BotCommands.TgUploadCommand, tgupload,
                                    filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
 application.add_handler(tg_upload_handler)
\ No newline at end of file
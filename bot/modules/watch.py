@@ -1,24 +1,36 @@
 from telegram.ext import CommandHandler
-from telegram import Bot, Update
-from bot import Interval, DOWNLOAD_DIR, DOWNLOAD_STATUS_UPDATE_INTERVAL, application, LOGGER
-from bot.helper.ext_utils.bot_utils import setInterval
-from bot.helper.telegram_helper.message_utils import update_all_messages, sendMessage, sendStatusMessage
+from bot import DOWNLOAD_DIR, application, LOGGER
+from bot.helper.telegram_helper.message_utils import start_status_updater, sendMessage, sendStatusMessage
 from .mirror import MirrorListener
 from bot.helper.mirror_utils.download_utils.youtube_dl_download_helper import YoutubeDLHelper
 from bot.helper.telegram_helper.bot_commands import BotCommands
 from bot.helper.telegram_helper.filters import CustomFilters
-import threading
+from bot.helper.mirror_utils.pipeline import queue_download, JobPriority, default_priority, pop_priority_flag
+from bot.helper.ext_utils.job_journal import record_job, register_resumer
 
 
-def _watch(bot: Bot, update: Update, args: list, isTar=False):
+def start_watch(listener, link, qual, priority):
+    listener.priority = priority
+    record_job(listener, 'watch', link, qual=qual)
+    ydl = YoutubeDLHelper(listener)
+    queue_download(listener, link, lambda: ydl.add_download(link, f'{DOWNLOAD_DIR}{listener.uid}', qual))
+
+
+def _resume_watch(update, job):
+    listener = MirrorListener(application.bot, update, job['isTar'], job['tag'])
+    listener.priority = job.get('priority', JobPriority.NORMAL)
+    if not listener.resume_upload(job):
+        start_watch(listener, job['link'], job['qual'], listener.priority)
+
+
+async def _watch(update, context, isTar=False):
+    args, priority = pop_priority_flag(context.args)
     try:
         link = args[0]
     except IndexError:
         msg = f"/{BotCommands.WatchCommand} [yt_dl supported link] [quality] to mirror with youtube_dl.\n\n"
         msg += "Example of quality :- audio, 144, 360, 720, 1080.\nNote :- Quality is optional"
-        # Legacy sync util used here
-        from bot.helper.telegram_helper.message_utils import bot as sync_bot
-        sync_bot.send_message(update.effective_chat.id, reply_to_message_id=update.message.message_id, text=msg, parse_mode='HTML')
+        await sendMessage(msg, context, update)
         return
     try:
       qual = args[1]
@@ -32,23 +44,21 @@ def _watch(bot: Bot, update: Update, args: list, isTar=False):
     else:
         tag = None
 
-    listener = MirrorListener(bot, update, isTar, tag)
-    ydl = YoutubeDLHelper(listener)
-    threading.Thread(target=ydl.add_download,args=(link, f'{DOWNLOAD_DIR}{listener.uid}', qual)).start()
-    from bot.helper.telegram_helper.message_utils import bot as sync_bot
-    sync_bot.send_message(update.effective_chat.id, reply_to_message_id=update.message.message_id, text="Starting...")
-    if len(Interval) == 0:
-        Interval.append(setInterval(DOWNLOAD_STATUS_UPDATE_INTERVAL, update_all_messages))
+    listener = MirrorListener(context.bot, update, isTar, tag)
+    start_watch(listener, link, qual, default_priority(listener, priority))
+    await sendStatusMessage(update, context)
+    start_status_updater()
 
 
 async def watchTar(update, context):
-    _watch(context.bot, update, context.args, True)
+    await _watch(update, context, True)
 
 
-def watch(update, context):
-    _watch(context.bot, update, context.args)
+async def watch(update, context):
+    await _watch(update, context)
 
 
+register_resumer('watch', _resume_watch)
 mirror_handler = CommandHandler(BotCommands.WatchCommand, watch,
                                 filters=CustomFilters.authorized_chat | CustomFilters.authorized_user)
 tar_mirror_handler = CommandHandler(BotCommands.TarWatchCommand, watchTar,
@@ -0,0 +1,13 @@
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# bot reads config.env from the working directory and writes its log and databases there, so the tests run in a
+# scratch directory with a copy of the config
+_workdir = tempfile.mkdtemp(prefix='mirror-bot-tests-')
+shutil.copy(os.path.join(ROOT, 'config.env'), _workdir)
+os.chdir(_workdir)
@@ -0,0 +1,107 @@
+import itertools
+import re
+
+import pytest
+
+from bot.helper.mirror_utils.upload_utils import gdriveTools
+
+FOLDER = 'application/vnd.google-apps.folder'
+
+
+class _Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self, num_retries=0):
+        return self.fn()
+
+
+class _Batch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+
+class FakeDrive:
+    """In-memory Drive service with the calls the helper makes, every service of every account is the same one"""
+
+    def __init__(self):
+        self.files_by_id = {}
+        # Copies run on several threads, next() of a count is atomic where a generator's is not
+        self.counter = itertools.count()
+        self.listed = []
+        self.copied = []
+        self.trashed = []
+        # folder id: fn() called before the folder is listed
+        self.before_list = {}
+
+    def add(self, file_id, name, parent, mime_type='text/plain', size=None, md5=None):
+        file = {'id': file_id, 'name': name, 'parents': [parent], 'mimeType': mime_type}
+        if size is not None:
+            file['size'] = str(size)
+        if md5 is not None:
+            file['md5Checksum'] = md5
+        self.files_by_id[file_id] = file
+        return file
+
+    def children(self, folder_id):
+        return [file for file in self.files_by_id.values()
+                if folder_id in file['parents'] and not file.get('trashed')]
+
+    def files(self):
+        return self
+
+    def permissions(self):
+        return self
+
+    def new_batch_http_request(self, callback):
+        return _Batch(callback)
+
+    def list(self, q, pageToken=None, **kwargs):
+        folder_id = re.match(r"'([^']+)' in parents", q).group(1)
+
+        def run():
+            self.before_list.get(folder_id, lambda: None)()
+            self.listed.append(folder_id)
+            return {'files': [{key: value for key, value in file.items() if key != 'parents'}
+                              for file in self.children(folder_id)]}
+        return _Request(run)
+
+    def get(self, fileId, **kwargs):
+        return _Request(lambda: self.files_by_id[fileId])
+
+    def copy(self, fileId, body, **kwargs):
+        def run():
+            source = self.files_by_id[fileId]
+            self.copied.append(fileId)
+            return self.add(f'new{next(self.counter)}', source['name'], body['parents'][0], source['mimeType'],
+                            source.get('size'), source.get('md5Checksum'))
+        return _Request(run)
+
+    def update(self, fileId, body, **kwargs):
+        def run():
+            self.files_by_id[fileId].update(body)
+            if body.get('trashed'):
+                self.trashed.append(fileId)
+            return self.files_by_id[fileId]
+        return _Request(run)
+
+    def create(self, body=None, fileId=None, **kwargs):
+        if fileId is not None:
+            # A permission
+            return _Request(lambda: {'id': f'permission-{fileId}'})
+        return _Request(lambda: self.add(f'new{next(self.counter)}', body['name'], body['parents'][0], body['mimeType']))
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    fake = FakeDrive()
+    monkeypatch.setattr(gdriveTools.drive_auth, 'service', lambda account=None: fake)
+    return fake
@@ -0,0 +1,47 @@
+from bot.helper.mirror_utils.download_utils.aioaria2_adapter import AioAria2API
+
+
+def _capturing_api(token, response):
+    api = AioAria2API("http://localhost:6800/jsonrpc", token=token)
+    api._ensure_http()
+    sent = []
+
+    async def send_request(req_obj):
+        sent.append(req_obj)
+        return response
+
+    api._http.send_request = send_request
+    return api, sent
+
+
+def test_multicall_sends_one_system_multicall_with_the_secret_in_every_call():
+    api, sent = _capturing_api("secret", [["OK"], ["OK"]])
+
+    results = api.multicall([("forcePause", "2089b05ecca3d829"), ("forceRemove", "cca3d8292089b05e")])
+
+    assert results == ["OK", "OK"]
+    assert len(sent) == 1
+    body = dict(sent[0])
+    body.pop("id")
+    assert body == {
+        "jsonrpc": "2.0",
+        "method": "system.multicall",
+        "params": [[
+            {"methodName": "aria2.forcePause", "params": ["token:secret", "2089b05ecca3d829"]},
+            {"methodName": "aria2.forceRemove", "params": ["token:secret", "cca3d8292089b05e"]},
+        ]],
+    }
+
+
+def test_multicall_keeps_the_faults_of_single_calls():
+    fault = {"code": 1, "message": "GID 2089b05ecca3d829 is not found"}
+    api, sent = _capturing_api("secret", [fault, ["OK"]])
+
+    assert api.multicall([("unpause", "2089b05ecca3d829"), ("unpause", "cca3d8292089b05e")]) == [fault, "OK"]
+
+
+def test_multicall_without_calls_sends_nothing():
+    api, sent = _capturing_api("secret", [])
+
+    assert api.multicall([]) == []
+    assert sent == []
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot.helper.mirror_utils.upload_utils import chunk_sizer as chunk_sizer_module
+from bot.helper.mirror_utils.upload_utils.chunk_sizer import ChunkSizer, CHUNK_ALIGN, TARGET_CHUNK_SECONDS
+
+MIB = 1024 * 1024
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(chunk_sizer_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def _send(sizer, clock, seconds):
+    """Sends a chunk of the current size which takes seconds. :return The size of the next chunk"""
+    size = sizer.size
+    sizer.start()
+    clock.now += seconds
+    sizer.sent(size)
+    return sizer.size
+
+
+def test_sizes_are_aligned_to_256_kib():
+    sizer = ChunkSizer(MIB + 1000, 5 * MIB + 1000)
+    assert sizer.size == MIB
+
+    sizer = ChunkSizer(1000, 1000)
+    assert sizer.size == CHUNK_ALIGN
+
+
+def test_the_size_at_most_doubles_per_chunk(clock):
+    sizer = ChunkSizer(MIB, 64 * MIB)
+
+    # Chunks sent almost instantly could be far larger, still the size only doubles
+    assert [_send(sizer, clock, 0.01) for _ in range(4)] == [2 * MIB, 4 * MIB, 8 * MIB, 16 * MIB]
+
+
+def test_the_size_follows_the_throughput(clock):
+    sizer = ChunkSizer(MIB, 64 * MIB)
+    sizer.size = 8 * MIB
+
+    # 8 MiB in 8s is 1 MiB/s, so a chunk of TARGET_CHUNK_SECONDS MiB takes the target time
+    assert _send(sizer, clock, 8) == TARGET_CHUNK_SECONDS * MIB
+    assert sizer.size % CHUNK_ALIGN == 0
+    # Somewhat slower than the target does not change the size
+    assert _send(sizer, clock, TARGET_CHUNK_SECONDS * 1.5) == TARGET_CHUNK_SECONDS * MIB
+
+
+def test_a_slow_chunk_halves_the_size(clock):
+    sizer = ChunkSizer(MIB, 64 * MIB)
+    sizer.size = 16 * MIB
+
+    assert _send(sizer, clock, TARGET_CHUNK_SECONDS * 10) == 8 * MIB
+
+
+def test_a_failed_chunk_halves_the_size():
+    sizer = ChunkSizer(MIB, 64 * MIB)
+    sizer.size = 16 * MIB
+
+    sizer.failed()
+    assert sizer.size == 8 * MIB
+
+
+def test_the_size_stays_within_the_bounds(clock):
+    sizer = ChunkSizer(MIB, 4 * MIB)
+
+    for _ in range(5):
+        _send(sizer, clock, 0.01)
+    assert sizer.size == 4 * MIB
+
+    for _ in range(5):
+        sizer.failed()
+    assert sizer.size == MIB
+    assert _send(sizer, clock, 1000) == MIB
+
+
+def test_nothing_changes_without_a_started_chunk_or_bytes_sent(clock):
+    sizer = ChunkSizer(MIB, 64 * MIB)
+    sizer.sent(MIB)
+    assert sizer.size == MIB
+
+    sizer.start()
+    clock.now += 0.01
+    sizer.sent(0)
+    assert sizer.size == MIB
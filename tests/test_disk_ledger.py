@@ -0,0 +1,73 @@
+from bot.helper.ext_utils import disk_ledger as disk_ledger_module
+from bot.helper.ext_utils.disk_ledger import DiskLedger
+
+
+def _ledger(tmp_path, monkeypatch, written):
+    walked = []
+
+    def get_path_size(path):
+        walked.append(path)
+        return written
+
+    monkeypatch.setattr(disk_ledger_module, 'get_path_size', get_path_size)
+    return DiskLedger(f'{tmp_path}/', 0), walked
+
+
+def test_admission_reads_the_last_measurement_without_walking_the_jobs(tmp_path, monkeypatch):
+    ledger, walked = _ledger(tmp_path, monkeypatch, 0)
+    ledger.reserve(1, 100)
+
+    free = ledger.available()
+    assert ledger.fits(2, 10) == (free >= 10)
+    ledger.too_large(10)
+    assert walked == []
+
+
+def test_refresh_counts_what_reserved_jobs_have_written(tmp_path, monkeypatch):
+    ledger, walked = _ledger(tmp_path, monkeypatch, 60)
+    ledger.reserve(1, 100)
+    before = ledger.available()
+
+    ledger.refresh()
+
+    assert walked == [f'{tmp_path}/1']
+    # The job has 40 bytes left to write instead of 100, give or take what the disk changed in between
+    assert abs(ledger.available() - before - 60) < 1024 * 1024
+
+
+class _Listener:
+    uid = 7
+
+
+def test_a_download_which_does_not_fit_is_held_until_space_is_freed(tmp_path, monkeypatch):
+    ledger, _ = _ledger(tmp_path, monkeypatch, 0)
+    monkeypatch.setattr(disk_ledger_module, 'disk_ledger', ledger)
+    # Another job takes all but 1 KiB of the free space
+    ledger.reserve(1, ledger.available() - 1024)
+    events = []
+
+    assert disk_ledger_module.expect_size(_Listener(), 4096, lambda: events.append('pause'),
+                                          lambda: events.append('resume'))
+
+    assert events == ['pause']
+    assert ledger.held(7)
+    assert ledger.reserved(7) == 0
+
+    ledger.release(1)
+    ledger.space_freed().result()
+
+    assert events == ['pause', 'resume']
+    assert not ledger.held(7)
+    assert ledger.reserved(7) == 4096
+
+
+def test_a_download_which_fits_is_reserved_and_goes_on(tmp_path, monkeypatch):
+    ledger, _ = _ledger(tmp_path, monkeypatch, 0)
+    monkeypatch.setattr(disk_ledger_module, 'disk_ledger', ledger)
+    events = []
+
+    assert disk_ledger_module.expect_size(_Listener(), 4096, lambda: events.append('pause'),
+                                          lambda: events.append('resume'))
+
+    assert events == []
+    assert ledger.reserved(7) == 4096
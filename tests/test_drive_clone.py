@@ -0,0 +1,78 @@
+from fake_drive import drive, FOLDER  # noqa: F401
+from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper
+
+DOC = 'application/vnd.google-apps.document'
+
+
+def _link(folder_id):
+    return f'https://drive.google.com/drive/folders/{folder_id}'
+
+
+def _names(drive, folder_id):
+    return sorted(file['name'] for file in drive.children(folder_id))
+
+
+def _sync(drive):
+    return GoogleDriveHelper().clone(_link('src'), _link('dest'))
+
+
+def test_sync_copies_new_and_changed_files_only(drive):
+    drive.add('src', 'Src', 'root', FOLDER)
+    drive.add('same', 'same.txt', 'src', size=5, md5='aaa')
+    drive.add('changed', 'changed.txt', 'src', size=5, md5='new')
+    drive.add('new', 'new.txt', 'src', size=7, md5='ccc')
+    drive.add('dest', 'Src', 'root', FOLDER)
+    drive.add('old-same', 'same.txt', 'dest', size=5, md5='aaa')
+    drive.add('old-changed', 'changed.txt', 'dest', size=5, md5='old')
+    drive.add('extra', 'extra.txt', 'dest', size=1, md5='ddd')
+
+    message = _sync(drive)
+
+    assert sorted(drive.copied) == ['changed', 'new']
+    assert '12B copied, 1 unchanged files skipped' in message
+    # The outdated copy is trashed, files which are only in the destination are kept
+    assert drive.trashed == ['old-changed']
+    assert _names(drive, 'dest') == ['changed.txt', 'extra.txt', 'new.txt', 'same.txt']
+
+
+def test_sync_reuses_existing_folders_and_creates_missing_ones(drive):
+    drive.add('src', 'Src', 'root', FOLDER)
+    drive.add('sub', 'sub', 'src', FOLDER)
+    drive.add('kept', 'kept.txt', 'sub', size=1, md5='aaa')
+    drive.add('added', 'added.txt', 'sub', size=1, md5='bbb')
+    drive.add('fresh', 'fresh', 'src', FOLDER)
+    drive.add('inner', 'inner.txt', 'fresh', size=1, md5='ccc')
+    drive.add('dest', 'Src', 'root', FOLDER)
+    drive.add('old-sub', 'sub', 'dest', FOLDER)
+    drive.add('old-kept', 'kept.txt', 'old-sub', size=1, md5='aaa')
+
+    _sync(drive)
+
+    assert sorted(drive.copied) == ['added', 'inner']
+    assert _names(drive, 'dest') == ['fresh', 'sub']
+    assert _names(drive, 'old-sub') == ['added.txt', 'kept.txt']
+    fresh = next(file for file in drive.children('dest') if file['name'] == 'fresh')
+    assert _names(drive, fresh['id']) == ['inner.txt']
+
+
+def test_google_docs_without_checksums_are_compared_by_name_and_type(drive):
+    drive.add('src', 'Src', 'root', FOLDER)
+    drive.add('doc', 'notes', 'src', DOC)
+    drive.add('sheet', 'budget', 'src', 'application/vnd.google-apps.spreadsheet')
+    drive.add('dest', 'Src', 'root', FOLDER)
+    drive.add('old-doc', 'notes', 'dest', DOC)
+    # Same name, but a file of another type which happens to have a checksum
+    drive.add('old-budget', 'budget', 'dest', size=3, md5='eee')
+
+    _sync(drive)
+
+    assert drive.copied == ['sheet']
+    assert drive.trashed == ['old-budget']
+
+
+def test_only_folders_can_be_synced(drive):
+    drive.add('src', 'file.txt', 'root', size=1, md5='aaa')
+    drive.add('dest', 'Src', 'root', FOLDER)
+
+    assert _sync(drive) == 'Only a folder can be synced into another folder'
+    assert drive.copied == []
@@ -0,0 +1,62 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_drive import drive  # noqa: F401
+from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper
+
+
+def _listing(helper, folder_id):
+    return helper._GoogleDriveHelper__listing(folder_id)
+
+
+def test_listings_of_different_folders_do_not_wait_for_each_other(drive):
+    drive.add('a.txt', 'a.txt', 'slow')
+    drive.add('b.txt', 'b.txt', 'fast')
+    fast_listed = threading.Event()
+
+    def wait_for_fast():
+        # With one lock for all folders, the fast listing waits behind this one and this times out
+        if not fast_listed.wait(2):
+            raise TimeoutError('the other folder was not listed meanwhile')
+    drive.before_list['slow'] = wait_for_fast
+    helper = GoogleDriveHelper()
+
+    with ThreadPoolExecutor(1) as pool:
+        slow = pool.submit(_listing, helper, 'slow')
+        assert list(_listing(helper, 'fast')) == ['b.txt']
+        fast_listed.set()
+        assert list(slow.result()) == ['a.txt']
+
+
+def test_a_folder_is_listed_once_by_concurrent_workers(drive):
+    drive.add('a.txt', 'a.txt', 'folder')
+    started = threading.Event()
+    release = threading.Event()
+    drive.before_list['folder'] = lambda: (started.set(), release.wait(5))
+    helper = GoogleDriveHelper()
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(_listing, helper, 'folder') for _ in range(4)]
+        started.wait(5)
+        release.set()
+        listings = [future.result() for future in futures]
+
+    assert drive.listed == ['folder']
+    assert all(listing is listings[0] for listing in listings)
+
+
+def test_a_failed_listing_is_tried_again(drive):
+    drive.add('a.txt', 'a.txt', 'folder')
+    failures = [RuntimeError('backend error')]
+
+    def fail_once():
+        if failures:
+            raise failures.pop()
+    drive.before_list['folder'] = fail_once
+    helper = GoogleDriveHelper()
+
+    try:
+        _listing(helper, 'folder')
+    except RuntimeError:
+        pass
+    assert list(_listing(helper, 'folder')) == ['a.txt']
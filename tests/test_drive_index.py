@@ -0,0 +1,126 @@
+import itertools
+
+import pytest
+
+from bot.helper.mirror_utils.upload_utils.drive_index import DriveIndex, FOLDER_MIME_TYPE, _match_query
+
+# Every change is newer than the ones before it
+_modified = (f'2024-01-01T{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}.000Z'
+             for second in itertools.count())
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DriveIndex(str(tmp_path / 'index.db'), interval=0)
+    index._DriveIndex__root = 'root'
+    index._DriveIndex__ready = True
+    return index
+
+
+def _apply(index, *changes):
+    return index._DriveIndex__apply(list(changes))
+
+
+def _change(file_id, name, parent, mime_type='text/plain'):
+    file = {'id': file_id, 'name': name, 'parents': [parent], 'mimeType': mime_type, 'modifiedTime': next(_modified)}
+    return {'fileId': file_id, 'file': file}
+
+
+def _folder(file_id, name, parent):
+    return _change(file_id, name, parent, FOLDER_MIME_TYPE)
+
+
+def _names(index, term):
+    return sorted(result['name'] for result in index.search(term, limit=100)[0])
+
+
+def test_match_query_matches_the_start_of_every_word():
+    assert _match_query('Big Buck') == '"Big"* "Buck"*'
+    # Quotes and FTS operators in the term are not passed on
+    assert _match_query('a"b* OR -c') == '"a"* "b"* "OR"* "c"*'
+    assert _match_query(' -"* ') is None
+
+
+def test_search_finds_names_by_word_prefixes(index):
+    _apply(index, _change('1', 'Big Buck Bunny.mkv', 'root'), _change('2', 'bigger.txt', 'root'),
+           _change('3', 'Buck.txt', 'root'))
+
+    assert _names(index, 'big') == ['Big Buck Bunny.mkv', 'bigger.txt']
+    assert _names(index, 'bun big') == ['Big Buck Bunny.mkv']
+    assert _names(index, 'uck') == []
+    assert index.search('***') == ([], 0)
+
+
+def test_renames_and_deletions_reach_the_search_table(index):
+    _apply(index, _change('1', 'old name.txt', 'root'), _change('2', 'other.txt', 'root'))
+
+    _apply(index, _change('1', 'new name.txt', 'root'))
+    assert _names(index, 'old') == []
+    assert _names(index, 'new') == ['new name.txt']
+
+    _apply(index, {'fileId': '2', 'removed': True})
+    assert _names(index, 'other') == []
+
+
+def test_search_pages_newest_first_with_paths(index):
+    _apply(index, _folder('movies', 'Movies', 'root'), _folder('old', 'Old', 'movies'))
+    _apply(index, *[_change(f'clip{number}', f'clip {number}.mp4', 'old') for number in range(5)])
+
+    results, total = index.search('clip', offset=1, limit=2)
+
+    assert total == 5
+    assert [result['name'] for result in results] == ['clip 3.mp4', 'clip 2.mp4']
+    assert results[0]['path'] == 'Movies/Old/clip 3.mp4'
+    assert results[0]['mimeType'] == 'text/plain'
+    assert index.search('clip', offset=4, limit=2)[0][0]['name'] == 'clip 0.mp4'
+
+
+def test_folders_new_to_the_index_are_returned_for_crawling(index):
+    new_folders = _apply(index, _folder('a', 'a', 'root'), _folder('b', 'b', 'a'), _change('f', 'f.txt', 'b'))
+    assert new_folders == ['a', 'b']
+
+    # A renamed folder is known already
+    assert _apply(index, _folder('a', 'renamed', 'root')) == []
+
+
+def test_changes_outside_of_the_tree_are_ignored(index):
+    assert _apply(index, _folder('elsewhere', 'elsewhere', 'other root'),
+                  _change('f', 'outside.txt', 'elsewhere')) == []
+
+    assert _names(index, 'outside') == []
+
+
+def test_a_folder_moved_out_of_the_tree_takes_its_subtree_along(index):
+    _apply(index, _folder('a', 'a', 'root'), _folder('b', 'b', 'a'), _change('f', 'deep file.txt', 'b'),
+           _change('g', 'kept file.txt', 'root'))
+
+    _apply(index, _folder('a', 'a', 'other root'))
+
+    assert _names(index, 'file') == ['kept file.txt']
+    assert _names(index, 'b') == []
+
+
+def test_a_trashed_folder_takes_its_subtree_along(index):
+    _apply(index, _folder('a', 'a', 'root'), _change('f', 'deep file.txt', 'a'), _change('g', 'kept file.txt', 'root'))
+
+    _apply(index, {'fileId': 'a', 'file': {'id': 'a', 'trashed': True}})
+
+    assert _names(index, 'file') == ['kept file.txt']
+
+
+def test_a_file_with_several_parents_is_kept_under_one_in_the_tree(index):
+    _apply(index, _folder('a', 'a', 'root'))
+    change = _change('f', 'shared.txt', 'elsewhere')
+    change['file']['parents'].append('a')
+
+    _apply(index, change)
+
+    assert index.search('shared')[0][0]['path'] == 'a/shared.txt'
+
+
+def test_add_indexes_uploads_inside_the_tree_only(index):
+    index.add('f', 'uploaded.txt', 'root', 'text/plain', 10)
+    index.add('g', 'stray.txt', 'unknown', 'text/plain', 10)
+
+    assert index.search('uploaded')[0][0]['size'] == 10
+    assert _names(index, 'stray') == []
@@ -0,0 +1,112 @@
+# Runs resumable uploads through the HttpRequest of the pinned google-api-python-client, only the transport is fake
+import json
+
+import httplib2
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+
+from bot.helper.mirror_utils.upload_utils import gdriveTools
+from bot.helper.mirror_utils.upload_utils.chunk_sizer import ChunkSizer
+from bot.helper.mirror_utils.upload_utils.gdriveTools import GoogleDriveHelper
+
+KIB = 1024
+UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
+SESSION_URI = 'https://www.googleapis.com/upload/drive/v3/files?upload_id=session'
+
+
+class _Http:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if hasattr(body, 'read'):
+            body = body.read()
+        self.requests.append((uri, method, dict(headers or {}), body))
+        status, headers, content = self.responses.pop(0)
+        return httplib2.Response(dict(headers, status=str(status))), content
+
+
+class _Service:
+    def __init__(self, http):
+        self.http = http
+
+    def files(self):
+        return self
+
+    def create(self, body, media_body, **kwargs):
+        return HttpRequest(self.http, JsonModel().response, UPLOAD_URL, method='POST', body=json.dumps(body),
+                           headers={'content-type': 'application/json'}, resumable=media_body)
+
+
+class _Listener:
+    uid = 1
+
+
+def _upload(tmp_path, monkeypatch, size, responses, sessions=None):
+    data = bytes(i % 251 for i in range(size))
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    http = _Http(responses)
+    monkeypatch.setattr(gdriveTools.drive_auth, 'service', lambda account=None: _Service(http))
+    helper = GoogleDriveHelper(listener=_Listener(), sessions=sessions)
+    file_id = helper._GoogleDriveHelper__send_media(None, str(path), 'file.bin', 'application/octet-stream',
+                                                    'parent')
+    return file_id, data, http.requests
+
+
+def test_a_journaled_session_goes_on_from_the_committed_offset(tmp_path, monkeypatch):
+    size = 600 * KIB
+    sessions = {str(tmp_path / 'file.bin'): {'upload_uri': SESSION_URI, 'account': None}}
+    file_id, data, requests = _upload(tmp_path, monkeypatch, size, [
+        (308, {'range': f'bytes=0-{256 * KIB - 1}'}, b''),
+        (200, {}, b'{"id": "file-id"}'),
+    ], sessions)
+
+    assert file_id == 'file-id'
+    (query_uri, query_method, query_headers, _), (uri, method, headers, body) = requests
+    assert (query_uri, query_method, query_headers['Content-Range']) == (SESSION_URI, 'PUT', f'bytes */{size}')
+    assert (uri, method, headers['Content-Range']) == (SESSION_URI, 'PUT', f'bytes {256 * KIB}-{size - 1}/{size}')
+    assert body == data[256 * KIB:]
+
+
+def test_a_journaled_session_which_is_complete_is_not_sent_again(tmp_path, monkeypatch):
+    sessions = {str(tmp_path / 'file.bin'): {'upload_uri': SESSION_URI, 'account': None}}
+    file_id, _, requests = _upload(tmp_path, monkeypatch, 300 * KIB, [(200, {}, b'{"id": "file-id"}')], sessions)
+
+    assert file_id == 'file-id'
+    assert len(requests) == 1
+
+
+def test_an_expired_journaled_session_starts_a_new_one(tmp_path, monkeypatch):
+    size = 300 * KIB
+    sessions = {str(tmp_path / 'file.bin'): {'upload_uri': SESSION_URI, 'account': None}}
+    file_id, data, requests = _upload(tmp_path, monkeypatch, size, [
+        (404, {}, b''),
+        (200, {'location': f'{SESSION_URI}-new'}, b''),
+        (200, {}, b'{"id": "file-id"}'),
+    ], sessions)
+
+    assert file_id == 'file-id'
+    assert [(uri, method) for uri, method, _, _ in requests] == [
+        (SESSION_URI, 'PUT'), (UPLOAD_URL, 'POST'), (f'{SESSION_URI}-new', 'PUT')]
+    assert requests[2][3] == data
+
+
+def test_chunks_grow_with_a_new_media_of_the_next_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(gdriveTools, 'ChunkSizer', lambda: ChunkSizer(256 * KIB, 1024 * KIB))
+    size = 1536 * KIB
+    file_id, data, requests = _upload(tmp_path, monkeypatch, size, [
+        (200, {'location': SESSION_URI}, b''),
+        (308, {'range': f'bytes=0-{256 * KIB - 1}'}, b''),
+        (308, {'range': f'bytes=0-{768 * KIB - 1}'}, b''),
+        (200, {}, b'{"id": "file-id"}'),
+    ])
+
+    assert file_id == 'file-id'
+    chunks = [(headers['Content-Range'], body) for _, _, headers, body in requests[1:]]
+    assert chunks == [
+        (f'bytes 0-{256 * KIB - 1}/{size}', data[:256 * KIB]),
+        (f'bytes {256 * KIB}-{768 * KIB - 1}/{size}', data[256 * KIB:768 * KIB]),
+        (f'bytes {768 * KIB}-{size - 1}/{size}', data[768 * KIB:]),
+    ]
@@ -0,0 +1,38 @@
+import asyncio
+
+from bot.helper.ext_utils import fs_utils, job_journal
+from bot.helper.ext_utils.job_journal import JobJournal
+
+
+class _Application:
+    bot = None
+
+
+def _journal(tmp_path, monkeypatch, *uids):
+    journal = JobJournal(str(tmp_path / 'journal.db'))
+    for uid in uids:
+        journal.record(uid, 'created', kind='mirror', link=f'https://example.com/{uid}', update={'update_id': uid})
+    monkeypatch.setattr(job_journal, 'journal', journal)
+    monkeypatch.setattr(fs_utils, 'clean_download', lambda path: None)
+    return journal
+
+
+def test_cancel_unfinished_finishes_every_running_job(tmp_path, monkeypatch):
+    journal = _journal(tmp_path, monkeypatch, 1, 2)
+    journal.record(1, 'finished', result='uploaded')
+
+    assert journal.cancel_unfinished() == [2]
+    assert journal.unfinished_jobs() == {}
+
+
+def test_restart_now_leaves_nothing_for_the_recovery(tmp_path, monkeypatch):
+    journal = _journal(tmp_path, monkeypatch, 1, 2)
+    resumed = []
+    monkeypatch.setattr(job_journal, '_resumers', {'mirror': lambda update, state: resumed.append(state['uid'])})
+
+    # /restart now cancels the journal before it deletes the downloads and execs
+    assert job_journal.cancel_unfinished_jobs()
+    asyncio.run(job_journal.recover_jobs(_Application()))
+
+    assert resumed == []
+    assert journal.unfinished_jobs() == {}
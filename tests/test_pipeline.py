@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+from bot.helper.ext_utils.bot_utils import MirrorStatus
+from bot.helper.mirror_utils.pipeline import FairShareStage, JobPriority
+
+GIB = 1024 ** 3
+
+
+def _listener(user, chat=None):
+    return SimpleNamespace(message=SimpleNamespace(from_user=SimpleNamespace(id=user)),
+                           update=SimpleNamespace(effective_chat=SimpleNamespace(id=chat or user)),
+                           priority=JobPriority.NORMAL)
+
+
+def _stage():
+    stage = FairShareStage('test', 1, 'event', MirrorStatus.STATUS_WAITING)
+    # Occupies the slot so the jobs submitted next all wait and are ordered together
+    _submit(stage, 'blocker', 'blocker')
+    return stage
+
+
+def _submit(stage, uid, user, size=GIB, chat=None):
+    return stage.submit(uid, lambda: None, hold=True, listener=_listener(user, chat), size=size)
+
+
+def _admissions(stage, count):
+    """Releases the running jobs one at a time. :return The uids in the order they were admitted"""
+    running = list(stage._active)
+    admitted = []
+    while len(admitted) < count:
+        stage.release(running.pop(0))
+        new = [uid for uid in stage._active if uid not in running]
+        running.extend(new)
+        admitted.extend(new)
+    return admitted
+
+
+def test_a_light_user_is_not_stuck_behind_a_heavy_one():
+    stage = _stage()
+    for index in range(5):
+        _submit(stage, f'heavy{index}', 'heavy')
+    _submit(stage, 'light0', 'light')
+
+    assert _admissions(stage, 6) == ['heavy0', 'light0', 'heavy1', 'heavy2', 'heavy3', 'heavy4']
+
+
+def test_users_are_served_in_proportion_to_the_bytes_they_download():
+    stage = _stage()
+    for index in range(2):
+        _submit(stage, f'large{index}', 'large', size=4 * GIB)
+    for index in range(8):
+        _submit(stage, f'small{index}', 'small', size=GIB)
+
+    admitted = _admissions(stage, 10)
+
+    # Four 1 GiB jobs of one user for every 4 GiB job of the other
+    between = admitted[admitted.index('large0') + 1:admitted.index('large1')]
+    assert len(between) == 4 and all(uid.startswith('small') for uid in between)
+
+
+def test_a_user_is_capped_even_with_free_slots():
+    stage = FairShareStage('test', 3, 'event', MirrorStatus.STATUS_WAITING, user_limit=1)
+    for index in range(3):
+        _submit(stage, f'a{index}', 'a')
+    _submit(stage, 'b0', 'b')
+
+    assert list(stage._active) == ['a0', 'b0']
+    assert stage.counts() == (2, 2)
+    stage.release('a0')
+    assert list(stage._active) == ['b0', 'a1']
+
+
+def test_a_chat_is_capped_across_its_users():
+    stage = FairShareStage('test', 3, 'event', MirrorStatus.STATUS_WAITING, chat_limit=1)
+    _submit(stage, 'a0', 'a', chat='group')
+    _submit(stage, 'b0', 'b', chat='group')
+    _submit(stage, 'c0', 'c', chat='other')
+
+    assert list(stage._active) == ['a0', 'c0']
+    assert stage.position('b0') == 1
+    stage.release('a0')
+    assert list(stage._active) == ['c0', 'b0']
+
+
+def test_a_higher_priority_is_admitted_before_the_round_robin():
+    stage = _stage()
+    for index in range(3):
+        _submit(stage, f'a{index}', 'a')
+    _submit(stage, 'b0', 'b')
+
+    assert stage.set_priority('a2', JobPriority.HIGH)
+    assert stage.position('a2') == 1
+    assert stage.set_priority('a0', JobPriority.LOW)
+    assert _admissions(stage, 4) == ['a2', 'b0', 'a1', 'a0']
+
+
+def test_small_jobs_skip_ahead_of_large_ones():
+    stage = _stage()
+    _submit(stage, 'large', 'a', size=10 * GIB)
+    _submit(stage, 'small', 'b', size=1024)
+
+    assert _admissions(stage, 2) == ['small', 'large']
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot.helper.mirror_utils.upload_utils import sa_pool as sa_pool_module
+from bot.helper.mirror_utils.upload_utils.sa_pool import ServiceAccountPool, BUCKET, WINDOW, RATE_LIMIT_COOLDOWN
+
+# Some time at the start of an hour
+START = 1000 * BUCKET
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=START)
+    monkeypatch.setattr(sa_pool_module, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def make_pool(tmp_path, clock):
+    accounts = tmp_path / 'accounts'
+    accounts.mkdir()
+    for name in ('a', 'b', 'c'):
+        (accounts / f'{name}.json').write_text('{}')
+    pools = []
+
+    def make_pool(daily_limit=100):
+        pool = ServiceAccountPool(str(tmp_path / 'sa.db'), str(accounts), daily_limit)
+        pools.append(pool)
+        return pool
+    yield make_pool
+    for pool in pools:
+        if pool._ServiceAccountPool__flusher is not None:
+            pool._ServiceAccountPool__flusher.cancel()
+
+
+def _cooldown(pool, account):
+    return pool._ServiceAccountPool__cooldown.get(account, 0) - START
+
+
+def test_uploads_are_counted_in_hourly_buckets_over_the_last_24_hours(make_pool, clock):
+    pool = make_pool(daily_limit=10)
+    pool.record('a.json', 6)
+    clock.now += BUCKET // 2
+    pool.record('a.json', 2)
+    clock.now += BUCKET
+    pool.record('a.json', 2)
+
+    assert pool._ServiceAccountPool__usage['a.json'] == {START: 8, START + BUCKET: 2}
+    # The daily limit is used up, the other accounts are picked
+    assert pool.pick() == 'b.json'
+    assert pool.stats().startswith('2/3 healthy')
+
+    # Once the first hour left the window, the 8 bytes of it no longer count
+    clock.now = START + WINDOW + 1
+    assert pool.stats().startswith('3/3 healthy')
+    assert pool.stats().endswith(f"{sa_pool_module.get_readable_file_size(2)} used in 24h")
+
+
+def test_rate_limits_rest_an_account_longer_for_every_strike(make_pool, clock):
+    pool = make_pool()
+
+    pool.penalize('a.json', 'userRateLimitExceeded')
+    assert _cooldown(pool, 'a.json') == RATE_LIMIT_COOLDOWN
+    assert pool.pick() == 'b.json'
+
+    pool.penalize('a.json', 'userRateLimitExceeded')
+    assert _cooldown(pool, 'a.json') == 2 * RATE_LIMIT_COOLDOWN
+
+    pool.succeeded('a.json')
+    pool.penalize('a.json', 'userRateLimitExceeded')
+    assert _cooldown(pool, 'a.json') == RATE_LIMIT_COOLDOWN
+
+    pool.penalize('b.json', 'dailyLimitExceeded')
+    assert _cooldown(pool, 'b.json') == WINDOW
+    assert pool.pick() == 'c.json'
+
+    clock.now += RATE_LIMIT_COOLDOWN
+    assert pool.pick() == 'a.json'
+
+
+def test_when_every_account_rests_the_first_available_again_is_used(make_pool):
+    pool = make_pool()
+    pool.penalize('a.json', 'dailyLimitExceeded')
+    pool.penalize('b.json', 'userRateLimitExceeded')
+    pool.penalize('c.json', 'userRateLimitExceeded')
+    pool.penalize('c.json', 'userRateLimitExceeded')
+
+    assert pool.pick() == 'b.json'
+
+
+def test_uploads_are_spread_over_the_accounts(make_pool):
+    pool = make_pool()
+    pool.record('a.json', 50)
+
+    # The least used idle account first, then the ones with the fewest running uploads
+    assert [pool.acquire() for _ in range(4)] == ['b.json', 'c.json', 'a.json', 'b.json']
+    pool.release('c.json')
+    assert pool.acquire() == 'c.json'
+    # An upload session stays on the account which owns it, however busy it is
+    assert pool.acquire('b.json') == 'b.json'
+
+    pool.penalize('a.json', 'userRateLimitExceeded')
+    assert pool.acquire('a.json') != 'a.json'
+
+
+def test_releasing_an_idle_account_does_not_make_it_look_busier_later(make_pool):
+    pool = make_pool()
+    pool.release('a.json')
+
+    assert [pool.acquire() for _ in range(2)] == ['a.json', 'b.json']
+
+
+def test_flushed_usage_and_cooldowns_survive_a_restart(make_pool):
+    pool = make_pool(daily_limit=10)
+    pool.pick()
+    pool.record('a.json', 4)
+    pool.record('a.json', 6)
+    pool.penalize('b.json', 'dailyLimitExceeded')
+
+    # Cooldowns are written right away, usage only once flushed
+    assert make_pool(daily_limit=10).pick() == 'a.json'
+    pool.flush()
+    pool.flush()
+
+    restarted = make_pool(daily_limit=10)
+    assert restarted.pick() == 'c.json'
+    assert restarted._ServiceAccountPool__usage['a.json'] == {START: 10}
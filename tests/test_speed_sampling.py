@@ -0,0 +1,32 @@
+from bot.helper.mirror_utils.status_utils.status import Status
+
+
+class _Transfer(Status):
+    def __init__(self, size):
+        self.processed = 0
+        self.total = size
+
+    def processed_bytes(self):
+        return self.processed
+
+    def size_raw(self):
+        return self.total
+
+
+def test_speed_and_eta_only_read_the_samples(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('bot.helper.ext_utils.speed_sampler.time.monotonic', lambda: clock[0])
+    transfer = _Transfer(1000)
+    transfer.sample()
+
+    clock[0] += 1
+    transfer.processed = 100
+    assert transfer.speed_raw() == 0
+    assert transfer.eta_raw() is None
+
+    transfer.sample()
+    assert transfer.speed_raw() == 100
+    assert transfer.eta_raw() == 9
+    # Reading again adds nothing, however often the status is rendered
+    clock[0] += 1
+    assert transfer.speed_raw() == 100
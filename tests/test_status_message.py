@@ -0,0 +1,36 @@
+import bot
+from bot.helper.ext_utils.bot_utils import MirrorStatus, get_readable_message
+
+
+class _Download:
+    def __init__(self, processed):
+        self.processed = processed
+
+    def name(self):
+        return 'file.iso'
+
+    def status(self):
+        return MirrorStatus.STATUS_DOWNLOADING
+
+    def processed_bytes(self):
+        return self.processed
+
+    def size_raw(self):
+        return 1000
+
+    def progress(self):
+        return f'{self.processed / 10}%'
+
+
+def test_compact_lines_only_change_with_whole_progress_steps(monkeypatch):
+    monkeypatch.setattr(bot, 'STATUS_COMPACT', True)
+    download = _Download(310)
+    monkeypatch.setitem(bot.download_dict, 1, download)
+
+    first = get_readable_message()
+    download.processed = 389
+    assert get_readable_message() == first
+    assert ' 30% ' in first
+
+    download.processed = 401
+    assert ' 40% ' in get_readable_message()
@@ -0,0 +1,25 @@
+import threading
+
+from bot.helper.ext_utils.bot_utils import new_thread, setTimeout
+from bot.helper.ext_utils.executors import get_executor
+
+
+def test_scheduled_jobs_run_while_every_event_worker_is_busy():
+    release = threading.Event()
+    busy = new_thread(lambda: release.wait(5))
+    blocked = [busy() for _ in range(get_executor('event').max_workers)]
+    fired = threading.Event()
+    threads = []
+
+    def action():
+        threads.append(threading.current_thread().name)
+        fired.set()
+
+    try:
+        setTimeout(0.01, action)
+        assert fired.wait(2)
+    finally:
+        release.set()
+        for future in blocked:
+            future.result()
+    assert threads[0].startswith('timer')